@@ -2,25 +2,58 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import ttk
+import gzip
+import base64
 import json
+import mmap
+import re
+import struct
+import urllib.parse
 import os
 import sqlite3
 import shutil
 import configparser
+import tempfile
+import threading
+import time
+import zlib
+import hashlib
 from PIL import Image, ImageTk
+import numpy as np
 from typing import List, Dict, Optional
 import zipfile
 from datetime import datetime
 from pathlib import Path
+from collections import OrderedDict
 import cairosvg
 from io import BytesIO
 from customtkinter import CTkImage
+try:
+    import zstandard  # opcional: los .blend de Blender 3.0+ pueden ir comprimidos con zstd
+except ImportError:
+    zstandard = None
+try:
+    import fcntl  # solo en Unix: reflinks con FICLONE
+except ImportError:
+    fcntl = None
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, BrokenExecutor, CancelledError
 
 
 # configurasion global, solo de customtkinter
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
 
+DEFAULT_PATHS = {
+    'database': 'assets.db',
+    'assets_folder': 'assets',
+    'resources': 'resources',
+    'cache_folder': 'cache'
+}
+# Fraccion de triangulos del LOD0 que se queda en LOD1, LOD2...
+DEFAULT_LOD_RATIOS = '0.5, 0.25'
+DEFAULT_MESH_CACHE_MB = 2048
+DEFAULT_MEMBER_CACHE_MB = 4096
+
 class Config:
     def __init__(self):
         self.config = configparser.ConfigParser()
@@ -34,17 +67,16 @@ class Config:
             self.create_default_config()
 
     def create_default_config(self):
-        self.config['Paths'] = {
-            'database': 'assets.db',
-            'assets_folder': 'assets',
-            'resources': 'resources'
-        }
+        self.config['Paths'] = dict(DEFAULT_PATHS)
         self.config['Colors'] = {
             'primary_button': '#2FA572',
             'hover_button': '#248C61',
             'secondary_button': '#3B8ED0',
             'hover_secondary': '#36719F'
         }
+        self.config['LOD'] = {'ratios': DEFAULT_LOD_RATIOS}
+        self.config['Cache'] = {'mesh_cache_mb': str(DEFAULT_MESH_CACHE_MB),
+                                'member_cache_mb': str(DEFAULT_MEMBER_CACHE_MB)}
         self.save_config()
 
     def save_config(self):
@@ -52,16 +84,51 @@ class Config:
             self.config.write(f)
 
     def get_path(self, key: str) -> str:
-        return self.config.get('Paths', key)
+        # fallback para config.ini antiguos que no tienen las rutas nuevas
+        return self.config.get('Paths', key, fallback=DEFAULT_PATHS.get(key))
 
     def get_color(self, key: str) -> str:
         return self.config.get('Colors', key)
 
+    def get_lod_ratios(self) -> List[float]:
+        """Ratios de [LOD] ratios, de mayor a menor; se ignoran los que no estan entre 0 y 1."""
+        text = self.config.get('LOD', 'ratios', fallback=DEFAULT_LOD_RATIOS)
+        ratios = []
+        for value in text.split(','):
+            try:
+                ratio = float(value)
+            except ValueError:
+                continue
+            if 0 < ratio < 1:
+                ratios.append(ratio)
+        return sorted(set(ratios), reverse=True)
+
+    def get_mesh_cache_limit(self) -> int:
+        """Tope en bytes de la cache de mallas binarias."""
+        return self.config.getint('Cache', 'mesh_cache_mb', fallback=DEFAULT_MESH_CACHE_MB) * 1024 * 1024
+
+    def get_member_cache_limit(self) -> int:
+        """Tope en bytes de la cache de miembros de ZIP ya comprimidos."""
+        return self.config.getint('Cache', 'member_cache_mb', fallback=DEFAULT_MEMBER_CACHE_MB) * 1024 * 1024
+
+# Lado mayor en pixeles que cuenta como cada resolucion del filtro
+RESOLUTION_RANGES = {
+    '1K': (768, 1536),
+    '2K': (1536, 3072),
+    '4K': (3072, 6144),
+    '8K': (6144, 12288),
+    '16K': (12288, 24576)
+}
+
 class Database:
     def __init__(self, config):
         self.config = config
-        self.conn = sqlite3.connect(self.config.get_path('database'))
+        self.path = self.config.get_path('database')
+        self.conn = sqlite3.connect(self.path)
         self.check_and_create_tables()  # cuidao, cambie el nombre a check_and_create_tables, antes se llamaba create_tables
+
+    def close(self):
+        self.conn.close()
     
 #    def create_tables(self):
 #        with self.conn:
@@ -161,82 +228,4839 @@ class Database:
                     FOREIGN KEY (parent_id) REFERENCES folders (id)
                 )
             ''')
+            # Subtotales de tamaño por carpeta, validos mientras no cambie su mtime
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS dir_sizes (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime_ns INTEGER NOT NULL,
+                    own_bytes INTEGER NOT NULL,
+                    total_bytes INTEGER NOT NULL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_dir_sizes_parent ON dir_sizes (parent)')
+            # Cache de hashes de contenido, identificada por fichero fisico (dev, inode)
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    dev INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (dev, inode)
+                )
+            ''')
+            # Hash perceptual (dHash de 64 bits) de previews y texturas
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS image_hashes (
+                    path TEXT PRIMARY KEY,
+                    asset_id INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    phash INTEGER NOT NULL,
+                    FOREIGN KEY (asset_id) REFERENCES assets (id)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_image_hashes_asset ON image_hashes (asset_id)')
+            # Paleta dominante de cada textura: float32 (k, 4) con L, a, b y peso
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS texture_palettes (
+                    path TEXT PRIMARY KEY,
+                    asset_id INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    palette BLOB NOT NULL,
+                    FOREIGN KEY (asset_id) REFERENCES assets (id)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_texture_palettes_asset ON texture_palettes (asset_id)')
+            # Metadatos de cabecera de cada textura; resolution es el lado mayor en pixeles
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS textures (
+                    path TEXT PRIMARY KEY,
+                    asset_id INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    format TEXT NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    channels INTEGER,
+                    bit_depth INTEGER,
+                    colour_space TEXT,
+                    resolution INTEGER NOT NULL,
+                    FOREIGN KEY (asset_id) REFERENCES assets (id)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_textures_resolution ON textures (resolution, asset_id)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_textures_asset ON textures (asset_id)')
+            # Estadisticas de mallas (sin construir la malla); extent es el lado mayor de la caja
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS meshes (
+                    path TEXT PRIMARY KEY,
+                    asset_id INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    format TEXT NOT NULL,
+                    vertices INTEGER NOT NULL,
+                    triangles INTEGER NOT NULL,
+                    materials INTEGER NOT NULL,
+                    min_x REAL, min_y REAL, min_z REAL,
+                    max_x REAL, max_y REAL, max_z REAL,
+                    extent REAL,
+                    FOREIGN KEY (asset_id) REFERENCES assets (id)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_meshes_triangles ON meshes (triangles, asset_id)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_meshes_extent ON meshes (extent, asset_id)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_meshes_asset ON meshes (asset_id)')
+            # Manifiesto de ficheros de cada asset con la variante (resolucion, LOD, hueco) ya parseada
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS asset_files (
+                    asset_id INTEGER NOT NULL,
+                    rel_path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    resolution TEXT,
+                    lod INTEGER,
+                    slot TEXT,
+                    PRIMARY KEY (asset_id, rel_path),
+                    FOREIGN KEY (asset_id) REFERENCES assets (id)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_asset_files_variant ON asset_files (asset_id, resolution, lod)')
+            # Que assets hay en cada carpeta (un asset puede estar en varias)
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS asset_folders (
+                    asset_id INTEGER NOT NULL,
+                    folder_id INTEGER NOT NULL,
+                    PRIMARY KEY (asset_id, folder_id),
+                    FOREIGN KEY (asset_id) REFERENCES assets (id),
+                    FOREIGN KEY (folder_id) REFERENCES folders (id)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_asset_folders_folder ON asset_folders (folder_id, asset_id)')
+            # Cierre transitivo de folders: una fila por cada par antepasado/descendiente (y cada carpeta consigo
+            # misma, depth 0), asi un subarbol entero es un solo join sin consultas recursivas
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS folder_closure (
+                    ancestor_id INTEGER NOT NULL,
+                    descendant_id INTEGER NOT NULL,
+                    depth INTEGER NOT NULL,
+                    PRIMARY KEY (ancestor_id, descendant_id),
+                    FOREIGN KEY (ancestor_id) REFERENCES folders (id),
+                    FOREIGN KEY (descendant_id) REFERENCES folders (id)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_folder_closure_descendant ON folder_closure (descendant_id, ancestor_id)')
+            # Numero de assets de cada carpeta: directos y distintos en todo su subarbol
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS folder_asset_counts (
+                    folder_id INTEGER PRIMARY KEY,
+                    direct INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    FOREIGN KEY (folder_id) REFERENCES folders (id)
+                )
+            ''')
+            # Bases de datos de antes del cierre: se construye una vez desde parent_id
+            cursor = self.conn.execute('''
+                SELECT COUNT(*) FROM folders WHERE id NOT IN (SELECT descendant_id FROM folder_closure WHERE depth = 0)
+            ''')
+            if cursor.fetchone()[0]:
+                self.rebuild_folder_closure()
+
+            # Insertar etiquetas de ejemplo si la tabla de tags está vacía
+            cursor = self.conn.execute('SELECT COUNT(*) FROM tags')
+            if cursor.fetchone()[0] == 0:  # Si no hay tags en la tabla
+                with self.conn:
+                    self.conn.executemany(
+                        'INSERT INTO tags (name) VALUES (?)',
+                        [('Example Tag 1',), ('Example Tag 2',), ('Example Tag 3',)]
+                    )
+
+    def get_folders(self):
+        """consigue las carpetas y eso"""
+        cursor = self.conn.execute('SELECT id, name, parent_id FROM folders')
+        folders = [{'id': row[0], 'name': row[1], 'parent_id': row[2]} for row in cursor.fetchall()]
+        return folders
+
+    def add_folder(self, name: str, parent_id: Optional[int] = None) -> int:
+        """pone una nueva carpeta, con sus filas en el cierre"""
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO folders (name, parent_id) VALUES (?, ?)',
+                (name, parent_id)
+            )
+            folder_id = cursor.lastrowid
+            # la propia carpeta mas todos los antepasados del padre (el padre incluido) un nivel mas arriba
+            self.conn.execute('''
+                INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+                SELECT ?, ?, 0
+                UNION ALL
+                SELECT ancestor_id, ?, depth + 1 FROM folder_closure WHERE descendant_id = ?
+            ''', (folder_id, folder_id, folder_id, parent_id))
+            self.conn.execute('INSERT INTO folder_asset_counts (folder_id) VALUES (?)', (folder_id,))
+        return folder_id
+
+    def move_folder(self, folder_id: int, parent_id: Optional[int]):
+        """Cuelga folder_id (con todo su subarbol) de parent_id; None lo deja en la raiz."""
+        if parent_id is not None and self.conn.execute(
+                'SELECT 1 FROM folder_closure WHERE ancestor_id = ? AND descendant_id = ?',
+                (folder_id, parent_id)).fetchone():
+            raise ValueError("no se puede mover una carpeta dentro de si misma")
+        with self.conn:
+            # antepasados que pierden el subarbol; sus totales se recalculan despues
+            old_ancestors = [row[0] for row in self.conn.execute(
+                'SELECT ancestor_id FROM folder_closure WHERE descendant_id = ? AND depth > 0', (folder_id,))]
+            # fuera las filas que unen el subarbol con lo que queda por encima
+            self.conn.execute('''
+                DELETE FROM folder_closure
+                WHERE descendant_id IN (SELECT descendant_id FROM folder_closure WHERE ancestor_id = ?)
+                  AND ancestor_id NOT IN (SELECT descendant_id FROM folder_closure WHERE ancestor_id = ?)
+            ''', (folder_id, folder_id))
+            # y el producto de los antepasados del nuevo padre por el subarbol
+            self.conn.execute('''
+                INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+                SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+                FROM folder_closure above, folder_closure below
+                WHERE above.descendant_id = ? AND below.ancestor_id = ?
+            ''', (parent_id, folder_id))
+            self.conn.execute('UPDATE folders SET parent_id = ? WHERE id = ?', (parent_id, folder_id))
+            new_ancestors = [row[0] for row in self.conn.execute(
+                'SELECT ancestor_id FROM folder_closure WHERE descendant_id = ? AND depth > 0', (folder_id,))]
+            self._recount_folders(old_ancestors + new_ancestors)
+
+    def rebuild_folder_closure(self):
+        """Rehace folder_closure y folder_asset_counts desde parent_id (bases de datos antiguas)."""
+        with self.conn:
+            self.conn.execute('DELETE FROM folder_closure')
+            self.conn.execute('''
+                INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+                WITH RECURSIVE closure (ancestor_id, descendant_id, depth) AS (
+                    SELECT id, id, 0 FROM folders
+                    UNION ALL
+                    SELECT closure.ancestor_id, folders.id, closure.depth + 1
+                    FROM closure JOIN folders ON folders.parent_id = closure.descendant_id
+                )
+                SELECT ancestor_id, descendant_id, depth FROM closure
+            ''')
+            self.conn.execute('INSERT OR IGNORE INTO folder_asset_counts (folder_id) SELECT id FROM folders')
+            self._recount_folders([row[0] for row in self.conn.execute('SELECT id FROM folders')])
+
+    def _recount_folders(self, folder_ids: List[int]):
+        """Recalcula desde cero los contadores de unas carpetas (para cuando cambia la forma del arbol)."""
+        self.conn.executemany('''
+            UPDATE folder_asset_counts SET
+                direct = (SELECT COUNT(*) FROM asset_folders WHERE folder_id = :id),
+                total = (SELECT COUNT(DISTINCT asset_folders.asset_id)
+                         FROM folder_closure JOIN asset_folders ON asset_folders.folder_id = folder_closure.descendant_id
+                         WHERE folder_closure.ancestor_id = :id)
+            WHERE folder_id = :id
+        ''', [{'id': folder_id} for folder_id in set(folder_ids)])
+
+    def add_asset_to_folder(self, asset_id: int, folder_id: int):
+        with self.conn:
+            if self.conn.execute('SELECT 1 FROM asset_folders WHERE asset_id = ? AND folder_id = ?',
+                                 (asset_id, folder_id)).fetchone():
+                return
+            # +1 en los antepasados que aun no tenian el asset en ninguna otra carpeta de su subarbol
+            self.conn.execute('''
+                UPDATE folder_asset_counts SET total = total + 1
+                WHERE folder_id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = ?)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM asset_folders
+                      JOIN folder_closure ON folder_closure.descendant_id = asset_folders.folder_id
+                      WHERE asset_folders.asset_id = ? AND folder_closure.ancestor_id = folder_asset_counts.folder_id
+                  )
+            ''', (folder_id, asset_id))
+            self.conn.execute('INSERT INTO asset_folders (asset_id, folder_id) VALUES (?, ?)', (asset_id, folder_id))
+            self.conn.execute('UPDATE folder_asset_counts SET direct = direct + 1 WHERE folder_id = ?', (folder_id,))
+
+    def remove_asset_from_folder(self, asset_id: int, folder_id: int):
+        with self.conn:
+            cursor = self.conn.execute('DELETE FROM asset_folders WHERE asset_id = ? AND folder_id = ?',
+                                       (asset_id, folder_id))
+            if not cursor.rowcount:
+                return
+            # -1 donde ya no queda en ninguna carpeta del subarbol
+            self.conn.execute('''
+                UPDATE folder_asset_counts SET total = total - 1
+                WHERE folder_id IN (SELECT ancestor_id FROM folder_closure WHERE descendant_id = ?)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM asset_folders
+                      JOIN folder_closure ON folder_closure.descendant_id = asset_folders.folder_id
+                      WHERE asset_folders.asset_id = ? AND folder_closure.ancestor_id = folder_asset_counts.folder_id
+                  )
+            ''', (folder_id, asset_id))
+            self.conn.execute('UPDATE folder_asset_counts SET direct = direct - 1 WHERE folder_id = ?', (folder_id,))
+
+    def get_assets_in_folder(self, folder_id: int, recursive: bool = True) -> List[Dict]:
+        """Assets de la carpeta, o de todo su subarbol con recursive; un join sobre el cierre."""
+        if recursive:
+            cursor = self.conn.execute('''
+                SELECT * FROM assets WHERE id IN (
+                    SELECT asset_folders.asset_id FROM folder_closure
+                    JOIN asset_folders ON asset_folders.folder_id = folder_closure.descendant_id
+                    WHERE folder_closure.ancestor_id = ?
+                )
+                ORDER BY name
+            ''', (folder_id,))
+        else:
+            cursor = self.conn.execute('''
+                SELECT * FROM assets WHERE id IN (SELECT asset_id FROM asset_folders WHERE folder_id = ?)
+                ORDER BY name
+            ''', (folder_id,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_folder_asset_counts(self) -> Dict[int, tuple]:
+        """{carpeta: (assets directos, assets distintos en el subarbol)}"""
+        cursor = self.conn.execute('SELECT folder_id, direct, total FROM folder_asset_counts')
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def add_asset(self, asset_data: dict) -> int:
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO assets (name, path, type, environment, image_path, size, date_added)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                asset_data['name'],
+                asset_data['path'],
+                asset_data['type'],
+                asset_data['environment'],
+                asset_data['image_path'],
+                asset_data['size'],
+                datetime.now().isoformat()
+            ))
+            return cursor.lastrowid
+
+    def add_tags(self, asset_id: int, tags: List[str]):
+        with self.conn:
+            for tag in tags:
+                self.conn.execute('INSERT OR IGNORE INTO tags (name) VALUES (?)', (tag,))
+                tag_id = self.conn.execute('SELECT id FROM tags WHERE name = ?', (tag,)).fetchone()[0]
+                self.conn.execute('''
+                    INSERT OR IGNORE INTO asset_tags (asset_id, tag_id)
+                    VALUES (?, ?)
+                ''', (asset_id, tag_id))
+
+    def get_assets(self) -> List[Dict]:
+        """Devuelve todos los assets, sin filtros ni joins."""
+        cursor = self.conn.execute('SELECT * FROM assets')
+        return [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
+
+    def update_asset_size(self, asset_id: int, size: int):
+        with self.conn:
+            self.conn.execute('UPDATE assets SET size = ? WHERE id = ?', (size, asset_id))
+
+    def get_dir_sizes(self, root: str) -> Dict[str, tuple]:
+        """Devuelve las filas cacheadas de dir_sizes para root y todo lo que cuelga de el."""
+        # Rango sobre la clave primaria en vez de LIKE, asi no hay que escapar % ni _
+        prefix = root.rstrip(os.sep) + os.sep
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        cursor = self.conn.execute('''
+            SELECT path, parent, mtime_ns, own_bytes, total_bytes FROM dir_sizes
+            WHERE path = ? OR (path >= ? AND path < ?)
+        ''', (root, prefix, upper))
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def save_dir_sizes(self, rows: List[tuple], removed: List[str]):
+        """Guarda filas (path, parent, mtime_ns, own_bytes, total_bytes) y borra las carpetas desaparecidas."""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO dir_sizes (path, parent, mtime_ns, own_bytes, total_bytes)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            self.conn.executemany('DELETE FROM dir_sizes WHERE path = ?', [(path,) for path in removed])
+
+    def apply_dir_size_delta(self, path: str, mtime_ns: int, own_bytes: int) -> List[str]:
+        """Actualiza los bytes propios de una carpeta y propaga la diferencia a sus padres.
+
+        Devuelve las carpetas cuyo total ha cambiado (la propia y sus ancestros cacheados).
+        """
+        row = self.conn.execute(
+            'SELECT parent, own_bytes FROM dir_sizes WHERE path = ?', (path,)
+        ).fetchone()
+        if row is None:
+            return []
+        parent, old_own = row
+        delta = own_bytes - old_own
+        touched = [path]
+        with self.conn:
+            self.conn.execute('''
+                UPDATE dir_sizes SET mtime_ns = ?, own_bytes = ?, total_bytes = total_bytes + ?
+                WHERE path = ?
+            ''', (mtime_ns, own_bytes, delta, path))
+            while parent and delta:
+                cursor = self.conn.execute(
+                    'UPDATE dir_sizes SET total_bytes = total_bytes + ? WHERE path = ?', (delta, parent)
+                )
+                if cursor.rowcount == 0:
+                    break
+                touched.append(parent)
+                parent = self.conn.execute('SELECT parent FROM dir_sizes WHERE path = ?', (parent,)).fetchone()[0]
+            if delta:
+                placeholders = ','.join('?' for _ in touched)
+                self.conn.execute(f'''
+                    UPDATE assets SET size = (SELECT total_bytes FROM dir_sizes WHERE dir_sizes.path = assets.path)
+                    WHERE path IN ({placeholders})
+                ''', touched)
+        return touched
+
+    def get_file_hash(self, dev: int, inode: int, size: int, mtime_ns: int) -> Optional[str]:
+        """Devuelve el hash cacheado si el fichero no ha cambiado de tamaño ni de mtime."""
+        row = self.conn.execute('''
+            SELECT digest FROM file_hashes WHERE dev = ? AND inode = ? AND size = ? AND mtime_ns = ?
+        ''', (dev, inode, size, mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def save_file_hashes(self, rows: List[tuple]):
+        """Guarda filas (dev, inode, size, mtime_ns, digest)."""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO file_hashes (dev, inode, size, mtime_ns, digest)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+
+    def get_assets_by_ids(self, asset_ids: List[int]) -> List[Dict]:
+        """Devuelve los assets en el mismo orden que asset_ids."""
+        if not asset_ids:
+            return []
+        placeholders = ','.join('?' for _ in asset_ids)
+        cursor = self.conn.execute(f'SELECT * FROM assets WHERE id IN ({placeholders})', asset_ids)
+        columns = [column[0] for column in cursor.description]
+        by_id = {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+        return [by_id[asset_id] for asset_id in asset_ids if asset_id in by_id]
+
+    def get_image_hash_mtimes(self, asset_id: int) -> Dict[str, int]:
+        cursor = self.conn.execute('SELECT path, mtime_ns FROM image_hashes WHERE asset_id = ?', (asset_id,))
+        return dict(cursor.fetchall())
+
+    def save_image_hashes(self, asset_id: int, rows: List[tuple], removed: List[str]):
+        """Guarda filas (path, mtime_ns, phash) de un asset y borra las imagenes que ya no estan."""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO image_hashes (path, asset_id, mtime_ns, phash)
+                VALUES (?, ?, ?, ?)
+            ''', [(path, asset_id, mtime_ns, phash) for path, mtime_ns, phash in rows])
+            self.conn.executemany('DELETE FROM image_hashes WHERE path = ?', [(path,) for path in removed])
+
+    def get_image_hashes(self) -> List[tuple]:
+        """Devuelve (asset_id, path, phash) de todas las imagenes."""
+        return self.conn.execute('SELECT asset_id, path, phash FROM image_hashes').fetchall()
+
+    def get_palette_mtimes(self, asset_id: int) -> Dict[str, int]:
+        cursor = self.conn.execute('SELECT path, mtime_ns FROM texture_palettes WHERE asset_id = ?', (asset_id,))
+        return dict(cursor.fetchall())
+
+    def save_palettes(self, asset_id: int, rows: List[tuple], removed: List[str]):
+        """Guarda filas (path, mtime_ns, palette) de un asset y borra las texturas que ya no estan."""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO texture_palettes (path, asset_id, mtime_ns, palette)
+                VALUES (?, ?, ?, ?)
+            ''', [(path, asset_id, mtime_ns, palette) for path, mtime_ns, palette in rows])
+            self.conn.executemany('DELETE FROM texture_palettes WHERE path = ?', [(path,) for path in removed])
+
+    def get_palettes(self) -> List[tuple]:
+        """Devuelve (asset_id, palette) de todas las texturas."""
+        return self.conn.execute('SELECT asset_id, palette FROM texture_palettes').fetchall()
+
+    def get_texture_mtimes(self, asset_id: int) -> Dict[str, int]:
+        cursor = self.conn.execute('SELECT path, mtime_ns FROM textures WHERE asset_id = ?', (asset_id,))
+        return dict(cursor.fetchall())
+
+    def save_textures(self, asset_id: int, rows: List[Dict], removed: List[str]):
+        """Guarda los metadatos de textura de un asset y borra las que ya no estan."""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO textures
+                    (path, asset_id, mtime_ns, format, width, height, channels, bit_depth, colour_space, resolution)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                row['path'], asset_id, row['mtime_ns'], row['format'], row['width'], row['height'],
+                row['channels'], row['bit_depth'], row['colour_space'], max(row['width'], row['height'])
+            ) for row in rows])
+            self.conn.executemany('DELETE FROM textures WHERE path = ?', [(path,) for path in removed])
+
+    def get_textures(self, asset_id: int) -> List[Dict]:
+        cursor = self.conn.execute('SELECT * FROM textures WHERE asset_id = ? ORDER BY path', (asset_id,))
+        return [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
+
+    def get_mesh_mtimes(self, asset_id: int) -> Dict[str, int]:
+        cursor = self.conn.execute('SELECT path, mtime_ns FROM meshes WHERE asset_id = ?', (asset_id,))
+        return dict(cursor.fetchall())
+
+    def save_meshes(self, asset_id: int, rows: List[Dict], removed: List[str]):
+        """Guarda las estadisticas de malla de un asset y borra las que ya no estan."""
+        values = []
+        for row in rows:
+            low, high = row['bbox_min'], row['bbox_max']
+            extent = max(h - l for l, h in zip(low, high)) if low else None
+            values.append((
+                row['path'], asset_id, row['mtime_ns'], row['format'], row['vertices'],
+                row['triangles'], row['materials'], *(low or (None,) * 3), *(high or (None,) * 3), extent
+            ))
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO meshes
+                    (path, asset_id, mtime_ns, format, vertices, triangles, materials,
+                     min_x, min_y, min_z, max_x, max_y, max_z, extent)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', values)
+            self.conn.executemany('DELETE FROM meshes WHERE path = ?', [(path,) for path in removed])
+
+    def get_meshes(self, asset_id: int) -> List[Dict]:
+        cursor = self.conn.execute('SELECT * FROM meshes WHERE asset_id = ? ORDER BY path', (asset_id,))
+        return [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
+
+    def get_asset_file_stats(self, asset_id: int) -> Dict[str, tuple]:
+        """{rel_path: (size, mtime_ns)} del manifiesto de un asset."""
+        cursor = self.conn.execute('SELECT rel_path, size, mtime_ns FROM asset_files WHERE asset_id = ?', (asset_id,))
+        return {rel_path: (size, mtime_ns) for rel_path, size, mtime_ns in cursor.fetchall()}
+
+    def save_asset_files(self, asset_id: int, rows: List[tuple], removed: List[str]):
+        """rows son (rel_path, size, mtime_ns, resolution, lod, slot)."""
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO asset_files (asset_id, rel_path, size, mtime_ns, resolution, lod, slot)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(asset_id, *row) for row in rows])
+            self.conn.executemany('DELETE FROM asset_files WHERE asset_id = ? AND rel_path = ?',
+                                  [(asset_id, rel_path) for rel_path in removed])
+
+    def get_asset_files(self, asset_id: int, resolution: Optional[str] = None, lod: Optional[int] = None) -> List[Dict]:
+        """Ficheros de un asset para una variante; los que no tienen resolucion o LOD entran siempre."""
+        sql = 'SELECT * FROM asset_files WHERE asset_id = ?'
+        params = [asset_id]
+        if resolution:
+            sql += ' AND (resolution IS NULL OR resolution = ?)'
+            params.append(resolution)
+        if lod is not None:
+            sql += ' AND (lod IS NULL OR lod = ?)'
+            params.append(lod)
+        cursor = self.conn.execute(sql + ' ORDER BY rel_path', params)
+        return [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
+
+    def get_asset_variants(self, asset_id: int) -> tuple:
+        """(resoluciones, LODs) que existen de verdad en el manifiesto de un asset."""
+        resolutions = [row[0] for row in self.conn.execute(
+            'SELECT DISTINCT resolution FROM asset_files WHERE asset_id = ? AND resolution IS NOT NULL', (asset_id,))]
+        lods = [row[0] for row in self.conn.execute(
+            'SELECT DISTINCT lod FROM asset_files WHERE asset_id = ? AND lod IS NOT NULL ORDER BY lod', (asset_id,))]
+        return sorted(resolutions, key=lambda label: int(label[:-1])), lods
+
+    def get_all_tags(self):
+        """saca las etiquetas de la base de datos"""
+        cursor = self.conn.execute('SELECT name FROM tags')
+        tags = [row[0] for row in cursor.fetchall()]
+        return tags
+    def search_assets(self, query: Optional[str] = None, asset_type: Optional[str] = None, 
+                      environment: Optional[str] = None, tags: Optional[List[str]] = None,
+                      resolution: Optional[str] = None, max_triangles: Optional[int] = None,
+                      max_extent: Optional[float] = None) -> List[Dict]:
+        """Busca assets según el nombre, tipo, entorno, etiquetas, resolucion de textura y tamaño de malla."""
+        sql_query = '''
+            SELECT assets.*
+            FROM assets
+            LEFT JOIN asset_tags ON assets.id = asset_tags.asset_id
+            LEFT JOIN tags ON tags.id = asset_tags.tag_id
+            WHERE 1=1
+        '''
+        parameters = []
+
+        # Filtro por nombre
+        if query:
+            sql_query += " AND assets.name LIKE ?"
+            parameters.append(f"%{query}%")
+
+        # Filtro por tipo
+        if asset_type:
+            sql_query += " AND assets.type = ?"
+            parameters.append(asset_type)
+
+        # Filtro por entorno
+        if environment:
+            sql_query += " AND assets.environment = ?"
+            parameters.append(environment)
+
+        # Filtro por etiquetas
+        if tags:
+            sql_query += " AND tags.name IN ({})".format(",".join("?" for _ in tags))
+            parameters.extend(tags)
+
+        # Filtro por resolucion (usa el indice de textures)
+        if resolution in RESOLUTION_RANGES:
+            sql_query += " AND assets.id IN (SELECT asset_id FROM textures WHERE resolution >= ? AND resolution < ?)"
+            parameters.extend(RESOLUTION_RANGES[resolution])
+
+        # Filtros de malla: poligonos y lado mayor de la caja envolvente
+        if max_triangles is not None:
+            sql_query += " AND assets.id IN (SELECT asset_id FROM meshes WHERE triangles <= ?)"
+            parameters.append(max_triangles)
+
+        if max_extent is not None:
+            sql_query += " AND assets.id IN (SELECT asset_id FROM meshes WHERE extent <= ?)"
+            parameters.append(max_extent)
+
+        # Ejecutar consulta
+        cursor = self.conn.execute(sql_query, parameters)
+        assets = [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
+        return assets
+
+def _scan_dir_own_bytes(path: str) -> tuple:
+    """Devuelve (mtime_ns, bytes de los ficheros directos, subcarpetas) de una sola carpeta."""
+    mtime_ns = os.stat(path).st_mtime_ns
+    own_bytes = 0
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    own_bytes += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+    return mtime_ns, own_bytes, subdirs
+
+def _scan_size_tree(root: str, cached: Dict[str, tuple]) -> tuple:
+    """Recorre root reutilizando las carpetas cuyo mtime no ha cambiado.
+
+    Devuelve (filas nuevas o cambiadas, carpetas que ya no existen, total de root).
+    """
+    children = {}
+    for path, (parent, *_) in cached.items():
+        children.setdefault(parent, []).append(path)
+
+    info = {}
+    subdirs_of = {}
+    order = []
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        entry = cached.get(path)
+        try:
+            if entry and os.stat(path).st_mtime_ns == entry[1]:
+                # La carpeta no ha ganado ni perdido entradas, no hace falta listarla
+                mtime_ns, own_bytes, subdirs = entry[1], entry[2], children.get(path, [])
+            else:
+                mtime_ns, own_bytes, subdirs = _scan_dir_own_bytes(path)
+        except OSError:
+            continue
+        info[path] = (mtime_ns, own_bytes)
+        subdirs_of[path] = subdirs
+        order.append(path)
+        stack.extend(subdirs)
+
+    # order esta en preorden, asi que al reves cada hija se suma antes que su padre
+    totals = {}
+    for path in reversed(order):
+        totals[path] = info[path][1] + sum(totals.get(child, 0) for child in subdirs_of[path])
+
+    rows = []
+    for path in order:
+        row = (os.path.dirname(path), info[path][0], info[path][1], totals[path])
+        if cached.get(path) != row:
+            rows.append((path, *row))
+    removed = [path for path in cached if path not in info]
+    return rows, removed, totals.get(root, 0)
+
+class SizeService:
+    """Tamaño real (recursivo) de las carpetas de assets, con subtotales cacheados por carpeta.
+
+    Una carpeta cuyo mtime no ha cambiado no se vuelve a listar. Las reescrituras de un
+    fichero existente no cambian el mtime de su carpeta, por eso quien escribe en una
+    carpeta de asset debe avisar con file_changed() o files_changed().
+    """
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+
+    def folder_size(self, path: str) -> int:
+        return self.folder_sizes([path]).get(path, 0)
+
+    def folder_sizes(self, paths: List[str]) -> Dict[str, int]:
+        """Calcula en paralelo el total en bytes de cada carpeta."""
+        roots = {os.path.abspath(path) for path in paths if os.path.isdir(path)}
+        totals = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(_scan_size_tree, root, self.db.get_dir_sizes(root)): root
+                for root in roots
+            }
+            # sqlite solo se toca desde este hilo, los workers solo hacen stat/scandir
+            for future in as_completed(futures):
+                rows, removed, total = future.result()
+                self.db.save_dir_sizes(rows, removed)
+                totals[futures[future]] = total
+        return {path: totals.get(os.path.abspath(path), 0) for path in paths}
+
+    def refresh_assets(self):
+        """Recalcula la columna size de todos los assets."""
+        assets = self.db.get_assets()
+        sizes = self.folder_sizes([asset['path'] for asset in assets])
+        for asset in assets:
+            if sizes[asset['path']] != asset['size']:
+                self.db.update_asset_size(asset['id'], sizes[asset['path']])
+
+    def file_changed(self, file_path: str) -> List[str]:
+        """Actualiza los totales tras crear, borrar o reescribir un fichero, sin recorrer el arbol."""
+        return self._directory_changed(os.path.dirname(os.path.abspath(file_path)))
+
+    def files_changed(self, file_paths: List[str]):
+        """Como file_changed() para muchos ficheros, que pueden estar en carpetas nuevas (LOD, exportaciones...).
+
+        Primero se recorren los assets que contienen algun fichero, lo que recoge las carpetas
+        nuevas, y luego se rehacen los bytes propios de cada carpeta, lo que recoge las reescrituras.
+        Los ficheros fuera de cualquier asset se ignoran.
+        """
+        directories = {os.path.dirname(os.path.abspath(path)) for path in file_paths}
+
+        def contains(root: str, directory: str) -> bool:
+            try:
+                return os.path.commonpath([root, directory]) == root
+            except ValueError:
+                return False
+
+        assets = [asset for asset in self.db.get_assets()
+                  if any(contains(os.path.abspath(asset['path']), directory) for directory in directories)]
+        if not assets:
+            return
+        sizes = self.folder_sizes([asset['path'] for asset in assets])
+        for asset in assets:
+            if sizes[asset['path']] != asset['size']:
+                self.db.update_asset_size(asset['id'], sizes[asset['path']])
+        for directory in directories:
+            self._directory_changed(directory)
+
+    def _directory_changed(self, directory: str) -> List[str]:
+        try:
+            mtime_ns, own_bytes, _ = _scan_dir_own_bytes(directory)
+        except OSError:
+            return []
+        return self.db.apply_dir_size_delta(directory, mtime_ns, own_bytes)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def _hash_file(path: str) -> str:
+    """BLAKE2b del contenido, leido por bloques para no cargar el fichero entero."""
+    digest = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+class HashService:
+    """Hashes de contenido en paralelo, cacheados por (dev, inode, size, mtime).
+
+    hashlib suelta el GIL con bloques grandes, asi que un pool de hilos basta.
+    """
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 2)
+
+    def hash_files(self, paths: List[str], progress=None) -> Dict[str, str]:
+        """Devuelve {path: digest}; solo se leen los ficheros que no estan en cache.
+
+        progress(hechos, total), si se da, se llama tras cada fichero leido.
+        """
+        digests = {}
+        pending = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            digest = self.db.get_file_hash(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+            if digest:
+                digests[path] = digest
+            else:
+                pending[path] = st
+
+        if pending:
+            rows = []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {pool.submit(_hash_file, path): path for path in pending}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    if progress:
+                        progress(done, len(futures))
+                    path = futures[future]
+                    try:
+                        digest = future.result()
+                    except OSError:
+                        continue
+                    st = pending[path]
+                    digests[path] = digest
+                    rows.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, digest))
+            self.db.save_file_hashes(rows)
+        return digests
+
+    def hash_file(self, path: str) -> Optional[str]:
+        return self.hash_files([path]).get(path)
+
+    def cached_digests(self, paths: List[str]) -> Dict[str, str]:
+        """{path: digest} solo de los ficheros que ya estan en cache; no lee ningun contenido."""
+        digests = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            digest = self.db.get_file_hash(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+            if digest:
+                digests[path] = digest
+        return digests
+
+    def duplicate_report(self, assets: Optional[List[Dict]] = None) -> List[Dict]:
+        """Grupos de ficheros identicos byte a byte entre assets, ordenados por bytes recuperables.
+
+        Solo se hashean los ficheros cuyo tamaño coincide con el de un fichero de otro asset.
+        Los hardlinks (mismo dev/inode) no cuentan como copias recuperables, ni las copias
+        que estan todas dentro del mismo asset.
+        """
+        if assets is None:
+            assets = self.db.get_assets()
+
+        by_size = {}
+        for asset in assets:
+            for root, _, files in os.walk(asset['path']):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    if st.st_size:
+                        by_size.setdefault(st.st_size, []).append((asset['id'], path, (st.st_dev, st.st_ino)))
+
+        candidates = [
+            entries for entries in by_size.values()
+            if len({file_id for _, _, file_id in entries}) > 1 and len({asset_id for asset_id, _, _ in entries}) > 1
+        ]
+        digests = self.hash_files([path for entries in candidates for _, path, _ in entries])
+
+        groups = {}
+        for entries in candidates:
+            for asset_id, path, file_id in entries:
+                if path in digests:
+                    groups.setdefault(digests[path], []).append((asset_id, path, file_id))
+
+        report = []
+        for digest, entries in groups.items():
+            copies = len({file_id for _, _, file_id in entries})
+            if copies < 2 or len({asset_id for asset_id, _, _ in entries}) < 2:
+                continue
+            size = os.path.getsize(entries[0][1])
+            report.append({
+                'digest': digest,
+                'size': size,
+                'files': [{'asset_id': asset_id, 'path': path} for asset_id, path, _ in entries],
+                'assets': sorted({asset_id for asset_id, _, _ in entries}),
+                'reclaimable': size * (copies - 1)
+            })
+        report.sort(key=lambda group: group['reclaimable'], reverse=True)
+        return report
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tga', '.tif', '.tiff', '.bmp', '.webp')
+TEXTURE_EXTENSIONS = IMAGE_EXTENSIONS + ('.exr',)
+
+def _asset_files_with_extensions(asset: Dict, extensions: tuple) -> List[str]:
+    paths = []
+    if asset.get('image_path') and os.path.isfile(asset['image_path']):
+        paths.append(asset['image_path'])
+    for root, _, files in os.walk(asset['path']):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.lower().endswith(extensions) and path not in paths:
+                paths.append(path)
+    return paths
+
+def _asset_image_files(asset: Dict) -> List[str]:
+    """Preview y texturas (imagenes que PIL sabe abrir) de la carpeta de un asset."""
+    return _asset_files_with_extensions(asset, IMAGE_EXTENSIONS)
+
+def _asset_texture_files(asset: Dict) -> List[str]:
+    """Todas las texturas del asset, incluidas las que PIL no sabe abrir."""
+    return _asset_files_with_extensions(asset, TEXTURE_EXTENSIONS)
+
+def _changed_files(paths: List[str], known: Dict[str, int]) -> Dict[str, int]:
+    """Devuelve {path: mtime_ns} de los ficheros nuevos o modificados respecto a known."""
+    changed = {}
+    for path in paths:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        if known.get(path) != mtime_ns:
+            changed[path] = mtime_ns
+    return changed
+
+def _load_small_image(path: str, max_size: int = 128) -> Image.Image:
+    """Abre una imagen reducida a max_size en RGB de 8 bits.
+
+    Con JPEG, draft() hace que el decodificador ya escale, sin decodificar a tamaño completo.
+    """
+    with Image.open(path) as image:
+        image.draft('RGB', (max_size, max_size))
+        if image.mode in ('I', 'I;16', 'I;16B', 'I;16L', 'F'):
+            # 16 bits / float: convert('L') recorta a 255, se normaliza a mano
+            data = np.asarray(image, dtype=np.float32)
+            peak = data.max() or 1.0
+            image = Image.fromarray((data * (255.0 / peak)).astype(np.uint8))
+        image = image.convert('RGB')
+    image.thumbnail((max_size, max_size), Image.BILINEAR)
+    return image
+
+def _to_signed64(value: int) -> int:
+    """sqlite solo guarda enteros con signo de 64 bits."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _compute_dhash(path: str) -> int:
+    """dHash de 64 bits: compara cada pixel con su vecino de la derecha en una imagen gris de 9x8."""
+    gray = _load_small_image(path, 64).convert('L').resize((9, 8), Image.BOX)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def _hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Distancia de Hamming entre un array uint64 y un hash."""
+    diff = np.bitwise_xor(hashes, np.uint64(value & 0xFFFFFFFFFFFFFFFF))
+    return _POPCOUNT8[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+def _bit_masks16(max_bits: int) -> np.ndarray:
+    """Todos los valores de 16 bits con como mucho max_bits bits a uno."""
+    values = np.arange(1 << 16, dtype=np.uint32)
+    counts = _POPCOUNT8[values & 0xFF] + _POPCOUNT8[values >> 8]
+    return values[counts <= max_bits].astype(np.uint16)
+
+class PerceptualHashIndex:
+    """Multi-index hashing sobre hashes de 64 bits partidos en 4 trozos de 16.
+
+    Si dos hashes estan a distancia <= r, al menos uno de los trozos esta a distancia
+    <= r // 4, asi que basta con sondear los vecinos de cada trozo en tablas ordenadas
+    y verificar solo esos candidatos.
+    """
+
+    CHUNKS = 4
+    MAX_PROBE_BITS = 3
+
+    def __init__(self, rows: List[tuple]):
+        self.asset_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.paths = [row[1] for row in rows]
+        self.hashes = np.array([row[2] & 0xFFFFFFFFFFFFFFFF for row in rows], dtype=np.uint64)
+        self.tables = []
+        for i in range(self.CHUNKS):
+            chunk = ((self.hashes >> np.uint64(16 * i)) & np.uint64(0xFFFF)).astype(np.uint16)
+            order = np.argsort(chunk, kind='stable')
+            self.tables.append((order, chunk[order]))
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def query(self, value: int, max_distance: int) -> tuple:
+        """Devuelve (indices, distancias) de los hashes a distancia <= max_distance."""
+        value &= 0xFFFFFFFFFFFFFFFF
+        probe_bits = max_distance // self.CHUNKS
+        if probe_bits > self.MAX_PROBE_BITS:
+            candidates = np.arange(len(self.paths))
+        else:
+            if probe_bits not in self._masks:
+                self._masks[probe_bits] = _bit_masks16(probe_bits)
+            masks = self._masks[probe_bits]
+            found = []
+            for i, (order, sorted_chunk) in enumerate(self.tables):
+                probes = np.bitwise_xor(masks, np.uint16((value >> (16 * i)) & 0xFFFF))
+                starts = np.searchsorted(sorted_chunk, probes, side='left')
+                ends = np.searchsorted(sorted_chunk, probes, side='right')
+                found.extend(order[start:end] for start, end in zip(starts, ends) if end > start)
+            if not found:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            candidates = np.unique(np.concatenate(found))
+        distances = _hamming_distances(self.hashes[candidates], value)
+        keep = distances <= max_distance
+        return candidates[keep], distances[keep]
+
+class PerceptualHashService:
+    """Detecta texturas y previews casi iguales (re-guardadas, recomprimidas, reescaladas)."""
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.max_workers = max_workers or (os.cpu_count() or 1)
+        self._index = None
+
+    def index_assets(self, assets: Optional[List[Dict]] = None):
+        """Calcula el dHash de las imagenes nuevas o modificadas de cada asset."""
+        if assets is None:
+            assets = self.db.get_assets()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for asset in assets:
+                known = self.db.get_image_hash_mtimes(asset['id'])
+                files = _asset_image_files(asset)
+                pending = _changed_files(files, known)
+                futures = {pool.submit(_compute_dhash, path): path for path in pending}
+                rows = []
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        rows.append((path, pending[path], _to_signed64(future.result())))
+                    except (OSError, ValueError, Image.DecompressionBombError):
+                        continue
+                removed = [path for path in known if path not in files]
+                self.db.save_image_hashes(asset['id'], rows, removed)
+        self._index = None
+
+    @property
+    def index(self) -> PerceptualHashIndex:
+        if self._index is None:
+            self._index = PerceptualHashIndex(self.db.get_image_hashes())
+        return self._index
+
+    def similar_assets(self, asset_id: int, max_distance: int = 10) -> List[tuple]:
+        """Devuelve [(asset_id, distancia, path)] de otros assets con alguna imagen parecida."""
+        index = self.index
+        best = {}
+        for i in np.flatnonzero(index.asset_ids == asset_id):
+            matches, distances = index.query(int(index.hashes[i]), max_distance)
+            for match, distance in zip(matches, distances):
+                other = int(index.asset_ids[match])
+                if other != asset_id and (other not in best or distance < best[other][0]):
+                    best[other] = (int(distance), index.paths[match])
+        return sorted(((other, distance, path) for other, (distance, path) in best.items()),
+                      key=lambda result: result[1])
+
+PALETTE_SIZE = 5
+
+# Mapas que no son de color: su paleta solo meteria ruido en la busqueda por color
+NON_COLOUR_TOKENS = {
+    'normal', 'nrm', 'nor', 'rough', 'roughness', 'metal', 'metalness', 'metallic', 'ao',
+    'occlusion', 'disp', 'displacement', 'height', 'bump', 'spec', 'specular', 'gloss',
+    'opacity', 'mask', 'aniso', 'anisotropy'
+}
+
+def _is_colour_texture(path: str) -> bool:
+    tokens = re.split(r'[^a-z0-9]+', os.path.splitext(os.path.basename(path))[0].lower())
+    return not NON_COLOUR_TOKENS.intersection(tokens)
+
+def _srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """sRGB de 8 bits (..., 3) a CIELAB (D65)."""
+    c = rgb.astype(np.float32) / 255.0
+    c = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = c @ np.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505]
+    ], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([
+        116.0 * f[..., 1] - 16.0,
+        500.0 * (f[..., 0] - f[..., 1]),
+        200.0 * (f[..., 1] - f[..., 2])
+    ], axis=-1).astype(np.float32)
+
+def _compute_palette(path: str, k: int = PALETTE_SIZE, iterations: int = 12) -> np.ndarray:
+    """k-means en Lab sobre la textura reducida a 64px; devuelve float32 (k, 4) con L, a, b, peso."""
+    pixels = _srgb_to_lab(np.asarray(_load_small_image(path, 64)).reshape(-1, 3))
+    # Inicializacion determinista: cuantiles de luminosidad
+    order = np.argsort(pixels[:, 0])
+    centres = pixels[order[((np.arange(k) + 0.5) / k * len(order)).astype(int)]].copy()
+    for _ in range(iterations):
+        distances = ((pixels[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k).astype(np.float32)
+        sums = np.zeros_like(centres)
+        np.add.at(sums, labels, pixels)
+        moved = counts > 0
+        new_centres = centres.copy()
+        new_centres[moved] = sums[moved] / counts[moved, None]
+        if np.allclose(new_centres, centres, atol=0.5):
+            centres = new_centres
+            break
+        centres = new_centres
+    labels = ((pixels[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    weights = np.bincount(labels, minlength=k).astype(np.float32) / len(pixels)
+    palette = np.column_stack([centres, weights]).astype(np.float32)
+    return palette[np.argsort(-weights)]
+
+class ColourIndex:
+    """Paletas de toda la biblioteca en un array (N, k, 4) para puntuar una busqueda de una pasada."""
+
+    def __init__(self, rows: List[tuple]):
+        self.asset_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.palettes = np.zeros((len(rows), PALETTE_SIZE, 4), dtype=np.float32)
+        for i, (_, blob) in enumerate(rows):
+            palette = np.frombuffer(blob, dtype=np.float32).reshape(-1, 4)[:PALETTE_SIZE]
+            self.palettes[i, :len(palette)] = palette
+        self.unique_ids, self.inverse = np.unique(self.asset_ids, return_inverse=True)
+
+    def rank(self, rgb: tuple) -> List[tuple]:
+        """Devuelve [(asset_id, puntuacion)] de menor a mayor distancia al color.
+
+        La puntuacion es el Delta E de la entrada mas cercana de la paleta dividido por la
+        raiz de su peso, para que un color que cubre casi toda la textura gane a una mancha.
+        """
+        if not len(self.asset_ids):
+            return []
+        target = _srgb_to_lab(np.array(rgb, dtype=np.uint8))
+        delta_e = np.linalg.norm(self.palettes[..., :3] - target, axis=2)
+        weights = self.palettes[..., 3]
+        with np.errstate(divide='ignore'):
+            scores = np.where(weights > 0, delta_e / np.sqrt(weights), np.inf).min(axis=1)
+        best = np.full(len(self.unique_ids), np.inf, dtype=np.float32)
+        np.minimum.at(best, self.inverse, scores)
+        order = np.argsort(best, kind='stable')
+        order = order[np.isfinite(best[order])]
+        return list(zip(self.unique_ids[order].tolist(), best[order].tolist()))
+
+class ColourPaletteService:
+    """Extrae la paleta dominante de las texturas de color y ordena la biblioteca por color."""
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.max_workers = max_workers or (os.cpu_count() or 1)
+        self._index = None
+
+    def index_assets(self, assets: Optional[List[Dict]] = None):
+        if assets is None:
+            assets = self.db.get_assets()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for asset in assets:
+                known = self.db.get_palette_mtimes(asset['id'])
+                files = [path for path in _asset_image_files(asset) if _is_colour_texture(path)]
+                pending = _changed_files(files, known)
+                futures = {pool.submit(_compute_palette, path): path for path in pending}
+                rows = []
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        rows.append((path, pending[path], future.result().tobytes()))
+                    except (OSError, ValueError, Image.DecompressionBombError):
+                        continue
+                removed = [path for path in known if path not in files]
+                self.db.save_palettes(asset['id'], rows, removed)
+        self._index = None
+
+    @property
+    def index(self) -> ColourIndex:
+        if self._index is None:
+            self._index = ColourIndex(self.db.get_palettes())
+        return self._index
+
+    def rank_assets(self, rgb: tuple) -> List[tuple]:
+        return self.index.rank(rgb)
+
+def _read_png_header(f) -> Dict:
+    f.seek(8)
+    length, chunk_type = struct.unpack('>I4s', f.read(8))
+    if chunk_type != b'IHDR':
+        raise ValueError("PNG sin IHDR")
+    width, height, bit_depth, colour_type = struct.unpack('>IIBB', f.read(10))
+    channels = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}.get(colour_type)
+    colour_space = 'sRGB'
+    f.seek(8 + 8 + length + 4)
+    # Los chunks de color van siempre antes de IDAT, no hace falta leer mas
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type in (b'IDAT', b'IEND'):
+            break
+        if chunk_type == b'iCCP':
+            colour_space = f.read(min(length, 80)).split(b'\0', 1)[0].decode('latin-1') or 'ICC'
+            f.seek(length - min(length, 80) + 4, os.SEEK_CUR)
+            continue
+        if chunk_type == b'gAMA' and length == 4:
+            gamma = struct.unpack('>I', f.read(4))[0]
+            if gamma == 100000:
+                colour_space = 'linear'
+            f.seek(4, os.SEEK_CUR)
+            continue
+        if chunk_type == b'tRNS' and colour_type == 3:
+            channels = 4
+        f.seek(length + 4, os.SEEK_CUR)
+    if colour_type == 3:
+        bit_depth = 8
+    return {'format': 'PNG', 'width': width, 'height': height, 'channels': channels,
+            'bit_depth': bit_depth, 'colour_space': colour_space}
+
+def _read_jpeg_header(f) -> Dict:
+    f.seek(2)
+    colour_space = None
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("JPEG sin SOF")
+        code = marker[1]
+        if code == 0xFF:
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            precision, height, width, components = struct.unpack('>BHHB', f.read(6))
+            if colour_space is None:
+                colour_space = {1: 'gray', 3: 'sRGB', 4: 'CMYK'}.get(components)
+            return {'format': 'JPEG', 'width': width, 'height': height, 'channels': components,
+                    'bit_depth': precision, 'colour_space': colour_space}
+        if code == 0xE2 and length >= 14:
+            if f.read(12) == b'ICC_PROFILE\0':
+                colour_space = 'ICC'
+            f.seek(length - 2 - 12, os.SEEK_CUR)
+            continue
+        f.seek(length - 2, os.SEEK_CUR)
+
+def _read_tga_header(f) -> Dict:
+    f.seek(0)
+    header = f.read(18)
+    if len(header) < 18:
+        raise ValueError("TGA truncado")
+    image_type = header[2]
+    width, height, pixel_depth, descriptor = struct.unpack('<HHBB', header[12:18])
+    alpha_bits = descriptor & 0x0F
+    if image_type in (3, 11):
+        channels = 2 if alpha_bits else 1
+    elif image_type in (1, 9):
+        channels = 3
+    elif image_type in (2, 10):
+        channels = 4 if alpha_bits or pixel_depth == 32 else 3
+    else:
+        raise ValueError("tipo de TGA no soportado")
+    bit_depth = 5 if pixel_depth in (15, 16) else 8
+    return {'format': 'TGA', 'width': width, 'height': height, 'channels': channels,
+            'bit_depth': bit_depth, 'colour_space': 'sRGB'}
+
+def _read_tiff_header(f) -> Dict:
+    def read(size):
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError("cabecera TIFF truncada")
+        return data
+
+    f.seek(0)
+    order = {b'II': '<', b'MM': '>'}[read(2)]
+    version = struct.unpack(order + 'H', read(2))[0]
+    if version == 43:
+        # BigTIFF: offsets de 8 bytes y entradas de 20
+        read(4)
+        f.seek(struct.unpack(order + 'Q', read(8))[0])
+        count = struct.unpack(order + 'Q', read(8))[0]
+        entry_format, entry_size, inline_size = order + 'HHQ8s', 20, 8
+    else:
+        f.seek(struct.unpack(order + 'I', read(4))[0])
+        count = struct.unpack(order + 'H', read(2))[0]
+        entry_format, entry_size, inline_size = order + 'HHI4s', 12, 4
+    type_sizes = {1: ('B', 1), 3: ('H', 2), 4: ('I', 4), 16: ('Q', 8)}
+
+    entries = {}
+    for raw in [read(entry_size) for _ in range(count)]:
+        tag, field_type, value_count, value = struct.unpack(entry_format, raw)
+        entries[tag] = (field_type, value_count, value)
+
+    def values(tag, default=None):
+        if tag not in entries:
+            return default
+        field_type, value_count, value = entries[tag]
+        if field_type not in type_sizes:
+            return default
+        code, size = type_sizes[field_type]
+        if value_count * size > inline_size:
+            f.seek(struct.unpack(order + ('Q' if inline_size == 8 else 'I'), value)[0])
+            value = read(value_count * size)
+        return list(struct.unpack(order + code * value_count, value[:value_count * size]))
+
+    # sin ancho o alto (o en un tipo que no leemos) no vale como textura
+    width, height = values(256), values(257)
+    if not width or not height:
+        raise ValueError("TIFF sin ancho o alto")
+    width, height = width[0], height[0]
+    bits = values(258, [1])
+    channels = values(277, [len(bits)])[0]
+    photometric = values(262, [2])[0]
+    sample_format = values(339, [1])[0]
+    if 34675 in entries:
+        colour_space = 'ICC'
+    elif sample_format == 3:
+        colour_space = 'linear'
+    else:
+        colour_space = {0: 'gray', 1: 'gray', 2: 'sRGB', 3: 'sRGB', 5: 'CMYK', 6: 'YCbCr', 8: 'CIELAB'}.get(photometric)
+    return {'format': 'TIFF', 'width': width, 'height': height, 'channels': channels,
+            'bit_depth': max(bits), 'colour_space': colour_space}
+
+EXR_MAGIC = b'\x76\x2f\x31\x01'
+
+def _read_exr_attributes(f) -> Dict[str, tuple]:
+    """Lee la cabecera de un EXR de una sola parte: {nombre: (tipo, bytes)}.
+
+    Deja el fichero posicionado justo despues de la cabecera (inicio de la tabla de offsets).
+    """
+    f.seek(0)
+    if f.read(4) != EXR_MAGIC:
+        raise ValueError("no es un EXR")
+    version = struct.unpack('<I', f.read(4))[0]
+    if version & 0x1000:
+        raise ValueError("EXR multiparte no soportado")
+
+    def read_string():
+        data = bytearray()
+        while True:
+            byte = f.read(1)
+            if not byte:
+                raise ValueError("cabecera EXR truncada")
+            if byte == b'\0':
+                return data.decode('latin-1')
+            data += byte
+
+    attributes = {}
+    while True:
+        name = read_string()
+        if not name:
+            return attributes
+        attribute_type = read_string()
+        size = struct.unpack('<i', f.read(4))[0]
+        if attribute_type == 'preview':
+            # la preview puede ser grande y no la usamos
+            f.seek(size, os.SEEK_CUR)
+            continue
+        attributes[name] = (attribute_type, f.read(size))
+
+def _parse_exr_channels(data: bytes) -> List[tuple]:
+    """chlist: [(nombre, pixel_type, x_sampling, y_sampling)]; pixel_type 0=uint, 1=half, 2=float."""
+    channels = []
+    offset = 0
+    while data[offset:offset + 1] != b'\0':
+        end = data.index(b'\0', offset)
+        name = data[offset:end].decode('latin-1')
+        pixel_type, _, x_sampling, y_sampling = struct.unpack('<iI2i', data[end + 1:end + 17])
+        channels.append((name, pixel_type, x_sampling, y_sampling))
+        offset = end + 17
+    return channels
+
+def _read_exr_header(f) -> Dict:
+    attributes = _read_exr_attributes(f)
+    channels = _parse_exr_channels(attributes['channels'][1])
+    x_min, y_min, x_max, y_max = struct.unpack('<4i', attributes['dataWindow'][1])
+    bit_depth = max((32 if pixel_type in (0, 2) else 16) for _, pixel_type, _, _ in channels)
+    return {'format': 'EXR', 'width': x_max - x_min + 1, 'height': y_max - y_min + 1,
+            'channels': len(channels), 'bit_depth': bit_depth,
+            'colour_space': 'linear' if 'chromaticities' not in attributes else 'linear (custom primaries)'}
+
+def _read_texture_header(path: str) -> Dict:
+    """Dimensiones, canales, bits y espacio de color leyendo solo la cabecera del fichero."""
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+        if magic.startswith(b'\x89PNG\r\n\x1a\n'):
+            return _read_png_header(f)
+        if magic.startswith(b'\xff\xd8'):
+            return _read_jpeg_header(f)
+        if magic[:4] in (b'II*\0', b'MM\0*', b'II+\0', b'MM\0+'):
+            return _read_tiff_header(f)
+        if magic.startswith(EXR_MAGIC):
+            return _read_exr_header(f)
+        if path.lower().endswith('.tga'):
+            # TGA no tiene numero magico al principio
+            return _read_tga_header(f)
+    raise ValueError(f"formato no soportado: {path}")
+
+def _read_texture_metadata(path: str, mtime_ns: int) -> Dict:
+    return {**_read_texture_header(path), 'path': path, 'mtime_ns': mtime_ns}
+
+class TextureMetadataService:
+    """Rellena la tabla textures leyendo solo cabeceras, sin decodificar pixeles."""
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+
+    def index_assets(self, assets: Optional[List[Dict]] = None):
+        if assets is None:
+            assets = self.db.get_assets()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for asset in assets:
+                known = self.db.get_texture_mtimes(asset['id'])
+                files = _asset_texture_files(asset)
+                pending = _changed_files(files, known)
+                futures = [pool.submit(_read_texture_metadata, path, mtime_ns) for path, mtime_ns in pending.items()]
+                rows = []
+                for future in as_completed(futures):
+                    try:
+                        rows.append(future.result())
+                    except (OSError, ValueError, KeyError, IndexError, struct.error):
+                        continue
+                removed = [path for path in known if path not in files]
+                self.db.save_textures(asset['id'], rows, removed)
+
+# Huecos de textura de AddAssetWindow
+TEXTURE_SLOTS = [
+    "Color/Albedo", "Normal", "Roughness", "Specular",
+    "Displacement", "Metalness", "Ambient Occlusion",
+    "Anisotropy", "Opacity", "Opacity Mask"
+]
+
+# Nombres habituales de cada hueco (Substance, Quixel, Poly Haven, ambientCG...)
+SLOT_NAME_TOKENS = {
+    "Color/Albedo": {'albedo', 'basecolor', 'basecolour', 'color', 'colour', 'col', 'diffuse', 'diff', 'alb'},
+    "Normal": {'normal', 'normalgl', 'normaldx', 'nrm', 'nor', 'norm', 'nml'},
+    "Roughness": {'roughness', 'rough', 'rgh', 'gloss', 'glossiness'},
+    "Specular": {'specular', 'spec', 'spc', 'reflection', 'refl'},
+    "Displacement": {'displacement', 'disp', 'height', 'bump', 'dsp', 'depth'},
+    "Metalness": {'metalness', 'metallic', 'metal', 'mtl', 'met'},
+    "Ambient Occlusion": {'ao', 'ambientocclusion', 'occlusion', 'occ'},
+    "Anisotropy": {'anisotropy', 'aniso', 'anisotropic'},
+    "Opacity": {'opacity', 'alpha', 'transparency', 'transparent'},
+    "Opacity Mask": {'opacitymask', 'mask', 'cutout', 'alphamask'}
+}
+# Sufijos de una letra de los motores de juego (roca_N.png); solo cuentan como ultimo token
+SLOT_SUFFIXES = {
+    'd': "Color/Albedo", 'c': "Color/Albedo", 'n': "Normal", 'r': "Roughness",
+    's': "Specular", 'h': "Displacement", 'm': "Metalness"
+}
+GRAYSCALE_SLOTS = ("Roughness", "Displacement", "Metalness", "Ambient Occlusion", "Opacity", "Opacity Mask")
+SLOT_MIN_CONFIDENCE = 0.25
+
+def _slot_name_scores(path: str) -> Dict[str, float]:
+    """Puntuacion por nombre de fichero: 0.9 si un token coincide, 0.6 si solo coincide el sufijo de una letra."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    # BaseColor -> base, color; T_Rock_01_N -> t, rock, 01, n
+    words = [word.lower() for word in re.findall(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+', stem)]
+    tokens = set(words) | {a + b for a, b in zip(words, words[1:])}
+    scores = {slot: 0.9 for slot, names in SLOT_NAME_TOKENS.items() if names & tokens}
+    # "opacity mask" tambien contiene "opacity"; gana el nombre mas especifico
+    if "Opacity Mask" in scores:
+        scores.pop("Opacity", None)
+    if not scores and words and words[-1] in SLOT_SUFFIXES:
+        scores[SLOT_SUFFIXES[words[-1]]] = 0.6
+    return scores
+
+def _slot_pixel_scores(path: str) -> Dict[str, float]:
+    """Puntuacion por estadisticas de pixeles sobre la textura reducida a 64px."""
+    pixels = np.asarray(_load_small_image(path, 64), dtype=np.float32).reshape(-1, 3) / 255.0
+    spread = float((pixels.max(axis=1) - pixels.min(axis=1)).mean())
+    mean = pixels.mean(axis=0)
+    scores = {}
+
+    # Un normal map en espacio tangente ronda (0.5, 0.5, 1) y sus vectores miden ~1
+    vectors = pixels * 2.0 - 1.0
+    unit_error = float(np.abs(np.linalg.norm(vectors, axis=1) - 1.0).mean())
+    centre_error = abs(mean[0] - 0.5) + abs(mean[1] - 0.5) + max(0.0, 0.85 - mean[2])
+    if spread > 0.05:
+        scores["Normal"] = float(np.clip(1.0 - 3.0 * centre_error - 2.0 * unit_error, 0.0, 1.0))
+
+    if spread < 0.03:
+        gray = pixels[:, 0]
+        binary = float(((gray < 0.1) | (gray > 0.9)).mean())
+        brightness = float(gray.mean())
+        for slot in GRAYSCALE_SLOTS:
+            scores[slot] = 0.5
+        scores["Specular"] = 0.4
+        scores["Metalness"] += 0.4 * binary
+        scores["Opacity Mask"] += 0.3 * binary
+        if brightness > 0.6:
+            scores["Ambient Occlusion"] += 0.3
+        if 0.3 < brightness < 0.7:
+            scores["Displacement"] += 0.2
+        scores["Color/Albedo"] = 0.1
+    elif scores.get("Normal", 0.0) < 0.5:
+        scores["Color/Albedo"] = 0.8
+        scores["Specular"] = 0.2
+    return scores
+
+def _classify_texture(path: str) -> Dict[str, float]:
+    """Confianza [0, 1] de cada hueco para una textura, mezclando nombre y pixeles."""
+    names = _slot_name_scores(path)
+    try:
+        pixels = _slot_pixel_scores(path)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # EXR y demas que PIL no abre (o que no quiere abrir de lo grandes que son): solo queda el nombre
+        pixels = {}
+    return {
+        slot: round(0.65 * names.get(slot, 0.0) + 0.35 * pixels.get(slot, 0.0), 3)
+        for slot in TEXTURE_SLOTS
+        if slot in names or slot in pixels
+    }
+
+def _texture_candidates(folder: str) -> List[tuple]:
+    """[(ruta, bytes)] de las texturas de una carpeta que pueden ir a un hueco."""
+    candidates = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.lower().endswith(TEXTURE_EXTENSIONS) or name.lower() == 'preview.png':
+                continue
+            path = os.path.join(root, name)
+            try:
+                candidates.append((path, os.path.getsize(path)))
+            except OSError:
+                continue
+    return candidates
+
+def _assign_texture_slots(scored: List[tuple]) -> Dict[str, tuple]:
+    """Reparte [(ruta, bytes, puntuaciones de _classify_texture)] en huecos: {hueco: (ruta, confianza)}.
+
+    Cada fichero va a un solo hueco y cada hueco a un solo fichero, de mayor a menor
+    confianza; si hay varias resoluciones del mismo mapa gana la mas pesada.
+    """
+    candidates = [
+        (confidence, size, slot, path)
+        for path, size, scores in scored
+        for slot, confidence in scores.items()
+        if confidence >= SLOT_MIN_CONFIDENCE
+    ]
+    assigned = {}
+    used = set()
+    for confidence, _, slot, path in sorted(candidates, reverse=True):
+        if slot not in assigned and path not in used:
+            assigned[slot] = (path, confidence)
+            used.add(path)
+    return assigned
+
+def _classify_texture_folder(folder: str) -> Dict[str, tuple]:
+    """Asigna las texturas de una carpeta a huecos: {hueco: (ruta, confianza)}."""
+    return _assign_texture_slots([(path, size, _classify_texture(path)) for path, size in _texture_candidates(folder)])
+
+class TextureSlotClassifier:
+    """Detecta los huecos de textura de muchas carpetas a la vez en un pool de procesos."""
+
+    POLL_MS = 100
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def classify_folder(self, folder: str) -> Dict[str, tuple]:
+        return _classify_texture_folder(folder)
+
+    def classify_folder_async(self, widget, executor, folder: str, on_done, on_error):
+        """Clasifica cada textura de folder en executor y llama a on_done({hueco: (ruta, confianza)})
+        desde el hilo de Tk; widget es el que sondea los futures.
+
+        Si el pool esta cerrado o se rompe (un proceso muere) se llama a on_error(error) en su lugar.
+        """
+        try:
+            futures = {executor.submit(_classify_texture, path): (path, size)
+                       for path, size in _texture_candidates(folder)}
+        except RuntimeError as error:
+            on_error(error)
+            return
+
+        def poll():
+            if not all(future.done() for future in futures):
+                widget.after(self.POLL_MS, poll)
+                return
+            for future in futures:
+                error = CancelledError() if future.cancelled() else future.exception()
+                if isinstance(error, (CancelledError, BrokenExecutor)):
+                    on_error(error)
+                    return
+            on_done(_assign_texture_slots([
+                (path, size, future.result()) for future, (path, size) in futures.items()
+                if future.exception() is None
+            ]))
+        poll()
+
+    def classify_folders(self, folders: List[str]) -> Dict[str, Dict[str, tuple]]:
+        """{carpeta: {hueco: (ruta, confianza)}} para todas las carpetas."""
+        if len(folders) < 2:
+            return {folder: _classify_texture_folder(folder) for folder in folders}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            chunksize = max(1, len(folders) // (self.max_workers * 8))
+            return dict(zip(folders, pool.map(_classify_texture_folder, folders, chunksize=chunksize)))
+
+MESH_EXTENSIONS = ('.obj', '.stl', '.glb', '.gltf')
+MESH_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Anclados con \n en vez de ^ y re.M: con un prefijo literal re busca mucho mas rapido
+_OBJ_VERTEX_RE = re.compile(rb'\nv[ \t]+(\S+[ \t]+\S+[ \t]+\S+)')
+_OBJ_FACE_RE = re.compile(rb'\nf[ \t]+([^\r\n]*)')
+_OBJ_USEMTL_RE = re.compile(rb'\nusemtl[ \t]+([^\r\n]+)')
+_STL_VERTEX_RE = re.compile(rb'\n[ \t]*vertex[ \t]+(\S+[ \t]+\S+[ \t]+\S+)')
+
+def _read_asset_info(asset: Dict) -> Dict:
+    """Lee el asset_info.json del asset, o {} si no existe."""
+    try:
+        with open(os.path.join(asset['path'], "asset_info.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _asset_mesh_files(asset: Dict) -> List[str]:
+    """Mallas de la carpeta del asset mas las rutas de modelo/LOD guardadas en su asset_info.json."""
+    paths = _asset_files_with_extensions({**asset, 'image_path': None}, MESH_EXTENSIONS)
+    info = _read_asset_info(asset)
+    for path in [info.get('model_path')] + info.get('lods', []):
+        if path and path.lower().endswith(MESH_EXTENSIONS) and os.path.isfile(path) and path not in paths:
+            paths.append(path)
+    return paths
+
+def _iter_line_chunks(data, chunk_size: int = MESH_CHUNK_SIZE):
+    """Trozos de data cortados en fin de linea, para procesar ficheros enormes con memoria acotada.
+
+    Cada trozo empieza por el \n de la linea anterior, asi todas las lineas van precedidas de \n.
+    """
+    start = 0
+    size = len(data)
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = data.rfind(b'\n', start, end)
+            if newline > start:
+                end = newline + 1
+        yield data[start - 1:end] if start else b'\n' + data[:end]
+        start = end
+
+def _parse_coordinates(coordinates: List[bytes]) -> np.ndarray:
+    """Convierte las capturas 'x y z' de las regex de vertices a un array (n, 3)."""
+    return np.array(b' '.join(coordinates).split(), dtype=np.float64).reshape(-1, 3)
+
+def _count_tokens(text: bytes) -> int:
+    """Numero de palabras separadas por espacios o tabuladores."""
+    if not text:
+        return 0
+    data = np.frombuffer(text, dtype=np.uint8)
+    blank = (data == 32) | (data == 9)
+    return int(np.count_nonzero(blank[:-1] & ~blank[1:])) + (not blank[0])
+
+class _BoundsAccumulator:
+    def __init__(self):
+        self.low = np.full(3, np.inf)
+        self.high = np.full(3, -np.inf)
+
+    def add(self, points: np.ndarray):
+        if len(points):
+            self.low = np.minimum(self.low, points.min(axis=0))
+            self.high = np.maximum(self.high, points.max(axis=0))
+
+    def result(self) -> tuple:
+        if not np.isfinite(self.low).all():
+            return None, None
+        return tuple(self.low.tolist()), tuple(self.high.tolist())
+
+def _obj_stats(data) -> Dict:
+    vertices = triangles = 0
+    materials = set()
+    bounds = _BoundsAccumulator()
+    for chunk in _iter_line_chunks(data):
+        coords = _OBJ_VERTEX_RE.findall(chunk)
+        if coords:
+            bounds.add(_parse_coordinates(coords))
+            vertices += len(coords)
+        faces = _OBJ_FACE_RE.findall(chunk)
+        if faces:
+            # un poligono de n vertices se triangula en n - 2 triangulos
+            triangles += _count_tokens(b' '.join(faces)) - 2 * len(faces)
+        materials.update(name.strip() for name in _OBJ_USEMTL_RE.findall(chunk))
+    low, high = bounds.result()
+    return {'format': 'OBJ', 'vertices': vertices, 'triangles': triangles,
+            'materials': len(materials), 'bbox_min': low, 'bbox_max': high}
+
+_STL_TRIANGLE = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+def _stl_stats(data) -> Dict:
+    bounds = _BoundsAccumulator()
+    count = struct.unpack('<I', data[80:84])[0] if len(data) >= 84 else -1
+    if len(data) == 84 + count * _STL_TRIANGLE.itemsize:
+        # binario: registros fijos de 50 bytes, se leen a trozos directamente del mmap
+        step = MESH_CHUNK_SIZE // _STL_TRIANGLE.itemsize
+        for first in range(0, count, step):
+            block = np.frombuffer(data, dtype=_STL_TRIANGLE, count=min(step, count - first),
+                                  offset=84 + first * _STL_TRIANGLE.itemsize)
+            bounds.add(block['vertices'].reshape(-1, 3))
+        triangles = count
+        fmt = 'STL'
+    else:
+        triangles = 0
+        for chunk in _iter_line_chunks(data):
+            coords = _STL_VERTEX_RE.findall(chunk)
+            if coords:
+                bounds.add(_parse_coordinates(coords))
+            triangles += chunk.count(b'endfacet')
+        fmt = 'STL (ASCII)'
+    low, high = bounds.result()
+    # STL no comparte vertices: cada triangulo trae los suyos
+    return {'format': fmt, 'vertices': triangles * 3, 'triangles': triangles,
+            'materials': 0, 'bbox_min': low, 'bbox_max': high}
+
+def _read_gltf_json(path: str) -> Dict:
+    """Devuelve el JSON de un .gltf o el chunk JSON de un .glb, sin leer los buffers."""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] != b'glTF':
+            f.seek(0)
+            return json.load(f)
+        chunk_length, chunk_type = struct.unpack('<I4s', f.read(8))
+        if chunk_type != b'JSON':
+            raise ValueError("GLB sin chunk JSON")
+        return json.loads(f.read(chunk_length))
+
+def _gltf_stats(document: Dict, fmt: str) -> Dict:
+    accessors = document.get('accessors', [])
+    vertices = triangles = 0
+    bounds = _BoundsAccumulator()
+    for mesh in document.get('meshes', []):
+        for primitive in mesh.get('primitives', []):
+            position = accessors[primitive['attributes']['POSITION']]
+            vertices += position['count']
+            if 'min' in position and 'max' in position:
+                bounds.add(np.array([position['min'], position['max']], dtype=np.float64))
+            count = accessors[primitive['indices']]['count'] if 'indices' in primitive else position['count']
+            mode = primitive.get('mode', 4)
+            if mode == 4:
+                triangles += count // 3
+            elif mode in (5, 6):
+                triangles += max(count - 2, 0)
+    low, high = bounds.result()
+    # min/max de los accessors estan en espacio local: no se aplican transformaciones de nodos
+    return {'format': fmt, 'vertices': vertices, 'triangles': triangles,
+            'materials': len(document.get('materials', [])), 'bbox_min': low, 'bbox_max': high}
+
+def _read_mesh_stats(path: str, mtime_ns: int = 0) -> Dict:
+    """Vertices, triangulos, materiales y caja envolvente de un OBJ/STL/glTF sin construir la malla."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.glb', '.gltf'):
+        stats = _gltf_stats(_read_gltf_json(path), extension[1:].upper())
+    else:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("malla vacia")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                stats = _stl_stats(data) if extension == '.stl' else _obj_stats(data)
+    return {**stats, 'path': path, 'mtime_ns': mtime_ns}
+
+class MeshStatsService:
+    """Rellena la tabla meshes; el parseo va en procesos porque es trabajo de CPU."""
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.max_workers = max_workers or (os.cpu_count() or 1)
+
+    def index_assets(self, assets: Optional[List[Dict]] = None):
+        if assets is None:
+            assets = self.db.get_assets()
+        work = []
+        for asset in assets:
+            known = self.db.get_mesh_mtimes(asset['id'])
+            files = _asset_mesh_files(asset)
+            work.append((asset, known, files, _changed_files(files, known)))
+        if not any(pending for _, _, _, pending in work):
+            return
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            for asset, known, files, pending in work:
+                futures = [pool.submit(_read_mesh_stats, path, mtime_ns) for path, mtime_ns in pending.items()]
+                rows = []
+                for future in as_completed(futures):
+                    try:
+                        rows.append(future.result())
+                    except (OSError, ValueError, KeyError, IndexError, struct.error):
+                        continue
+                removed = [path for path in known if path not in files]
+                self.db.save_meshes(asset['id'], rows, removed)
+
+_RESOLUTION_TOKEN_RE = re.compile(r'(?<![a-z0-9])(1|2|4|8|16)k(?![a-z0-9])', re.IGNORECASE)
+_LOD_TOKEN_RE = re.compile(r'(?<![a-z])lod[ _-]?(\d+)', re.IGNORECASE)
+
+def _scan_asset_files(root: str) -> List[tuple]:
+    """(rel_path, size, mtime_ns) de todos los ficheros bajo root, con scandir para no repetir stats."""
+    entries = []
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            entries.append((os.path.relpath(entry.path, root), st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return entries
+
+def _resolution_label(pixels: int) -> Optional[str]:
+    for label, (low, high) in RESOLUTION_RANGES.items():
+        if low <= pixels < high:
+            return label
+    return None
+
+def _parse_file_variant(rel_path: str, lods: Dict[str, int], slots: Dict[str, str],
+                        pixels: Dict[str, int]) -> tuple:
+    """(resolution, lod, slot) de un fichero: primero lo que dice asset_info.json / la cabecera, luego el nombre."""
+    path = os.path.normcase(rel_path)
+    name = os.path.basename(rel_path)
+    match = _RESOLUTION_TOKEN_RE.search(name)
+    resolution = match.group(1) + 'K' if match else None
+    if resolution is None and path in pixels:
+        resolution = _resolution_label(pixels[path])
+
+    lod = lods.get(path)
+    if lod is None:
+        match = _LOD_TOKEN_RE.search(name)
+        lod = int(match.group(1)) if match else None
+
+    slot = slots.get(path)
+    if slot is None and name.lower().endswith(TEXTURE_EXTENSIONS) and name.lower() != 'preview.png':
+        scores = _slot_name_scores(name)
+        slot = max(scores, key=scores.get) if scores else None
+    return resolution, lod, slot
+
+class ManifestService:
+    """Mantiene asset_files al dia: solo se reparsean los ficheros nuevos o con otro tamaño/mtime.
+
+    Recorrer carpetas es sobre todo esperar al disco (o a la red), asi que va con hilos.
+    """
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+
+    def index_assets(self, assets: Optional[List[Dict]] = None):
+        if assets is None:
+            assets = self.db.get_assets()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(_scan_asset_files, asset['path']): asset for asset in assets}
+            for future in as_completed(futures):
+                asset = futures[future]
+                self._save_manifest(asset, future.result())
+
+    def _save_manifest(self, asset: Dict, entries: List[tuple]):
+        known = self.db.get_asset_file_stats(asset['id'])
+        changed = [entry for entry in entries if known.get(entry[0]) != entry[1:]]
+        current = {entry[0] for entry in entries}
+        removed = [rel_path for rel_path in known if rel_path not in current]
+        if not changed and not removed:
+            return
+
+        root = asset['path']
+        def relative(path: str) -> str:
+            return os.path.normcase(os.path.relpath(os.path.join(root, path), root))
+
+        info = _read_asset_info(asset)
+        lods = {relative(path): level for level, path in enumerate(info.get('lods', [])) if path}
+        slots = {relative(path): slot for slot, path in (info.get('textures') or {}).items() if path}
+        pixels = {relative(row['path']): row['resolution'] for row in self.db.get_textures(asset['id'])}
+        rows = [
+            (rel_path, size, mtime_ns, *_parse_file_variant(rel_path, lods, slots, pixels))
+            for rel_path, size, mtime_ns in changed
+        ]
+        self.db.save_asset_files(asset['id'], rows, removed)
+
+THUMBNAIL_SIZE = 256
+
+class ThumbnailCache:
+    """Miniaturas PNG en disco, con nombre derivado de la ruta, tamaño y mtime del original."""
+
+    def __init__(self, config: Config):
+        self.folder = Path(config.get_path('cache_folder')) / 'thumbnails'
+
+    def path_for(self, source: str) -> str:
+        st = os.stat(source)
+        key = f"{os.path.abspath(source)}|{st.st_size}|{st.st_mtime_ns}"
+        return str(self.folder / (hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png'))
+
+    def get(self, source: str) -> Optional[str]:
+        try:
+            path = self.path_for(source)
+        except OSError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def material_path_for(self, digests: Dict[str, str], swatch: bool = False) -> str:
+        """Preview de material indexada por el contenido de sus mapas: solo cambia si cambia algun mapa."""
+        key = '|'.join(['swatch' if swatch else 'sphere', str(THUMBNAIL_SIZE)]
+                       + [f"{slot}={digest}" for slot, digest in sorted(digests.items())])
+        return str(self.folder.parent / 'materials' / (hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png'))
+
+def _save_thumbnail(image: Image.Image, destination: str, size: int = THUMBNAIL_SIZE) -> str:
+    """Reduce y guarda la miniatura; se escribe a un temporal para no dejar PNGs a medias en la cache."""
+    image.thumbnail((size, size), Image.LANCZOS)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporary = f"{destination}.{os.getpid()}.tmp"
+    image.save(temporary, format='PNG')
+    os.replace(temporary, destination)
+    return destination
+
+def _open_blend(path: str):
+    """Abre un .blend como stream de solo lectura, descomprimiendo gzip o zstd si hace falta."""
+    f = open(path, 'rb')
+    magic = f.read(4)
+    f.seek(0)
+    if magic[:2] == b'\x1f\x8b':
+        f.close()
+        return gzip.open(path, 'rb')
+    if magic == b'\x28\xb5\x2f\xfd':
+        if zstandard is None:
+            f.close()
+            raise ValueError("el .blend esta comprimido con zstd y falta el modulo zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+    return f
+
+def _read_blend_thumbnail(path: str) -> Image.Image:
+    """Saca la miniatura que Blender guarda en el bloque TEST, recorriendo solo las cabeceras de bloque."""
+    with _open_blend(path) as f:
+        header = f.read(12)
+        if header[:7] != b'BLENDER':
+            raise ValueError("no es un .blend")
+        if header[7:9].isdigit():
+            # Formato de Blender 5.0+ ('BLENDER17-01v0500'): cabeceras de bloque de 64 bits
+            header += f.read(int(header[7:9]) - 12)
+            endian = '<' if header[12:13] == b'v' else '>'
+            block_format = endian + '4siQqq'
+            length_field = 3
+        else:
+            pointer_size = 8 if header[7:8] == b'-' else 4
+            endian = '<' if header[8:9] == b'v' else '>'
+            block_format = endian + '4si' + ('Q' if pointer_size == 8 else 'I') + 'ii'
+            length_field = 1
+        block_size = struct.calcsize(block_format)
+
+        while True:
+            raw = f.read(block_size)
+            if len(raw) < block_size:
+                break
+            fields = struct.unpack(block_format, raw)
+            code, length = fields[0], fields[length_field]
+            if code == b'ENDB':
+                break
+            if code == b'TEST':
+                width, height = struct.unpack(endian + 'ii', f.read(8))
+                pixels = f.read(width * height * 4)
+                if width <= 0 or height <= 0 or len(pixels) < width * height * 4:
+                    break
+                # las filas van de abajo a arriba
+                return Image.frombytes('RGBA', (width, height), pixels).transpose(Image.FLIP_TOP_BOTTOM)
+            f.seek(length, os.SEEK_CUR)
+    raise ValueError("el .blend no tiene miniatura")
+
+_OBJ_INDEX_SUFFIX_RE = re.compile(rb'/\S*')
+
+def _obj_face_triangles(faces: List[bytes]) -> tuple:
+    """Triangula en abanico las lineas 'f' capturadas; devuelve (a, b, c, ids de linea) con indices OBJ crudos."""
+    text = _OBJ_INDEX_SUFFIX_RE.sub(b'', b'\n'.join(faces))
+    data = np.frombuffer(text, dtype=np.uint8)
+    blank = (data == 32) | (data == 9) | (data == 10) | (data == 13)
+    token_starts = ~blank & np.concatenate(([True], blank[:-1]))
+    line_of_token = np.cumsum(data == 10)[token_starts]
+    counts = np.bincount(line_of_token, minlength=len(faces))
+    indices = np.array(text.split(), dtype=np.int64)
+
+    first = np.cumsum(counts) - counts
+    fan = np.maximum(counts - 2, 0)
+    face_of_triangle = np.repeat(np.arange(len(faces)), fan)
+    step = np.arange(len(face_of_triangle)) - np.repeat(np.cumsum(fan) - fan, fan)
+    base = first[face_of_triangle]
+    return indices[base], indices[base + step + 1], indices[base + step + 2], face_of_triangle
+
+def _load_obj(path: str) -> tuple:
+    vertex_blocks = []
+    triangle_blocks = []
+    vertex_count = 0
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("malla vacia")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for chunk in _iter_line_chunks(data):
+                coords = _OBJ_VERTEX_RE.findall(chunk)
+                faces = _OBJ_FACE_RE.findall(chunk)
+                if faces:
+                    a, b, c, face_lines = _obj_face_triangles(faces)
+                    triangles = np.stack([a, b, c], axis=1)
+                    if (triangles < 0).any():
+                        # indices negativos: relativos a los vertices leidos hasta esa linea
+                        vertex_starts = [m.start() for m in _OBJ_VERTEX_RE.finditer(chunk)]
+                        face_starts = np.array([m.start() for m in _OBJ_FACE_RE.finditer(chunk)])
+                        seen = vertex_count + np.searchsorted(vertex_starts, face_starts)[face_lines]
+                        triangles = np.where(triangles < 0, triangles + seen[:, None] + 1, triangles)
+                    triangle_blocks.append(triangles - 1)
+                if coords:
+                    vertex_blocks.append(_parse_coordinates(coords).astype(np.float32))
+                    vertex_count += len(coords)
+    if not vertex_blocks or not triangle_blocks:
+        raise ValueError("el OBJ no tiene caras")
+    return np.concatenate(vertex_blocks), np.concatenate(triangle_blocks).astype(np.int32)
+
+def _load_stl(path: str) -> tuple:
+    with open(path, 'rb') as f:
+        data = f.read()
+    count = struct.unpack('<I', data[80:84])[0] if len(data) >= 84 else -1
+    if len(data) == 84 + count * _STL_TRIANGLE.itemsize:
+        vertices = np.frombuffer(data, dtype=_STL_TRIANGLE, count=count, offset=84)['vertices'].reshape(-1, 3)
+    else:
+        coords = []
+        for chunk in _iter_line_chunks(data):
+            coords.extend(_STL_VERTEX_RE.findall(chunk))
+        vertices = _parse_coordinates(coords)
+        vertices = vertices[:len(vertices) // 3 * 3]
+    return vertices.astype(np.float32), np.arange(len(vertices), dtype=np.int32).reshape(-1, 3)
+
+_GLTF_COMPONENT_TYPES = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+_GLTF_TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT4': 16}
+
+def _gltf_node_matrix(node: Dict) -> np.ndarray:
+    if 'matrix' in node:
+        return np.array(node['matrix'], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get('rotation', (0.0, 0.0, 0.0, 1.0))
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.array(node.get('scale', (1.0, 1.0, 1.0)))
+    matrix[:3, 3] = node.get('translation', (0.0, 0.0, 0.0))
+    return matrix
+
+def _load_gltf(path: str) -> tuple:
+    with open(path, 'rb') as f:
+        data = f.read()
+    binary = None
+    if data[:4] == b'glTF':
+        json_length = struct.unpack_from('<I', data, 12)[0]
+        document = json.loads(data[20:20 + json_length])
+        offset = 20 + json_length
+        if offset + 8 <= len(data):
+            binary_length, chunk_type = struct.unpack_from('<I4s', data, offset)
+            if chunk_type == b'BIN\0':
+                binary = memoryview(data)[offset + 8:offset + 8 + binary_length]
+    else:
+        document = json.loads(data)
+
+    buffers = []
+    for buffer in document.get('buffers', []):
+        uri = buffer.get('uri')
+        if uri is None:
+            buffers.append(binary)
+        elif uri.startswith('data:'):
+            buffers.append(base64.b64decode(uri.split(',', 1)[1]))
+        else:
+            with open(os.path.join(os.path.dirname(path), urllib.parse.unquote(uri)), 'rb') as f:
+                buffers.append(f.read())
+
+    def read_accessor(index: int) -> np.ndarray:
+        accessor = document['accessors'][index]
+        view = document['bufferViews'][accessor['bufferView']]
+        dtype = np.dtype(_GLTF_COMPONENT_TYPES[accessor['componentType']])
+        width = _GLTF_TYPE_SIZES[accessor['type']]
+        stride = view.get('byteStride') or dtype.itemsize * width
+        return np.ndarray(
+            shape=(accessor['count'], width), dtype=dtype, buffer=buffers[view['buffer']],
+            offset=view.get('byteOffset', 0) + accessor.get('byteOffset', 0), strides=(stride, dtype.itemsize)
+        )
+
+    vertex_blocks = []
+    triangle_blocks = []
+    vertex_count = 0
+    nodes = document.get('nodes', [])
+    scenes = document.get('scenes')
+    if scenes:
+        stack = [(index, np.eye(4)) for index in scenes[document.get('scene', 0)].get('nodes', [])]
+    else:
+        stack = [(index, np.eye(4)) for index, node in enumerate(nodes) if 'mesh' in node]
+    while stack:
+        index, parent = stack.pop()
+        node = nodes[index]
+        world = parent @ _gltf_node_matrix(node)
+        stack.extend((child, world) for child in node.get('children', []))
+        if 'mesh' not in node:
+            continue
+        for primitive in document['meshes'][node['mesh']].get('primitives', []):
+            if primitive.get('mode', 4) != 4:
+                continue
+            positions = read_accessor(primitive['attributes']['POSITION']).astype(np.float64)
+            if 'indices' in primitive:
+                indices = read_accessor(primitive['indices']).ravel().astype(np.int64)
+            else:
+                indices = np.arange(len(positions))
+            positions = positions @ world[:3, :3].T + world[:3, 3]
+            vertex_blocks.append(positions.astype(np.float32))
+            triangle_blocks.append(indices[:len(indices) // 3 * 3].reshape(-1, 3) + vertex_count)
+            vertex_count += len(positions)
+    if not triangle_blocks:
+        raise ValueError("el glTF no tiene triangulos")
+    return np.concatenate(vertex_blocks), np.concatenate(triangle_blocks).astype(np.int32)
+
+class MeshCache:
+    """Mallas ya parseadas en .npy, por hash de contenido, para volver a cargarlas con mmap sin parsear.
+
+    Cada malla son dos ficheros, <hash>.vertices.npy y <hash>.faces.npy. Leer una entrada le
+    actualiza el mtime, y al guardar se borran las de mtime mas antiguo hasta quedar bajo el tope.
+    Solo guarda rutas y numeros, asi que se puede pasar a los procesos de los pools.
+    """
+
+    def __init__(self, config: Config):
+        self.folder = str(Path(config.get_path('cache_folder')) / 'meshes')
+        self.limit = config.get_mesh_cache_limit()
+
+    def paths_for(self, digest: str) -> tuple:
+        return (os.path.join(self.folder, f"{digest}.vertices.npy"),
+                os.path.join(self.folder, f"{digest}.faces.npy"))
+
+    def load(self, path: str, digest: Optional[str] = None) -> tuple:
+        digest = digest or _hash_file(path)
+        vertices_path, faces_path = self.paths_for(digest)
+        try:
+            vertices = np.load(vertices_path, mmap_mode='r')
+            faces = np.load(faces_path, mmap_mode='r')
+        except (OSError, ValueError):
+            vertices, faces = _parse_mesh(path)
+            self.store(digest, vertices, faces)
+            return vertices, faces
+        try:
+            os.utime(vertices_path)
+            os.utime(faces_path)
+        except OSError:
+            pass
+        return vertices, faces
+
+    def store(self, digest: str, vertices: np.ndarray, faces: np.ndarray):
+        os.makedirs(self.folder, exist_ok=True)
+        for destination, array in zip(self.paths_for(digest), (vertices, faces)):
+            with tempfile.NamedTemporaryFile(dir=self.folder, prefix='tmp-', suffix='.npy', delete=False) as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(f.name, destination)
+        self.evict()
+
+    def evict(self):
+        """Borra las mallas menos usadas hasta que la cache quede por debajo del tope."""
+        entries = {}
+        with os.scandir(self.folder) as scan:
+            for entry in scan:
+                if entry.name.endswith('.npy') and not entry.name.startswith('tmp-'):
+                    st = entry.stat()
+                    size, mtime = entries.get(entry.name.split('.')[0], (0, 0))
+                    entries[entry.name.split('.')[0]] = (size + st.st_size, max(mtime, st.st_mtime_ns))
+        total = sum(size for size, _ in entries.values())
+        for digest, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.limit:
+                break
+            for path in self.paths_for(digest):
+                try:
+                    os.remove(path)
+                except OSError:
+                    # en Windows no se puede borrar si otro proceso la tiene mapeada; ya caera
+                    pass
+            total -= size
+
+# Cache de mallas del proceso; los pools la ponen con _use_mesh_cache como initializer
+_mesh_cache: Optional[MeshCache] = None
+
+def _use_mesh_cache(cache: Optional[MeshCache]):
+    global _mesh_cache
+    _mesh_cache = cache
+
+def _load_mesh(path: str, digest: Optional[str] = None) -> tuple:
+    """Carga una malla como (vertices float32 (n, 3), triangulos int32 (m, 3)).
+
+    Con la cache de mallas activa son vistas de solo lectura sobre los .npy mapeados.
+    """
+    if _mesh_cache is not None:
+        return _mesh_cache.load(path, digest)
+    return _parse_mesh(path)
+
+def _parse_mesh(path: str) -> tuple:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.obj':
+        return _load_obj(path)
+    if extension == '.stl':
+        return _load_stl(path)
+    if extension in ('.glb', '.gltf'):
+        return _load_gltf(path)
+    raise ValueError(f"formato de malla no soportado: {path}")
+
+# Peso de los planos que sujetan los bordes abiertos, para que el contorno no se encoja
+QEM_BOUNDARY_WEIGHT = 100.0
+QEM_MAX_ROUNDS = 200
+
+def _mesh_edges(faces: np.ndarray) -> tuple:
+    """(aristas unicas (e, 2) ordenadas, cuantas caras usan cada una, una cara de cada arista)."""
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    owners = np.tile(np.arange(len(faces)), 3)
+    edges.sort(axis=1)
+    unique, first, counts = np.unique(edges, axis=0, return_index=True, return_counts=True)
+    return unique, counts, owners[first]
+
+def _vertex_quadrics(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Cuadrica (n, 4, 4) de cada vertice: planos de sus caras ponderados por area, mas los de borde."""
+    p0, p1, p2 = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    normals = np.cross(p1 - p0, p2 - p0)
+    areas = np.linalg.norm(normals, axis=1)
+    normals = normals / np.maximum(areas, 1e-30)[:, None]
+    planes = np.concatenate([normals, -(normals * p0).sum(axis=1)[:, None]], axis=1)
+    quadrics = (planes[:, :, None] * planes[:, None, :] * (areas / 2)[:, None, None]).reshape(-1, 16)
+    indices = faces.T.ravel()
+    weights = np.tile(quadrics, (3, 1))
+
+    # Bordes: plano que contiene la arista y es perpendicular a su cara
+    edges, counts, owners = _mesh_edges(faces)
+    boundary = counts == 1
+    if boundary.any():
+        a, b = edges[boundary, 0], edges[boundary, 1]
+        direction = vertices[b] - vertices[a]
+        side = np.cross(direction, normals[owners[boundary]])
+        side /= np.maximum(np.linalg.norm(side, axis=1), 1e-30)[:, None]
+        side_planes = np.concatenate([side, -(side * vertices[a]).sum(axis=1)[:, None]], axis=1)
+        weight = QEM_BOUNDARY_WEIGHT * (direction ** 2).sum(axis=1)
+        side_quadrics = (side_planes[:, :, None] * side_planes[:, None, :] * weight[:, None, None]).reshape(-1, 16)
+        indices = np.concatenate([indices, a, b])
+        weights = np.concatenate([weights, side_quadrics, side_quadrics])
+
+    result = np.empty((len(vertices), 16))
+    for column in range(16):
+        result[:, column] = np.bincount(indices, weights=weights[:, column], minlength=len(vertices))
+    return result.reshape(-1, 4, 4)
+
+def _collapse_targets(quadrics: np.ndarray, vertices: np.ndarray, edges: np.ndarray) -> tuple:
+    """(posicion optima, error) de colapsar cada arista; si el sistema es singular, el mejor extremo o el punto medio."""
+    a, b = edges[:, 0], edges[:, 1]
+    q = quadrics[a] + quadrics[b]
+    middle = (vertices[a] + vertices[b]) / 2
+    matrix = q[:, :3, :3]
+    solvable = np.abs(np.linalg.det(matrix)) > 1e-12 * np.abs(matrix).max(axis=(1, 2)) ** 3
+    matrix = np.where(solvable[:, None, None], matrix, np.eye(3))
+    optimal = np.linalg.solve(matrix, -q[:, :3, 3][:, :, None])[:, :, 0]
+    # un optimo muy lejos de la arista es casi siempre un sistema mal condicionado
+    length = np.linalg.norm(vertices[b] - vertices[a], axis=1)
+    solvable &= np.linalg.norm(optimal - middle, axis=1) <= length
+    optimal = np.where(solvable[:, None], optimal, middle)
+
+    candidates = np.stack([optimal, vertices[a], vertices[b]], axis=1)
+    homogeneous = np.concatenate([candidates, np.ones(candidates.shape[:2] + (1,))], axis=2)
+    errors = np.einsum('eci,eij,ecj->ec', homogeneous, q, homogeneous)
+    best = errors.argmin(axis=1)
+    rows = np.arange(len(edges))
+    return candidates[rows, best], np.maximum(errors[rows, best], 0.0)
+
+def _decimate_mesh(vertices: np.ndarray, faces: np.ndarray, target_faces: int) -> tuple:
+    """Reduce la malla a unos target_faces triangulos con el error cuadratico de Garland-Heckbert.
+
+    En vez de una cola de prioridad arista a arista, cada ronda colapsa a la vez todas las
+    aristas que son la mas barata de sus dos vertices (asi no comparten vertice), descartando
+    las que darian la vuelta a alguna cara. Todo va en arrays de NumPy.
+    """
+    positions = vertices.astype(np.float64)
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    quadrics = _vertex_quadrics(positions, faces)
+    for _ in range(QEM_MAX_ROUNDS):
+        if len(faces) <= target_faces:
+            break
+        edges, _, _ = _mesh_edges(faces)
+        targets, errors = _collapse_targets(quadrics, positions, edges)
+        # a igual error (zonas planas) primero las aristas cortas
+        lengths = ((positions[edges[:, 1]] - positions[edges[:, 0]]) ** 2).sum(axis=1)
+        order = np.lexsort((lengths, errors))
+        # arista mas barata de cada vertice: la primera en el orden en que aparece
+        endpoints = edges[order].ravel()
+        ids = np.repeat(order, 2)
+        vertex_ids, first = np.unique(endpoints, return_index=True)
+        cheapest = np.full(len(positions), -1)
+        cheapest[vertex_ids] = ids[first]
+        selected = order[(cheapest[edges[order, 0]] == order) & (cheapest[edges[order, 1]] == order)]
+        # cada colapso quita unas dos caras; no pasarse del objetivo
+        selected = selected[:max(1, (len(faces) - target_faces + 1) // 2)]
+
+        # caras que se darian la vuelta
+        old_normals = np.cross(positions[faces[:, 1]] - positions[faces[:, 0]],
+                               positions[faces[:, 2]] - positions[faces[:, 0]])
+        remap = np.arange(len(positions))
+        moved = positions.copy()
+        remap[edges[selected, 1]] = edges[selected, 0]
+        moved[edges[selected, 0]] = targets[selected]
+        new_faces = remap[faces]
+        new_normals = np.cross(moved[new_faces[:, 1]] - moved[new_faces[:, 0]],
+                               moved[new_faces[:, 2]] - moved[new_faces[:, 0]])
+        alive = (new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2]) \
+            & (new_faces[:, 2] != new_faces[:, 0])
+        flipped = alive & ((old_normals * new_normals).sum(axis=1) <= 0)
+        if flipped.any():
+            # se descartan los colapsos cuyo vertice movido toca alguna cara girada
+            bad = np.zeros(len(positions), dtype=bool)
+            bad[new_faces[flipped].ravel()] = True
+            selected = selected[~bad[edges[selected, 0]]]
+            if not len(selected):
+                break
+            remap = np.arange(len(positions))
+            remap[edges[selected, 1]] = edges[selected, 0]
+            new_faces = remap[faces]
+            alive = (new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2]) \
+                & (new_faces[:, 2] != new_faces[:, 0])
+
+        keep, drop = edges[selected, 0], edges[selected, 1]
+        positions[keep] = targets[selected]
+        quadrics[keep] += quadrics[drop]
+        faces = new_faces[alive]
+        # dos caras que acaban con los mismos vertices: se queda una
+        _, unique = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+        faces = faces[np.sort(unique)]
+
+    used, faces = np.unique(faces, return_inverse=True)
+    return positions[used].astype(np.float32), faces.reshape(-1, 3).astype(np.int32)
+
+def _write_obj(path: str, vertices: np.ndarray, faces: np.ndarray):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        f.write("# LOD generado por VaultXplorer\n")
+        np.savetxt(f, vertices, fmt='v %.6g %.6g %.6g')
+        np.savetxt(f, faces + 1, fmt='f %d %d %d')
+    os.replace(temporary, path)
+
+def _generate_lods(source: str, digest: Optional[str], ratios: List[float], cache_folder: str) -> List[str]:
+    """Genera los LOD de una malla OBJ, cada uno a partir del anterior, cacheados como <hash>_<ratio>.obj.
+
+    Sin digest (no estaba en la cache de hashes) se hashea aqui, en el proceso.
+    """
+    digest = digest or _hash_file(source)
+    os.makedirs(cache_folder, exist_ok=True)
+    paths = [os.path.join(cache_folder, f"{digest}_{ratio:g}.obj") for ratio in ratios]
+    if all(os.path.exists(path) for path in paths):
+        return paths
+    vertices, faces = _load_mesh(source, digest)
+    total = len(faces)
+    for ratio, path in zip(ratios, paths):
+        if os.path.exists(path):
+            vertices, faces = _load_mesh(path)
+        else:
+            vertices, faces = _decimate_mesh(vertices, faces, max(4, int(total * ratio)))
+            _write_obj(path, vertices, faces)
+    return paths
+
+class LodService:
+    """LOD1, LOD2... de los assets que solo tienen el LOD0 en OBJ, decimados en procesos aparte.
+
+    Los LOD se escriben junto al original como <nombre>_LOD<n>.obj, se apuntan en los lods del
+    asset_info.json y se meten en el manifiesto.
+    """
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self.hashes = HashService(db)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.folder = str(Path(db.config.get_path('cache_folder')) / 'lods')
+
+    POLL_MS = 200
+
+    def source_mesh(self, asset: Dict) -> Optional[str]:
+        """El OBJ del LOD0: el de asset_info.json si lo hay, si no el de la carpeta sin LOD o con LOD0."""
+        info = _read_asset_info(asset)
+        for path in [(info.get('lods') or [None])[0], info.get('model_path')]:
+            if path and path.lower().endswith('.obj') and os.path.isfile(path):
+                return path
+        for row in self.db.get_asset_files(asset['id']):
+            if row['rel_path'].lower().endswith('.obj') and row['lod'] in (None, 0):
+                return os.path.join(asset['path'], row['rel_path'])
+        return None
+
+    def submit(self, executor, asset: Dict):
+        """Lanza la generacion en executor; devuelve el future o None si el asset no tiene OBJ."""
+        source = self.source_mesh(asset)
+        if source is None:
+            return None
+        # solo el hash ya cacheado: leer la malla entera aqui bloquearia el hilo de Tk
+        digest = self.hashes.cached_digests([source]).get(source)
+        return executor.submit(_generate_lods, source, digest, self.db.config.get_lod_ratios(), self.folder)
+
+    def run(self, widget, assets: List[Dict], on_done=None):
+        """Decima los assets en paralelo y registra cada uno desde el hilo de Tk segun acaba.
+
+        Al terminar todos llama a on_done({id: rutas de los LOD escritos}).
+        """
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_use_mesh_cache,
+                                       initargs=(MeshCache(self.db.config),))
+        futures = {}
+        for asset in assets:
+            future = self.submit(executor, asset)
+            if future is not None:
+                futures[future] = asset
+        # los procesos acaban lo encolado y se cierran solos
+        executor.shutdown(wait=False)
+        written = {}
+
+        def poll():
+            for future in [future for future in futures if future.done()]:
+                asset = futures.pop(future)
+                if future.exception() is None:
+                    written[asset['id']] = self.register(asset, future.result())
+            if futures:
+                widget.after(self.POLL_MS, poll)
+            elif on_done:
+                on_done(written)
+        poll()
+
+    def register(self, asset: Dict, lods: List[str]) -> List[str]:
+        """Copia los LOD cacheados a la carpeta del asset (sin pisar nada) y actualiza asset_info y manifiesto."""
+        source = self.source_mesh(asset)
+        if source is None:
+            # el OBJ ha desaparecido mientras se decimaba
+            return []
+        stem = _LOD_TOKEN_RE.sub('', os.path.splitext(os.path.basename(source))[0]).rstrip(' _-') or 'mesh'
+        folder = os.path.dirname(source)
+        info_path = os.path.join(asset['path'], "asset_info.json")
+        info = _read_asset_info(asset)
+        levels = list(info.get('lods') or [])
+        levels += [''] * (len(lods) + 1 - len(levels))
+        levels[0] = levels[0] or source
+        written = []
+        for level, cached in enumerate(lods, start=1):
+            destination = os.path.join(folder, f"{stem}_LOD{level}.obj")
+            if levels[level] and os.path.isfile(levels[level]):
+                continue
+            if not os.path.exists(destination):
+                shutil.copyfile(cached, destination)
+                written.append(destination)
+            levels[level] = destination
+        info['lods'] = levels
+        with open(info_path, 'w') as f:
+            json.dump(info, f, indent=4)
+        SizeService(self.db).files_changed(written + [info_path])
+        # el LOD0 ya estaba en el manifiesto sin nivel: se quita para que se reparsee con el nuevo asset_info
+        relative = [os.path.relpath(path, asset['path']) for path in levels if path]
+        self.db.save_asset_files(asset['id'], [], relative)
+        ManifestService(self.db).index_assets([asset])
+        return written
+
+def _rasterize_mesh(vertices: np.ndarray, faces: np.ndarray, size: int = THUMBNAIL_SIZE * 2,
+                    yaw: float = 35.0, pitch: float = 25.0, z_up: bool = False) -> Image.Image:
+    """Rasteriza la malla con z-buffer y sombreado Lambert plano, encuadrada por su caja envolvente.
+
+    Todo va vectorizado por triangulos: cada triangulo se muestrea en la rejilla de pixeles de
+    su caja en pantalla (agrupando triangulos de tamaño parecido), y el z-buffer se resuelve
+    ordenando los fragmentos por pixel y profundidad.
+
+    El trabajo va acotado: si las cajas suman demasiadas muestras se quitan primero las caras de
+    espaldas, luego se rasteriza a menos resolucion y se amplia, y si aun asi no cabe se dibujan
+    solo los triangulos mas cercanos a la camara. Siempre sale la misma imagen para la misma malla.
+    """
+    points = vertices.astype(np.float32)
+    if z_up:
+        points = points[:, [0, 2, 1]] * np.array([1, 1, -1], dtype=np.float32)
+    # encuadre solo con los vertices que usa algun triangulo
+    used = np.zeros(len(points), dtype=bool)
+    used[faces.ravel()] = True
+    low, high = points[used].min(axis=0), points[used].max(axis=0)
+    points = points - (low + high) / 2
+    radius = float(np.linalg.norm(high - low)) / 2 or 1.0
+
+    yaw, pitch = np.radians(yaw), np.radians(pitch)
+    rotate_y = np.array([[np.cos(yaw), 0, np.sin(yaw)], [0, 1, 0], [-np.sin(yaw), 0, np.cos(yaw)]])
+    rotate_x = np.array([[1, 0, 0], [0, np.cos(pitch), -np.sin(pitch)], [0, np.sin(pitch), np.cos(pitch)]])
+    view = points @ (rotate_x @ rotate_y).T.astype(np.float32)
+
+    depth = view[:, 2]
+    a, b, c = faces[:, 0], faces[:, 1], faces[:, 2]
+    normals = np.cross(view[b] - view[a], view[c] - view[a])
+    lengths = np.linalg.norm(normals, axis=1)
+    light = np.array([0.3, 0.5, 0.8], dtype=np.float32)
+    light /= np.linalg.norm(light)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # doble cara: muchos modelos no tienen el winding consistente
+        shade = np.abs(normals @ light) / lengths
+    shade = np.nan_to_num(0.25 + 0.75 * shade)
+
+    # Cada triangulo cuesta su cubo de muestras (la potencia de dos que cubre su caja, al cuadrado).
+    # Una malla normal suma unas pocas veces la imagen; una sopa de triangulos enormes no acabaria
+    # nunca, asi que se degrada
+    budget = 64 * size * size
+    keep = np.ones(len(faces), dtype=bool)
+    culled = False
+    render_size = size
+    while True:
+        scale = render_size * 0.45 / radius
+        screen_x = view[:, 0] * scale + render_size / 2
+        screen_y = render_size / 2 - view[:, 1] * scale
+        ax, ay, bx, by, cx, cy = screen_x[a], screen_y[a], screen_x[b], screen_y[b], screen_x[c], screen_y[c]
+        area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        x0 = np.floor(np.minimum(np.minimum(ax, bx), cx) - 0.5).astype(np.int32) + 1
+        x1 = np.floor(np.maximum(np.maximum(ax, bx), cx) - 0.5).astype(np.int32)
+        y0 = np.floor(np.minimum(np.minimum(ay, by), cy) - 0.5).astype(np.int32) + 1
+        y1 = np.floor(np.maximum(np.maximum(ay, by), cy) - 0.5).astype(np.int32)
+        x0, y0 = np.maximum(x0, 0), np.maximum(y0, 0)
+        x1, y1 = np.minimum(x1, render_size - 1), np.minimum(y1, render_size - 1)
+        extent = np.maximum(x1 - x0, y1 - y0) + 1
+        # los triangulos que no cubren ningun centro de pixel no cuestan nada
+        visible = keep & (area != 0) & (x1 >= x0) & (y1 >= y0)
+        box = np.left_shift(1, np.ceil(np.log2(np.maximum(extent, 1))).astype(np.int64))
+        cost = np.where(visible, box * box, 0)
+        if cost.sum() <= budget:
+            break
+        if not culled:
+            # la camara mira hacia -z: de cara son las de normal con z positiva
+            keep, culled = normals[:, 2] > 0, True
+        elif render_size > size // 8:
+            render_size //= 2
+        else:
+            # los mas cercanos primero, hasta gastar el presupuesto
+            nearest = np.argsort(-np.maximum(np.maximum(depth[a], depth[b]), depth[c]), kind='stable')
+            visible[nearest[np.cumsum(cost[nearest]) > budget]] = False
+            break
+
+    pixel_ids, fragment_depths, fragment_faces = [], [], []
+    bucket = 1
+    while bucket < 2 * render_size:
+        selected = np.flatnonzero(visible & (extent <= bucket) & (extent > bucket // 2))
+        offsets = np.arange(bucket * bucket, dtype=np.int32)
+        offset_x, offset_y = offsets % bucket, offsets // bucket
+        batch = max(1, (1 << 22) // (bucket * bucket))
+        for start in range(0, len(selected), batch):
+            ids = selected[start:start + batch]
+            px = x0[ids, None] + offset_x
+            py = y0[ids, None] + offset_y
+            sx, sy = px + 0.5, py + 0.5
+            inverse_area = 1.0 / area[ids, None]
+            w0 = ((bx[ids, None] - sx) * (cy[ids, None] - sy) - (by[ids, None] - sy) * (cx[ids, None] - sx)) * inverse_area
+            w1 = ((cx[ids, None] - sx) * (ay[ids, None] - sy) - (cy[ids, None] - sy) * (ax[ids, None] - sx)) * inverse_area
+            w2 = 1.0 - w0 - w1
+            inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0) & (px <= x1[ids, None]) & (py <= y1[ids, None])
+            z = w0 * depth[a[ids], None] + w1 * depth[b[ids], None] + w2 * depth[c[ids], None]
+            rows, columns = np.nonzero(inside)
+            pixel_ids.append(py[rows, columns] * render_size + px[rows, columns])
+            fragment_depths.append(z[rows, columns])
+            fragment_faces.append(ids[rows])
+        bucket *= 2
+
+    image = np.zeros((render_size * render_size, 4), dtype=np.uint8)
+    if pixel_ids:
+        pixel_ids = np.concatenate(pixel_ids)
+        fragment_depths = np.concatenate(fragment_depths)
+        fragment_faces = np.concatenate(fragment_faces)
+        # por pixel, primero el fragmento mas cercano a la camara (z mayor)
+        order = np.lexsort((-fragment_depths, pixel_ids))
+        pixel_ids, fragment_faces = pixel_ids[order], fragment_faces[order]
+        nearest = np.concatenate(([True], pixel_ids[1:] != pixel_ids[:-1]))
+        pixel_ids, fragment_faces = pixel_ids[nearest], fragment_faces[nearest]
+        clay = np.array([205, 205, 210], dtype=np.float32)
+        image[pixel_ids, :3] = (shade[fragment_faces, None] * clay).astype(np.uint8)
+        image[pixel_ids, 3] = 255
+    image = Image.fromarray(image.reshape(render_size, render_size, 4), 'RGBA')
+    return image if render_size == size else image.resize((size, size), Image.BILINEAR)
+
+def _render_mesh_thumbnail(path: str) -> Image.Image:
+    vertices, faces = _load_mesh(path)
+    # STL suele venir de programas de CAD/impresion con Z hacia arriba; OBJ y glTF usan Y
+    return _rasterize_mesh(vertices, faces, z_up=path.lower().endswith('.stl'))
+
+# Compresiones de EXR que sabemos leer y cuantas lineas lleva cada bloque: NONE, RLE, ZIPS, ZIP
+EXR_BLOCK_LINES = {0: 1, 1: 1, 2: 1, 3: 16}
+EXR_SAMPLE_TYPES = {0: np.dtype('<u4'), 1: np.dtype('<f2'), 2: np.dtype('<f4')}
+
+def _tonemap_hdr(rgb: np.ndarray) -> Image.Image:
+    """Color lineal (h, w, 3) a RGB de 8 bits con curva sRGB.
+
+    Si casi todo cabe en [0, 1] (mapas de datos, texturas) se muestra tal cual; si no, se
+    comprime con Reinhard extendido usando el percentil 99 de luminancia como blanco.
+    """
+    rgb = np.nan_to_num(np.maximum(rgb, 0.0), nan=0.0, posinf=0.0)
+    luminance = rgb @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    white = float(np.percentile(luminance, 99)) if luminance.size else 1.0
+    if white > 1.0:
+        scale = (1.0 + luminance / (white * white)) / (1.0 + luminance)
+        rgb = rgb * scale[..., None]
+    rgb = np.clip(rgb, 0.0, 1.0)
+    rgb = np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * rgb ** (1.0 / 2.4) - 0.055)
+    return Image.fromarray((rgb * 255.0 + 0.5).astype(np.uint8), 'RGB')
+
+def _exr_unpredict(data: np.ndarray) -> np.ndarray:
+    """Deshace el predictor de diferencias y el reparto en dos mitades que usan ZIP y RLE."""
+    deltas = ((np.cumsum(data, dtype=np.int64) - 128 * np.arange(len(data))) & 255).astype(np.uint8)
+    half = (len(deltas) + 1) // 2
+    result = np.empty_like(deltas)
+    result[0::2] = deltas[:half]
+    result[1::2] = deltas[half:]
+    return result
+
+def _exr_rle_decode(data: bytes) -> bytes:
+    # Cada tramo: n < 0 son -n bytes literales, n >= 0 es el siguiente byte repetido n + 1 veces
+    result = bytearray()
+    position = 0
+    while position < len(data):
+        count = data[position]
+        if count > 127:
+            count = 256 - count
+            result += data[position + 1:position + 1 + count]
+            position += 1 + count
+        else:
+            result += data[position + 1:position + 2] * (count + 1)
+            position += 2
+    return bytes(result)
+
+def _decode_exr_block(data: bytes, compression: int, width: int, lines: int, channels: List[tuple],
+                      wanted: set) -> Dict[str, np.ndarray]:
+    """Descomprime un bloque (lineas o tile) y devuelve {canal: float32 (lines, width)} de los pedidos."""
+    expected = lines * width * sum(EXR_SAMPLE_TYPES[pixel_type].itemsize for _, pixel_type, _, _ in channels)
+    if compression == 0 or len(data) == expected:
+        # si comprimido no ocupaba menos, el EXR lo guarda tal cual
+        raw = np.frombuffer(data, dtype=np.uint8)
+    elif compression == 1:
+        raw = _exr_unpredict(np.frombuffer(_exr_rle_decode(data), dtype=np.uint8))
+    else:
+        raw = _exr_unpredict(np.frombuffer(zlib.decompress(data), dtype=np.uint8))
+    if len(raw) != expected:
+        raise ValueError("bloque EXR con tamaño incorrecto")
+    # cada linea lleva los canales uno detras de otro, en el orden de chlist
+    rows = raw.reshape(lines, -1)
+    result = {}
+    offset = 0
+    for name, pixel_type, _, _ in channels:
+        dtype = EXR_SAMPLE_TYPES[pixel_type]
+        if name in wanted:
+            result[name] = rows[:, offset:offset + width * dtype.itemsize].copy().view(dtype).astype(np.float32)
+        offset += width * dtype.itemsize
+    return result
+
+def _exr_level_size(size: int, level: int, round_up: bool) -> int:
+    return max(1, -(-size // (1 << level)) if round_up else size >> level)
+
+def _read_exr_pixels(path: str, max_size: int = THUMBNAIL_SIZE * 2) -> np.ndarray:
+    """Lee un EXR de una parte reducido a unos max_size de lado: float32 (h, w, 3) en color lineal.
+
+    De los EXR por tiles con niveles se lee el nivel mas pequeño que llega a max_size; de los
+    de lineas solo se descomprimen los bloques de las lineas que se quedan.
+    """
+    with open(path, 'rb') as f:
+        attributes = _read_exr_attributes(f)
+        table = f.tell()
+        f.seek(4)
+        tiled = bool(struct.unpack('<I', f.read(4))[0] & 0x200)
+        f.seek(table)
+        compression = attributes['compression'][1][0]
+        if compression not in EXR_BLOCK_LINES:
+            raise ValueError(f"compresion EXR no soportada: {compression}")
+        channels = _parse_exr_channels(attributes['channels'][1])
+        if any(x_sampling != 1 or y_sampling != 1 for _, _, x_sampling, y_sampling in channels):
+            raise ValueError("EXR con canales submuestreados no soportado")
+        # R, G y B (aunque vayan en una capa, "diffuse.R"); si no, el primer canal en gris
+        by_suffix = {name.rsplit('.', 1)[-1]: name for name, _, _, _ in channels}
+        wanted = [by_suffix[key] for key in 'RGB' if key in by_suffix] if 'R' in by_suffix else []
+        wanted = wanted or [by_suffix.get('Y', channels[0][0])]
+        x_min, y_min, x_max, y_max = struct.unpack('<4i', attributes['dataWindow'][1])
+        width, height = x_max - x_min + 1, y_max - y_min + 1
+
+        if tiled:
+            planes = _read_exr_tiled_level(f, attributes, compression, channels, set(wanted), width, height, max_size)
+        else:
+            lines = EXR_BLOCK_LINES[compression]
+            offsets = np.frombuffer(f.read(8 * (-(-height // lines))), dtype='<u8')
+            step = max(1, -(-max(width, height) // max_size))
+            keep = np.arange(0, height, step)
+            planes = {name: np.empty((len(keep), width), dtype=np.float32) for name in wanted}
+            for block in np.unique(keep // lines):
+                f.seek(int(offsets[block]))
+                y, size = struct.unpack('<ii', f.read(8))
+                start = y - y_min
+                count = min(lines, height - start)
+                decoded = _decode_exr_block(f.read(size), compression, width, count, channels, set(wanted))
+                selected = (keep >= start) & (keep < start + count)
+                for name in wanted:
+                    planes[name][selected] = decoded[name][keep[selected] - start]
+            planes = {name: plane[:, ::step] for name, plane in planes.items()}
+    stacked = np.stack([planes[name] for name in wanted], axis=-1)
+    if stacked.shape[-1] != 3:
+        stacked = np.repeat(stacked[..., :1], 3, axis=-1)
+    return stacked
+
+def _read_exr_tiled_level(f, attributes: Dict, compression: int, channels: List[tuple], wanted: set,
+                          width: int, height: int, max_size: int) -> Dict[str, np.ndarray]:
+    tile_width, tile_height, mode = struct.unpack('<IIB', attributes['tiles'][1][:9])
+    level_mode, round_up = mode & 0x0F, bool(mode >> 4)
+    def level_count(size: int) -> int:
+        return (max(size, 1) - 1).bit_length() + 1 if round_up else max(size, 1).bit_length()
+    if level_mode == 0:
+        levels = [(0, 0)]
+    elif level_mode == 1:
+        levels = [(level, level) for level in range(level_count(max(width, height)))]
+    else:
+        levels = [(x_level, y_level) for y_level in range(level_count(height)) for x_level in range(level_count(width))]
+    # tamaño y numero de tiles de cada nivel, en el orden de la tabla de offsets
+    sizes = [(_exr_level_size(width, x_level, round_up), _exr_level_size(height, y_level, round_up))
+             for x_level, y_level in levels]
+    counts = [(-(-w // tile_width)) * (-(-h // tile_height)) for w, h in sizes]
+    offsets = np.frombuffer(f.read(8 * sum(counts)), dtype='<u8')
+    candidates = [index for index, (x_level, y_level) in enumerate(levels)
+                  if x_level == y_level and max(sizes[index]) >= max_size]
+    index = max(candidates, key=lambda index: levels[index][0]) if candidates else 0
+    level_width, level_height = sizes[index]
+    first = sum(counts[:index])
+    planes = {name: np.zeros((level_height, level_width), dtype=np.float32) for name in wanted}
+    for offset in offsets[first:first + counts[index]]:
+        f.seek(int(offset))
+        tile_x, tile_y, _, _, size = struct.unpack('<5i', f.read(20))
+        x0, y0 = tile_x * tile_width, tile_y * tile_height
+        w, h = min(tile_width, level_width - x0), min(tile_height, level_height - y0)
+        decoded = _decode_exr_block(f.read(size), compression, w, h, channels, wanted)
+        for name in wanted:
+            planes[name][y0:y0 + h, x0:x0 + w] = decoded[name]
+    step = max(1, -(-max(level_width, level_height) // max_size))
+    return {name: plane[::step, ::step] for name, plane in planes.items()}
+
+def _read_exr_thumbnail(path: str) -> Image.Image:
+    return _tonemap_hdr(_read_exr_pixels(path))
+
+def _hdr_rle_scanline(data, position: int, width: int, keep: bool) -> tuple:
+    """Una linea RLE "nueva" de Radiance: los 4 canales por separado, en tramos.
+
+    Un byte n > 128 repite el siguiente n - 128 veces; si no, vienen n bytes literales.
+    Devuelve (uint8 (width, 4) o None si keep es False, posicion siguiente).
+    """
+    channels = []
+    for _ in range(4):
+        line = bytearray()
+        filled = 0
+        while filled < width:
+            count = data[position]
+            if count > 128:
+                count -= 128
+                if keep:
+                    line += data[position + 1:position + 2] * count
+                position += 2
+            else:
+                if count == 0:
+                    raise ValueError("tramo RLE vacio en el .hdr")
+                if keep:
+                    line += data[position + 1:position + 1 + count]
+                position += 1 + count
+            filled += count
+        if keep:
+            channels.append(np.frombuffer(line, dtype=np.uint8)[:width])
+    return (np.stack(channels, axis=1) if keep else None), position
+
+def _read_hdr_pixels(path: str, max_size: int = THUMBNAIL_SIZE * 2) -> np.ndarray:
+    """Lee un Radiance .hdr (RGBE) reducido a unos max_size de lado: float32 (h, w, 3) lineal.
+
+    El formato no tiene tabla de offsets, asi que hay que recorrer todas las lineas, pero las
+    que se saltan solo se recorren, sin copiar nada. El paso de RGBE a float va vectorizado.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(".hdr vacio")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if not data[:2] == b'#?':
+                raise ValueError("no es un Radiance .hdr")
+            end = data.find(b'\n\n')
+            if end < 0:
+                raise ValueError("cabecera .hdr truncada")
+            header = data[:end].decode('latin-1')
+            if 'FORMAT=' in header and 'FORMAT=32-bit_rle_rgbe' not in header:
+                raise ValueError("solo se soporta .hdr RGBE, no XYZE")
+            position = data.find(b'\n', end + 2) + 1
+            axes = data[end + 2:position].split()
+            if len(axes) != 4 or axes[0] not in (b'-Y', b'+Y') or axes[2] != b'+X':
+                raise ValueError("orientacion de .hdr no soportada")
+            height, width = int(axes[1]), int(axes[3])
+
+            step = max(1, -(-max(width, height) // max_size))
+            rows = []
+            for y in range(height):
+                keep = y % step == 0
+                if 8 <= width < 32768 and data[position:position + 2] == b'\x02\x02' \
+                        and (data[position + 2] << 8 | data[position + 3]) == width:
+                    row, position = _hdr_rle_scanline(data, position + 4, width, keep)
+                else:
+                    # linea sin comprimir: 4 bytes por pixel
+                    row = np.frombuffer(data[position:position + 4 * width], dtype=np.uint8).reshape(width, 4) \
+                        if keep else None
+                    position += 4 * width
+                if keep:
+                    rows.append(row[::step].copy())
+    rgbe = np.stack(rows)
+    if axes[0] == b'+Y':
+        rgbe = rgbe[::-1]
+    # (mantisa + 0.5) * 2^(exponente - 136); exponente 0 es negro
+    exponent = rgbe[..., 3].astype(np.int32)
+    scale = np.where(exponent > 0, np.ldexp(np.float32(1.0), exponent - 136), 0.0).astype(np.float32)
+    return (rgbe[..., :3].astype(np.float32) + 0.5) * scale[..., None]
+
+def _equirect_view(rgb: np.ndarray, size: int, fov: float = 90.0, pitch: float = 15.0) -> np.ndarray:
+    """Vista en perspectiva (size x size) de un panorama equirectangular, mirando al centro y algo hacia arriba."""
+    height, width = rgb.shape[:2]
+    extent = np.tan(np.radians(fov) / 2)
+    coords = (np.arange(size, dtype=np.float32) + 0.5) / size * 2.0 - 1.0
+    x, y = np.meshgrid(coords * extent, -coords * extent)
+    z = np.ones_like(x)
+    angle = np.radians(pitch)
+    y, z = y * np.cos(angle) + z * np.sin(angle), -y * np.sin(angle) + z * np.cos(angle)
+    longitude = np.arctan2(x, z)
+    latitude = np.arctan2(y, np.hypot(x, z))
+    u = (longitude / (2 * np.pi) + 0.5) * width - 0.5
+    v = np.clip((0.5 - latitude / np.pi) * height - 0.5, 0, height - 1)
+    # bilineal, dando la vuelta en horizontal
+    u0, v0 = np.floor(u).astype(np.int64), np.floor(v).astype(np.int64)
+    fu, fv = (u - u0)[..., None], (v - v0)[..., None]
+    u1, v1 = (u0 + 1) % width, np.minimum(v0 + 1, height - 1)
+    u0 %= width
+    top = rgb[v0, u0] * (1 - fu) + rgb[v0, u1] * fu
+    bottom = rgb[v1, u0] * (1 - fu) + rgb[v1, u1] * fu
+    return top * (1 - fv) + bottom * fv
+
+def _read_hdr_thumbnail(path: str) -> Image.Image:
+    """Miniatura de un .hdr; si es un panorama 2:1 se muestra una vista de 90 grados y no el mapa aplastado."""
+    rgb = _read_hdr_pixels(path, max_size=THUMBNAIL_SIZE * 4)
+    height, width = rgb.shape[:2]
+    if 1.9 <= width / height <= 2.1:
+        rgb = _equirect_view(rgb, THUMBNAIL_SIZE)
+    return _tonemap_hdr(rgb)
+
+DDS_MAGIC = b'DDS '
+DDS_HEADER = struct.Struct('<7I44x8I20x')  # size, flags, alto, ancho, pitch, profundidad, mips | pixel format
+# Formatos comprimidos: FourCC o DXGI -> (formato, bytes por bloque de 4x4)
+DDS_FOURCC_FORMATS = {b'DXT1': ('BC1', 8), b'DXT4': ('BC3', 16), b'DXT5': ('BC3', 16),
+                      b'ATI1': ('BC4', 8), b'BC4U': ('BC4', 8), b'ATI2': ('BC5', 16), b'BC5U': ('BC5', 16)}
+DDS_DXGI_FORMATS = {70: ('BC1', 8), 71: ('BC1', 8), 72: ('BC1', 8), 76: ('BC3', 16), 77: ('BC3', 16), 78: ('BC3', 16),
+                    79: ('BC4', 8), 80: ('BC4', 8), 82: ('BC5', 16), 83: ('BC5', 16),
+                    27: ('RGBA', 4), 28: ('RGBA', 4), 29: ('RGBA', 4), 87: ('BGRA', 4), 91: ('BGRA', 4)}
+
+def _read_dds_header(f) -> Dict:
+    """Cabecera DDS (con la extension DX10): formato, tamaño, numero de mips y donde empiezan los datos."""
+    f.seek(0)
+    if f.read(4) != DDS_MAGIC:
+        raise ValueError("no es un DDS")
+    (size, _, height, width, _, _, mips, _, pixel_flags, fourcc, bit_count,
+     red_mask, green_mask, blue_mask, alpha_mask) = DDS_HEADER.unpack(f.read(DDS_HEADER.size))
+    if size != 124:
+        raise ValueError("cabecera DDS invalida")
+    header = {'width': width, 'height': height, 'mips': max(1, mips), 'offset': 4 + DDS_HEADER.size}
+    fourcc = struct.pack('<I', fourcc)
+    if pixel_flags & 0x4 and fourcc == b'DX10':
+        dxgi_format = struct.unpack('<I', f.read(20)[:4])[0]
+        header['offset'] += 20
+        if dxgi_format not in DDS_DXGI_FORMATS:
+            raise ValueError(f"formato DXGI no soportado: {dxgi_format}")
+        header['format'], header['block_bytes'] = DDS_DXGI_FORMATS[dxgi_format]
+    elif pixel_flags & 0x4:
+        if fourcc not in DDS_FOURCC_FORMATS:
+            raise ValueError(f"FourCC de DDS no soportado: {fourcc!r}")
+        header['format'], header['block_bytes'] = DDS_FOURCC_FORMATS[fourcc]
+    elif pixel_flags & 0x40 and bit_count in (24, 32):
+        # sin comprimir con mascaras (DDPF_RGB); el alfa solo si DDPF_ALPHAPIXELS
+        header['format'], header['block_bytes'] = 'MASKS', bit_count // 8
+        header['masks'] = (red_mask, green_mask, blue_mask, alpha_mask if pixel_flags & 0x1 else 0)
+    else:
+        raise ValueError("formato DDS no soportado")
+    return header
+
+def _dds_level_bytes(header: Dict, width: int, height: int) -> int:
+    if header['format'].startswith('BC'):
+        return max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * header['block_bytes']
+    return width * height * header['block_bytes']
+
+def _expand_565(colours: np.ndarray) -> np.ndarray:
+    """Colores RGB565 a uint8 (..., 3), replicando los bits altos."""
+    red = (colours >> 11) & 0x1F
+    green = (colours >> 5) & 0x3F
+    blue = colours & 0x1F
+    return np.stack([(red << 3) | (red >> 2), (green << 2) | (green >> 4), (blue << 3) | (blue >> 2)],
+                    axis=-1).astype(np.int32)
+
+def _decode_bc1_colours(blocks: np.ndarray, punch_through: bool) -> np.ndarray:
+    """Bloques de color BC1 (n, 8) uint8 -> (n, 16, 4) uint8."""
+    endpoints = blocks[:, :4].copy().view('<u2')
+    c0, c1 = endpoints[:, 0].astype(np.int32), endpoints[:, 1].astype(np.int32)
+    p0, p1 = _expand_565(c0), _expand_565(c1)
+    palette = np.empty((len(blocks), 4, 4), dtype=np.int32)
+    palette[:, 0, :3], palette[:, 1, :3] = p0, p1
+    palette[:, :, 3] = 255
+    four = (c0 > c1)[:, None] if punch_through else np.ones((len(blocks), 1), dtype=bool)
+    palette[:, 2, :3] = np.where(four, (2 * p0 + p1) // 3, (p0 + p1) // 2)
+    palette[:, 3, :3] = np.where(four, (p0 + 2 * p1) // 3, 0)
+    # en BC1 con c0 <= c1 el cuarto color es negro transparente
+    palette[:, 3, 3] = np.where(four[:, 0], 255, 0)
+    indices = (blocks[:, 4:8].copy().view('<u4') >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    return palette[np.arange(len(blocks))[:, None], indices].astype(np.uint8)
+
+def _decode_bc4_channel(blocks: np.ndarray) -> np.ndarray:
+    """Bloques de un canal BC4 (n, 8) uint8 (tambien el alfa de BC3) -> (n, 16) uint8."""
+    a0, a1 = blocks[:, 0].astype(np.int32), blocks[:, 1].astype(np.int32)
+    steps = np.arange(1, 7, dtype=np.int32)
+    eight = (a0 > a1)[:, None]
+    palette = np.empty((len(blocks), 8), dtype=np.int32)
+    palette[:, 0], palette[:, 1] = a0, a1
+    # 6 intermedios, o 4 intermedios mas 0 y 255
+    interpolated8 = ((7 - steps) * a0[:, None] + steps * a1[:, None]) // 7
+    interpolated6 = ((5 - steps[:4]) * a0[:, None] + steps[:4] * a1[:, None]) // 5
+    palette[:, 2:8] = np.where(eight, interpolated8,
+                               np.concatenate([interpolated6, np.zeros((len(blocks), 1), dtype=np.int32),
+                                               np.full((len(blocks), 1), 255, dtype=np.int32)], axis=1))
+    bits = np.zeros((len(blocks), 8), dtype=np.uint8)
+    bits[:, :6] = blocks[:, 2:8]
+    indices = (bits.view('<u8') >> (3 * np.arange(16, dtype=np.uint64))) & 7
+    return palette[np.arange(len(blocks))[:, None], indices.astype(np.intp)].astype(np.uint8)
+
+def _decode_dds_level(data: bytes, header: Dict, width: int, height: int) -> np.ndarray:
+    """Decodifica un nivel de mip a RGBA uint8 (height, width, 4)."""
+    kind = header['format']
+    if not kind.startswith('BC'):
+        pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, width, header['block_bytes'])
+        if kind == 'RGBA':
+            return pixels.copy()
+        if kind == 'BGRA':
+            return pixels[..., [2, 1, 0, 3]].copy()
+        values = np.zeros((height, width), dtype=np.uint32)
+        for byte in range(header['block_bytes']):
+            values |= pixels[..., byte].astype(np.uint32) << (8 * byte)
+        result = np.full((height, width, 4), 255, dtype=np.uint8)
+        for channel, mask in enumerate(header['masks']):
+            if mask:
+                shift = (mask & -mask).bit_length() - 1
+                result[..., channel] = ((values & mask) >> shift) * 255 // (mask >> shift)
+        return result
+
+    blocks_x, blocks_y = max(1, (width + 3) // 4), max(1, (height + 3) // 4)
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, header['block_bytes'])
+    if kind == 'BC1':
+        texels = _decode_bc1_colours(blocks, punch_through=True)
+    elif kind == 'BC3':
+        texels = _decode_bc1_colours(blocks[:, 8:], punch_through=False)
+        texels[:, :, 3] = _decode_bc4_channel(blocks[:, :8])
+    else:
+        texels = np.empty((len(blocks), 16, 4), dtype=np.uint8)
+        texels[:, :, 3] = 255
+        if kind == 'BC4':
+            texels[:, :, :3] = _decode_bc4_channel(blocks)[:, :, None]
+        else:
+            # BC5 casi siempre es un normal map con X e Y; Z se reconstruye para que se vea como tal
+            x = _decode_bc4_channel(blocks[:, :8])
+            y = _decode_bc4_channel(blocks[:, 8:])
+            nx, ny = x / 127.5 - 1.0, y / 127.5 - 1.0
+            nz = np.sqrt(np.clip(1.0 - nx * nx - ny * ny, 0.0, 1.0))
+            texels[:, :, 0], texels[:, :, 1] = x, y
+            texels[:, :, 2] = np.round((nz + 1.0) * 127.5).astype(np.uint8)
+    # (bloques y, bloques x, 4 filas, 4 columnas) -> imagen
+    image = texels.reshape(blocks_y, blocks_x, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(blocks_y * 4, blocks_x * 4, 4)
+    return image[:height, :width]
+
+def _read_dds_thumbnail(path: str, size: int = THUMBNAIL_SIZE) -> Image.Image:
+    """Miniatura de un DDS: se lee y decodifica solo el mip mas pequeño que aun cubre size."""
+    with open(path, 'rb') as f:
+        header = _read_dds_header(f)
+        offset = header['offset']
+        width, height = header['width'], header['height']
+        for _ in range(header['mips'] - 1):
+            next_width, next_height = max(1, width // 2), max(1, height // 2)
+            if max(next_width, next_height) < size:
+                break
+            offset += _dds_level_bytes(header, width, height)
+            width, height = next_width, next_height
+        f.seek(offset)
+        data = f.read(_dds_level_bytes(header, width, height))
+    if len(data) < _dds_level_bytes(header, width, height):
+        raise ValueError("DDS truncado")
+    return Image.fromarray(_decode_dds_level(data, header, width, height), 'RGBA')
+
+# Lectores de miniatura por extension, para ficheros que PIL no abre o que no son imagenes
+THUMBNAIL_READERS = {
+    '.dds': _read_dds_thumbnail,
+    '.exr': _read_exr_thumbnail,
+    '.hdr': _read_hdr_thumbnail,
+    '.blend': _read_blend_thumbnail,
+    '.obj': _render_mesh_thumbnail,
+    '.stl': _render_mesh_thumbnail,
+    '.glb': _render_mesh_thumbnail,
+    '.gltf': _render_mesh_thumbnail
+}
+
+def _render_thumbnail(source: str, destination: str, size: int = THUMBNAIL_SIZE) -> str:
+    """Genera la miniatura de source en destination (se ejecuta en el pool de procesos)."""
+    reader = THUMBNAIL_READERS.get(os.path.splitext(source)[1].lower())
+    if reader:
+        image = reader(source)
+    else:
+        image = _load_small_image(source, size)
+    return _save_thumbnail(image, destination, size)
+
+def _thumbnail_source(asset: Dict) -> Optional[str]:
+    """Fichero del que sacar la miniatura de un asset que no tiene preview.png."""
+    info = _read_asset_info(asset)
+    candidates = [info.get('model_path')] + info.get('lods', [])
+    try:
+        with os.scandir(asset['path']) as entries:
+            candidates += sorted(entry.path for entry in entries if entry.is_file())
+    except OSError:
+        pass
+    for path in candidates:
+        if path and os.path.splitext(path)[1].lower() in THUMBNAIL_READERS and os.path.isfile(path):
+            return path
+    return None
+
+# Huecos de textura de AddAssetWindow que entran en la preview del material, y como se usan
+MATERIAL_SLOTS = {
+    'Color/Albedo': 'albedo',
+    'Normal': 'normal',
+    'Roughness': 'roughness',
+    'Metalness': 'metalness',
+    'Specular': 'specular',
+    'Ambient Occlusion': 'ao',
+    'Opacity': 'opacity',
+    'Opacity Mask': 'opacity'
+}
+MATERIAL_MAP_SIZE = 256
+
+def _asset_material_maps(asset: Dict) -> Dict[str, str]:
+    """{hueco: ruta} de los mapas del asset_info.json que existen y sirven para la preview."""
+    textures = _read_asset_info(asset).get('textures') or {}
+    return {
+        slot: path for slot, path in textures.items()
+        if slot in MATERIAL_SLOTS and path and os.path.isfile(path)
+    }
+
+def _load_material_map(path: str, size: int = MATERIAL_MAP_SIZE) -> np.ndarray:
+    """Mapa reducido a size x size en float32 [0, 1] con forma (size, size, 3)."""
+    image = _load_small_image(path, size).resize((size, size), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+def _render_material_preview(maps: Dict[str, str], destination: str, swatch: bool = False,
+                             size: int = THUMBNAIL_SIZE) -> str:
+    """Compone una esfera (o una muestra plana) sombreada con GGX a partir de los mapas PBR.
+
+    Se trabaja con los mapas reducidos a MATERIAL_MAP_SIZE y se muestrean por vecino mas
+    cercano; todo el sombreado va en arrays de NumPy. Se ejecuta en el pool de procesos.
+    """
+    render = size * 2
+    loaded = {}
+    for slot, path in maps.items():
+        channel = MATERIAL_SLOTS.get(slot)
+        if channel and channel not in loaded:
+            try:
+                loaded[channel] = _load_material_map(path)
+            except (OSError, ValueError):
+                continue
+
+    coords = (np.arange(render, dtype=np.float32) + 0.5) / render * 2.0 - 1.0
+    x, y = np.meshgrid(coords, -coords)
+    if swatch:
+        mask = np.ones((render, render), dtype=bool)
+        x, y = x.ravel(), y.ravel()
+        normal = np.tile(np.array([0.0, 0.0, 1.0], dtype=np.float32), (len(x), 1))
+        tangent = np.tile(np.array([1.0, 0.0, 0.0], dtype=np.float32), (len(x), 1))
+        u, v = (x + 1.0) * 0.5, (1.0 - y) * 0.5
+    else:
+        r2 = x * x + y * y
+        mask = r2 <= 1.0
+        x, y = x[mask], y[mask]
+        z = np.sqrt(np.maximum(0.0, 1.0 - x * x - y * y))
+        normal = np.stack([x, y, z], axis=1)
+        phi = np.arctan2(x, z)
+        tangent = np.stack([np.cos(phi), np.zeros_like(phi), -np.sin(phi)], axis=1)
+        # La mitad visible de la esfera muestra un tile entero de la textura
+        u = phi / np.pi + 0.5
+        v = np.arccos(np.clip(y, -1.0, 1.0)) / np.pi
+
+    columns = np.clip((u * MATERIAL_MAP_SIZE).astype(np.int32), 0, MATERIAL_MAP_SIZE - 1)
+    rows = np.clip((v * MATERIAL_MAP_SIZE).astype(np.int32), 0, MATERIAL_MAP_SIZE - 1)
+
+    def sample(channel: str, default):
+        if channel in loaded:
+            return loaded[channel][rows, columns]
+        return np.broadcast_to(np.array(default, dtype=np.float32), (len(rows), 3))
+
+    albedo = sample('albedo', (0.8, 0.8, 0.8)) ** 2.2
+    roughness = sample('roughness', (0.5, 0.5, 0.5))[:, 0]
+    metalness = sample('metalness', (0.0, 0.0, 0.0))[:, 0]
+    specular = sample('specular', (0.5, 0.5, 0.5))[:, 0]
+    ao = sample('ao', (1.0, 1.0, 1.0))[:, 0]
+    opacity = sample('opacity', (1.0, 1.0, 1.0))[:, 0]
+
+    if 'normal' in loaded:
+        # Mapa en espacio tangente, convencion OpenGL (verde hacia arriba)
+        detail = loaded['normal'][rows, columns] * 2.0 - 1.0
+        bitangent = np.cross(normal, tangent)
+        normal = tangent * detail[:, :1] + bitangent * detail[:, 1:2] + normal * detail[:, 2:3]
+        normal /= np.maximum(np.linalg.norm(normal, axis=1, keepdims=True), 1e-6)
+
+    view = np.array([0.0, 0.0, 1.0], dtype=np.float32)
+    light = np.array([-0.5, 0.6, 0.75], dtype=np.float32)
+    light /= np.linalg.norm(light)
+    half = (light + view) / np.linalg.norm(light + view)
+    n_dot_l = np.clip(normal @ light, 0.0, 1.0)
+    n_dot_v = np.clip(normal @ view, 1e-4, 1.0)
+    n_dot_h = np.clip(normal @ half, 0.0, 1.0)
+    v_dot_h = float(np.clip(view @ half, 0.0, 1.0))
+
+    alpha = np.maximum(roughness * roughness, 1e-3)
+    a2 = alpha * alpha
+    distribution = a2 / (np.pi * (n_dot_h * n_dot_h * (a2 - 1.0) + 1.0) ** 2)
+    k = (roughness + 1.0) ** 2 / 8.0
+    geometry = (n_dot_l / (n_dot_l * (1.0 - k) + k)) * (n_dot_v / (n_dot_v * (1.0 - k) + k))
+    f0 = (0.08 * specular)[:, None] * (1.0 - metalness[:, None]) + albedo * metalness[:, None]
+    fresnel = f0 + (1.0 - f0) * (1.0 - v_dot_h) ** 5
+    specular_term = fresnel * (distribution * geometry / (4.0 * n_dot_l * n_dot_v + 1e-4))[:, None]
+    diffuse = (1.0 - fresnel) * albedo * (1.0 - metalness[:, None])
+
+    radiance = (diffuse + specular_term * np.pi) * n_dot_l[:, None] * 2.5
+    # Luz ambiente constante para que los metales no salgan negros en la parte en sombra
+    radiance += (albedo * (1.0 - metalness[:, None]) + f0) * (0.25 * ao)[:, None]
+    radiance = radiance / (1.0 + radiance)
+    colour = np.clip(radiance, 0.0, 1.0) ** (1.0 / 2.2)
+
+    image = np.zeros((render * render, 4), dtype=np.uint8)
+    pixel_ids = np.flatnonzero(mask.ravel())
+    image[pixel_ids, :3] = (colour * 255.0 + 0.5).astype(np.uint8)
+    image[pixel_ids, 3] = (np.clip(opacity, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+    return _save_thumbnail(Image.fromarray(image.reshape(render, render, 4), 'RGBA'), destination, size)
+
+def _render_material_preview_hashed(maps: Dict[str, str], digests: Dict[str, str], cache: ThumbnailCache,
+                                    swatch: bool = False, size: int = THUMBNAIL_SIZE) -> tuple:
+    """_render_material_preview cuando algun mapa no tiene su hash en cache: se hashea aqui, en el pool.
+
+    Devuelve (preview, filas nuevas de file_hashes) para que el hilo de Tk guarde los hashes.
+    """
+    digests = dict(digests)  # {hueco: hash}
+    rows = []
+    for slot, path in list(maps.items()):
+        if slot in digests:
+            continue
+        try:
+            st = os.stat(path)
+            digests[slot] = _hash_file(path)
+        except OSError:
+            del maps[slot]
+            continue
+        rows.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, digests[slot]))
+    if not maps:
+        raise FileNotFoundError("no queda ningun mapa legible")
+    destination = cache.material_path_for({slot: digests[slot] for slot in maps}, swatch)
+    if not os.path.exists(destination):
+        _render_material_preview(maps, destination, swatch, size)
+    return destination, rows
+
+class ThumbnailPool:
+    """Genera miniaturas en procesos aparte y avisa desde el hilo de Tk cuando estan listas."""
+
+    POLL_MS = 100
+
+    def __init__(self, widget, cache: ThumbnailCache, hashes: HashService, max_workers: Optional[int] = None,
+                 meshes: Optional[MeshCache] = None):
+        self.widget = widget
+        self.cache = cache
+        self.hashes = hashes
+        self.executor = ProcessPoolExecutor(max_workers=max_workers or max(1, (os.cpu_count() or 2) - 1),
+                                            initializer=_use_mesh_cache, initargs=(meshes,))
+        self.pending = {}
+
+    def request(self, destination: str, function, args: tuple, callback) -> Optional[str]:
+        """Devuelve destination si ya existe; si no, lanza function(*args) y luego llama a callback(destination)."""
+        if os.path.exists(destination):
+            return destination
+        if destination in self.pending:
+            self.pending[destination][1].append(callback)
+            return None
+        self._submit(destination, function, args, callback)
+        return None
+
+    def _submit(self, key, function, args: tuple, callback, on_result=None):
+        """Lanza function(*args); on_result convierte su resultado en la ruta que recibe callback."""
+        future = self.executor.submit(function, *args)
+        self.pending[key] = (future, [callback], on_result)
+        if len(self.pending) == 1:
+            self.widget.after(self.POLL_MS, self._poll)
+
+    def request_file(self, source: str, callback) -> Optional[str]:
+        try:
+            destination = self.cache.path_for(source)
+        except OSError:
+            return None
+        return self.request(destination, _render_thumbnail, (source, destination, THUMBNAIL_SIZE), callback)
+
+    def request_material(self, maps: Dict[str, str], callback, swatch: bool = False) -> Optional[str]:
+        """Como request_file pero para la preview de un material; la clave es el hash de cada mapa.
+
+        Aqui solo se miran los hashes ya cacheados; si falta alguno, el hash y la clave final se
+        sacan en el pool, sin leer ningun mapa desde el hilo de Tk.
+        """
+        cached = self.hashes.cached_digests(list(maps.values()))
+        digests = {slot: cached[path] for slot, path in maps.items() if path in cached}
+        if len(digests) == len(maps):
+            destination = self.cache.material_path_for(digests, swatch)
+            return self.request(destination, _render_material_preview, (maps, destination, swatch, THUMBNAIL_SIZE),
+                                callback)
+        key = ('material', swatch, tuple(sorted(maps.items())))
+        if key in self.pending:
+            self.pending[key][1].append(callback)
+            return None
+        self._submit(key, _render_material_preview_hashed, (maps, digests, self.cache, swatch, THUMBNAIL_SIZE),
+                     callback, self._save_hashes)
+        return None
+
+    def _save_hashes(self, result: tuple) -> str:
+        destination, rows = result
+        self.hashes.db.save_file_hashes(rows)
+        return destination
+
+    def _poll(self):
+        for key, (future, callbacks, on_result) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            if future.exception() is None:
+                destination = on_result(future.result()) if on_result else key
+                for callback in callbacks:
+                    callback(destination)
+        if self.pending:
+            self.widget.after(self.POLL_MS, self._poll)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+TILE_SIZE = 256
+TILE_LEVEL_DONE = '.done'
+PYRAMID_DONE = 'pyramid.json'
+
+def _pyramid_levels(width: int, height: int) -> List[tuple]:
+    """Tamaño de cada nivel de la piramide de tiles, del original hasta que cabe en un tile."""
+    levels = [(width, height)]
+    while max(levels[-1]) > TILE_SIZE:
+        width, height = levels[-1]
+        levels.append((-(-width // 2), -(-height // 2)))
+    return levels
+
+def _open_for_tiles(source: str):
+    """Lector de bandas para la piramide: el de _open_for_downscale, salvo los float (TIFF de 32 bits),
+    que se normalizan a su maximo porque no tienen otro rango."""
+    image = Image.open(source)
+    if image.mode == 'F':
+        return _ImageBandReader(image, 1, float(image.getextrema()[1]) or 1.0)
+    image.close()
+    return _open_for_downscale(source)
+
+def _display_rows(rows: np.ndarray, peak: float) -> np.ndarray:
+    """Una banda en 8 bits para verla; 16 bits y float se llevan de 0..peak a 0..255."""
+    if rows.dtype == np.uint8 and peak == 255.0:
+        return rows
+    return np.clip(np.rint(rows.astype(np.float32) * (255.0 / peak)), 0, 255).astype(np.uint8)
+
+def _reduce_rows_2x(rows: np.ndarray) -> np.ndarray:
+    """Media de cada bloque de 2x2 como Image.reduce(2); con tamaño impar se repite la ultima fila o columna."""
+    if len(rows) % 2:
+        rows = np.concatenate([rows, rows[-1:]], axis=0)
+    if rows.shape[1] % 2:
+        rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+    total = rows[0::2, 0::2].astype(np.uint16) + rows[1::2, 0::2] + rows[0::2, 1::2] + rows[1::2, 1::2]
+    return ((total + 2) // 4).astype(np.uint8)
+
+def _write_tile_row(level_folder: str, row: int, rows: np.ndarray):
+    """Escribe los tiles de una fila de tiles; los que ya estan (de una pasada que se corto) se dejan."""
+    for left in range(0, rows.shape[1], TILE_SIZE):
+        path = os.path.join(level_folder, f"{left // TILE_SIZE}_{row}.png")
+        if os.path.exists(path):
+            continue
+        tile = rows[:, left:left + TILE_SIZE]
+        # compresion baja: los tiles se leen mucho y se escriben una vez, pero hay miles
+        Image.fromarray(tile[..., 0] if tile.shape[2] == 1 else tile).save(
+            f"{path}.{os.getpid()}.tmp", format='PNG', compress_level=1)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+def _read_tile_row(level_folder: str, row: int, width: int) -> np.ndarray:
+    """Una fila de tiles de un nivel ya hecho, pegada en una banda de TILE_SIZE filas (o menos, la ultima)."""
+    tiles = []
+    for column in range(-(-width // TILE_SIZE)):
+        with Image.open(os.path.join(level_folder, f"{column}_{row}.png")) as tile:
+            pixels = np.asarray(tile)
+        tiles.append(pixels.reshape(pixels.shape[0], pixels.shape[1], -1))
+    return np.concatenate(tiles, axis=1)
+
+def _build_tile_pyramid(source: str, folder: str) -> str:
+    """Trocea source en tiles PNG de TILE_SIZE para cada nivel: <folder>/<nivel>/<x>_<y>.png.
+
+    El nivel 0 se lee por bandas de TILE_SIZE filas (PngBandReader en los PNG) y cada banda se
+    escribe en tiles en cuanto se lee. Cada nivel siguiente sale de dos filas de tiles del
+    anterior, asi que en memoria solo hay una banda y nunca la imagen entera. Cada nivel deja
+    un .done al acabar; si se corta, la siguiente vez se salta los niveles hechos y los tiles
+    que ya estan. Se ejecuta en un proceso aparte.
+    """
+    if os.path.exists(os.path.join(folder, PYRAMID_DONE)):
+        return folder
+    with Image.open(source) as image:
+        levels = _pyramid_levels(*image.size)
+    for level, (width, height) in enumerate(levels):
+        level_folder = os.path.join(folder, str(level))
+        if os.path.exists(os.path.join(level_folder, TILE_LEVEL_DONE)):
+            continue
+        os.makedirs(level_folder, exist_ok=True)
+        if level == 0:
+            with _open_for_tiles(source) as reader:
+                for top in range(0, height, TILE_SIZE):
+                    rows = reader.rows(top, min(height, top + TILE_SIZE))
+                    _write_tile_row(level_folder, top // TILE_SIZE, _display_rows(rows, reader.peak))
+        else:
+            previous_folder = os.path.join(folder, str(level - 1))
+            previous_width, previous_height = levels[level - 1]
+            previous_rows = -(-previous_height // TILE_SIZE)
+            for row in range(-(-height // TILE_SIZE)):
+                band = [_read_tile_row(previous_folder, 2 * row + offset, previous_width)
+                        for offset in (0, 1) if 2 * row + offset < previous_rows]
+                _write_tile_row(level_folder, row, _reduce_rows_2x(np.concatenate(band, axis=0)))
+        open(os.path.join(level_folder, TILE_LEVEL_DONE), 'w').close()
+    with open(os.path.join(folder, PYRAMID_DONE), 'w') as f:
+        json.dump({'width': levels[0][0], 'height': levels[0][1], 'levels': len(levels)}, f)
+    return folder
+
+EXPORT_CHUNK_SIZE = 1024 * 1024
+# Formatos que ya van comprimidos: deflate no gana nada y solo gasta CPU
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.exr', '.webp', '.zip', '.gz', '.zst', '.7z', '.mp4')
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP64_LIMIT = 0xFFFFFFFF
+
+class ExportCancelled(Exception):
+    pass
+
+def _dos_datetime(mtime: float) -> tuple:
+    t = time.localtime(max(mtime, 315532800))  # el formato DOS empieza en 1980
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    )
+
+class ZipStreamWriter:
+    """Escribe un ZIP (con ZIP64 cuando hace falta) miembro a miembro sobre un fichero ya abierto.
+
+    Cada miembro llega ya comprimido y con su CRC, asi que la cabecera local lleva los tamaños
+    reales y no hace falta volver atras ni usar data descriptors.
+    """
+
+    def __init__(self, f, offset: int = 0, central: Optional[List[tuple]] = None):
+        # offset/central permiten seguir escribiendo un .part a medias (ver ExportJob)
+        self.f = f
+        self.offset = offset
+        self.central = central or []
+
+    def _write(self, data: bytes):
+        self.f.write(data)
+        self.offset += len(data)
+
+    def add(self, arcname: str, method: int, crc: int, compressed_size: int, size: int,
+            mtime: float, payload, progress=None):
+        """Añade un miembro copiando compressed_size bytes de payload (un fichero abierto)."""
+        name = arcname.replace(os.sep, '/').encode('utf-8')
+        dos_time, dos_date = _dos_datetime(mtime)
+        zip64 = size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT
+        extra = struct.pack('<HHQQ', 0x0001, 16, size, compressed_size) if zip64 else b''
+        version = 45 if zip64 else 20
+        header_offset = self.offset
+        self._write(struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, version, 0x0800, method, dos_time, dos_date, crc,
+            ZIP64_LIMIT if zip64 else compressed_size, ZIP64_LIMIT if zip64 else size, len(name), len(extra)
+        ) + name + extra)
+        remaining = compressed_size
+        while remaining:
+            chunk = payload.read(min(EXPORT_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise OSError(f"{arcname} ha cambiado durante la exportacion")
+            self._write(chunk)
+            remaining -= len(chunk)
+            if progress:
+                progress(len(chunk))
+        self.central.append((name, version, method, dos_time, dos_date, crc, compressed_size, size, header_offset))
+
+    def close(self):
+        """Escribe el directorio central y los registros de fin (ZIP64 si hace falta)."""
+        start = self.offset
+        for name, version, method, dos_time, dos_date, crc, compressed_size, size, header_offset in self.central:
+            values = [value for value in (size, compressed_size, header_offset) if value >= ZIP64_LIMIT]
+            extra = struct.pack('<HH', 0x0001, 8 * len(values)) + struct.pack(f'<{len(values)}Q', *values) if values else b''
+            self._write(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, 45 if values else version, 45 if values else version,
+                0x0800, method, dos_time, dos_date, crc,
+                min(compressed_size, ZIP64_LIMIT), min(size, ZIP64_LIMIT),
+                len(name), len(extra), 0, 0, 0, 0o100644 << 16, min(header_offset, ZIP64_LIMIT)
+            ) + name + extra)
+        size = self.offset - start
+        count = len(self.central)
+        if count >= 0xFFFF or size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+            end64 = self.offset
+            self._write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, size, start))
+            self._write(struct.pack('<IIQI', 0x07064b50, 0, end64, 1))
+        self._write(struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0
+        ))
+
+class MemberCache:
+    """Miembros de ZIP ya comprimidos, indexados por hash de contenido y ajustes de compresion.
+
+    Cada entrada es una cabecera (metodo, CRC, tamaño comprimido, tamaño) seguida del payload
+    deflate tal cual va en el ZIP; si compensa guardarlo sin comprimir solo queda la cabecera.
+    Como en MeshCache, leer una entrada le actualiza el mtime y evict() borra las de mtime mas
+    antiguo hasta quedar bajo el tope. Al crearla se barren los temporales que dejo un proceso
+    que murio a medias.
+    """
+
+    HEADER = struct.Struct('<BIQQ')
+    # un temporal mas viejo que esto ya no es de ninguna exportacion en marcha
+    STALE_SECONDS = 24 * 3600
+
+    def __init__(self, config: Config):
+        self.folder = Path(config.get_path('cache_folder')) / 'members'
+        self.limit = config.get_member_cache_limit()
+        self.sweep()
+
+    def _entries(self):
+        """Las entradas del disco (DirEntry), temporales incluidos."""
+        try:
+            shards = [entry.path for entry in os.scandir(self.folder) if entry.is_dir()]
+        except OSError:
+            return
+        for folder in [str(self.folder)] + shards:
+            try:
+                with os.scandir(folder) as scan:
+                    entries = [entry for entry in scan if entry.name.endswith('.bin')]
+            except OSError:
+                continue
+            yield from entries
+
+    def sweep(self):
+        """Borra los tmp-*.bin viejos: entradas que no llegaron a commit() porque el proceso murio."""
+        limit = time.time() - self.STALE_SECONDS
+        for entry in self._entries():
+            try:
+                if entry.name.startswith('tmp-') and entry.stat().st_mtime < limit:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta que la cache quede por debajo del tope."""
+        entries = []
+        for entry in self._entries():
+            if not entry.name.startswith('tmp-'):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # en Windows no se puede borrar si una exportacion la tiene abierta; ya caera
+                pass
+            total -= size
+
+    def path_for(self, digest: str, level: Optional[int]) -> str:
+        return str(self.folder / digest[:2] / f"{digest}-{'store' if level is None else level}.bin")
+
+    def open(self, digest: str, level: Optional[int]) -> Optional[tuple]:
+        """(member, payload) con payload ya posicionado en los datos, o None si no esta o no cuadra."""
+        path = self.path_for(digest, level)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        header = f.read(self.HEADER.size)
+        if len(header) < self.HEADER.size:
+            f.close()
+            return None
+        method, crc, compressed_size, size = self.HEADER.unpack(header)
+        # una entrada cortada o machacada no puede acabar dentro de un ZIP
+        expected = self.HEADER.size + (compressed_size if method == ZIP_DEFLATED else 0)
+        if method not in (ZIP_STORED, ZIP_DEFLATED) or os.fstat(f.fileno()).st_size != expected:
+            f.close()
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if method == ZIP_STORED:
+            f.close()
+            f = None
+        return {'method': method, 'crc': crc, 'compressed_size': compressed_size, 'size': size}, f
+
+    def new_entry(self):
+        """Temporal para una entrada nueva; el hash aun no se sabe, commit() le da nombre."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        f = tempfile.NamedTemporaryFile(dir=self.folder, prefix='tmp-', suffix='.bin', delete=False)
+        f.write(bytes(self.HEADER.size))
+        return f
+
+    def commit(self, f, digest: str, level: Optional[int], member: Dict):
+        """Cierra la entrada y la deja en su sitio; devuelve el payload abierto para leer, o None."""
+        f.seek(0)
+        f.write(self.HEADER.pack(member['method'], member['crc'], member['compressed_size'], member['size']))
+        if member['method'] == ZIP_STORED:
+            f.truncate(self.HEADER.size)
+        f.close()
+        destination = self.path_for(digest, level)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(f.name, destination)
+        if member['method'] == ZIP_STORED:
+            return None
+        payload = open(destination, 'rb')
+        payload.seek(self.HEADER.size)
+        return payload
+
+    def discard(self, f):
+        f.close()
+        try:
+            os.remove(f.name)
+        except OSError:
+            pass
+
+def _compress_member(path: str, level: int, cancelled: threading.Event,
+                     digest: Optional[str] = None, cache: Optional[MemberCache] = None) -> Dict:
+    """Deflate crudo de un fichero, o solo el CRC si va sin comprimir.
+
+    Con cache, si el contenido (digest) ya se comprimio con este nivel se reutiliza el payload
+    sin leer el original. Si no, se comprime (directamente a la cache si la hay), calculando de
+    paso el hash cuando no se sabe; el hash va siempre en el resultado para el fichero de checksums.
+    zlib suelta el GIL mientras comprime, asi que varios hilos usan varios nucleos.
+    """
+    st = os.stat(path)
+    stored = path.lower().endswith(STORED_EXTENSIONS)
+    key_level = None if stored else level
+    if cache and digest:
+        hit = cache.open(digest, key_level)
+        if hit and hit[0]['size'] == st.st_size:
+            member, payload = hit
+            return {**member, 'mtime': st.st_mtime, 'payload': payload, 'hash_row': None, 'digest': digest}
+        if hit and hit[1]:
+            hit[1].close()
+
+    hasher = hashlib.blake2b(digest_size=32) if not digest else None
+    if cache:
+        payload = cache.new_entry()
+    else:
+        payload = None if stored else tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    compressor = None if stored else zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                if cancelled.is_set():
+                    raise ExportCancelled()
+                chunk = f.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                if hasher:
+                    hasher.update(chunk)
+                if compressor:
+                    payload.write(compressor.compress(chunk))
+        if compressor:
+            payload.write(compressor.flush())
+    except BaseException:
+        if payload and cache:
+            cache.discard(payload)
+        elif payload:
+            payload.close()
+        raise
+
+    compressed_size = payload.tell() - (cache.HEADER.size if cache else 0) if compressor else st.st_size
+    # si deflate no encoge, mejor guardarlo tal cual
+    method = ZIP_DEFLATED if compressed_size < st.st_size else ZIP_STORED
+    member = {'method': method, 'crc': crc, 'compressed_size': min(compressed_size, st.st_size), 'size': st.st_size}
+    hash_row = None
+    if hasher:
+        digest = hasher.hexdigest()
+        hash_row = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, digest)
+    if cache:
+        payload = cache.commit(payload, digest, key_level, member)
+    elif payload and method == ZIP_STORED:
+        payload.close()
+        payload = None
+    elif payload:
+        payload.seek(0)
+    return {**member, 'mtime': st.st_mtime, 'payload': payload, 'hash_row': hash_row, 'digest': digest}
+
+DOWNSCALE_STRIP_ROWS = 64
+# Binomial [1, 3, 3, 1] / 8: reduccion 2x sin aliasing y sin el ringing de Lanczos
+_BINOMIAL_2X = np.array([1.0, 3.0, 3.0, 1.0], dtype=np.float32) / 8.0
+
+class PngStreamWriter:
+    """Escribe un PNG de 8 o 16 bits por bandas de filas, sin tener la imagen entera en memoria."""
+
+    COLOUR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}  # canales -> tipo de color PNG
+
+    def __init__(self, f, width: int, height: int, channels: int, bit_depth: int = 8, level: int = 6):
+        self.f = f
+        self.channels = channels
+        self.bytes_per_sample = bit_depth // 8
+        self.compressor = zlib.compressobj(level)
+        self.buffer = bytearray()
+        f.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, self.COLOUR_TYPES[channels], 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.f.write(struct.pack('>I', len(data)) + kind + data)
+        self.f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def write_rows(self, rows: np.ndarray):
+        """rows es (h, w, canales) en uint8 o uint16."""
+        dtype = '>u2' if self.bytes_per_sample == 2 else 'u1'
+        raw = np.ascontiguousarray(rows.astype(dtype, copy=False)).view(np.uint8).reshape(len(rows), -1)
+        # Filtro Sub (1): resta el pixel de la izquierda; en bytes y con desbordamiento, como pide PNG
+        bpp = self.channels * self.bytes_per_sample
+        filtered = np.empty((raw.shape[0], raw.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:bpp + 1] = raw[:, :bpp]
+        filtered[:, bpp + 1:] = raw[:, bpp:] - raw[:, :-bpp]
+        self.write_filtered(filtered)
+
+    def write_filtered(self, filtered: np.ndarray):
+        """Filas ya filtradas, cada una con su byte de tipo de filtro delante."""
+        self.buffer += self.compressor.compress(filtered.tobytes())
+        if len(self.buffer) >= EXPORT_CHUNK_SIZE:
+            self._chunk(b'IDAT', bytes(self.buffer))
+            self.buffer.clear()
+
+    def close(self):
+        self.buffer += self.compressor.flush()
+        self._chunk(b'IDAT', bytes(self.buffer))
+        self._chunk(b'IEND', b'')
+
+class PngBandReader:
+    """Lee un PNG no entrelazado de 8 o 16 bits por bandas de filas, sin decodificarlo entero.
+
+    Los IDAT se descomprimen en streaming. Los filtros PNG van byte a byte contra el mismo byte
+    del pixel de la izquierda y de arriba, asi que cada canal es una secuencia independiente:
+    cada banda se desfiltra canal a canal con el decodificador de PIL, como un PNG gris de 8/16
+    bits con la ultima fila ya decodificada delante (filtro 0) para que Up/Average/Paeth tengan
+    su fila de arriba. Las filas se piden siempre hacia delante, con solape entre bandas.
+    """
+
+    CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # tipo de color -> canales en el fichero
+
+    def __init__(self, path: str):
+        self.f = open(path, 'rb')
+        try:
+            self._read_chunks()
+        except BaseException:
+            self.f.close()
+            raise
+
+    def _read_chunks(self):
+        if self.f.read(8) != b'\x89PNG\r\n\x1a\n':
+            raise ValueError("no es un PNG")
+        self.idat = []
+        self.palette = None
+        transparency = b''
+        depth = colour_type = interlace = None
+        while True:
+            header = self.f.read(8)
+            if len(header) < 8:
+                break
+            length, kind = struct.unpack('>I4s', header)
+            if kind == b'IHDR':
+                self.width, self.height, depth, colour_type, _, _, interlace = struct.unpack('>IIBBBBB', self.f.read(13))
+                self.f.seek(4, os.SEEK_CUR)
+            elif kind in (b'PLTE', b'tRNS'):
+                data = self.f.read(length)
+                self.f.seek(4, os.SEEK_CUR)
+                if kind == b'PLTE':
+                    self.palette = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+                else:
+                    transparency = data
+            elif kind == b'IDAT':
+                self.idat.append((self.f.tell(), length))
+                self.f.seek(length + 4, os.SEEK_CUR)
+            elif kind == b'IEND':
+                break
+            else:
+                self.f.seek(length + 4, os.SEEK_CUR)
+        if interlace or depth not in (8, 16) or colour_type not in self.CHANNELS \
+                or (colour_type == 3 and (depth != 8 or self.palette is None)):
+            raise ValueError("PNG que no se puede leer por bandas")
+        self.depth = depth
+        self.planes = self.CHANNELS[colour_type]
+        self.stride = 1 + self.width * self.planes * depth // 8
+        if colour_type == 3:
+            # como PIL al convertir P a RGBA: alfa del tRNS, opaco si no lo hay
+            palette = np.full((256, 4), 255, dtype=np.uint8)
+            palette[:len(self.palette), :3] = self.palette
+            alpha = np.frombuffer(transparency[:256], dtype=np.uint8)
+            palette[:len(alpha), 3] = alpha
+            self.palette = palette
+        self.channels = 4 if colour_type == 3 else self.planes
+        self.peak = 65535.0 if depth == 16 else 255.0
+        self.inflater = zlib.decompressobj()
+        self.pending = bytearray()
+        self.next_idat = 0
+        # ultima fila decodificada de cada canal, en bytes; la de encima de la primera es cero
+        self.previous = [bytes(self.width * depth // 8)] * self.planes
+        self.start = 0
+        self.buffer = np.empty((0, self.width, self.channels), dtype=np.uint16 if depth == 16 else np.uint8)
+
+    @property
+    def size(self) -> tuple:
+        return self.width, self.height
+
+    def _read_raw(self, size: int) -> bytes:
+        while len(self.pending) < size:
+            data = self.inflater.unconsumed_tail
+            if not data:
+                if self.next_idat == len(self.idat):
+                    raise ValueError("PNG truncado")
+                offset, length = self.idat[self.next_idat]
+                self.next_idat += 1
+                self.f.seek(offset)
+                data = self.f.read(length)
+            self.pending += self.inflater.decompress(data, max(size - len(self.pending), EXPORT_CHUNK_SIZE))
+        raw = bytes(self.pending[:size])
+        del self.pending[:size]
+        return raw
+
+    def _decode(self, count: int) -> np.ndarray:
+        raw = np.frombuffer(self._read_raw(count * self.stride), dtype=np.uint8).reshape(count, self.stride)
+        if raw[:, 0].max() > 4:
+            raise ValueError("filtro PNG desconocido")
+        sample_bytes = self.depth // 8
+        samples = raw[:, 1:].reshape(count, self.width, self.planes, sample_bytes)
+        planes = []
+        for plane in range(self.planes):
+            rows = np.empty((count + 1, 1 + self.width * sample_bytes), dtype=np.uint8)
+            rows[0, 0] = 0
+            rows[0, 1:] = np.frombuffer(self.previous[plane], dtype=np.uint8)
+            rows[1:, 0] = raw[:, 0]
+            rows[1:, 1:] = samples[:, :, plane].reshape(count, -1)
+            synthetic = BytesIO()
+            writer = PngStreamWriter(synthetic, self.width, count + 1, 1, self.depth, level=0)
+            writer.write_filtered(rows)
+            writer.close()
+            synthetic.seek(0)
+            with Image.open(synthetic) as image:
+                decoded = np.asarray(image).astype(self.buffer.dtype)[1:]
+            self.previous[plane] = decoded[-1].astype('>u2' if self.depth == 16 else np.uint8).tobytes()
+            planes.append(decoded)
+        pixels = np.stack(planes, axis=-1)
+        if self.palette is not None:
+            pixels = self.palette[pixels[..., 0]]
+        return pixels
+
+    def rows(self, first: int, last: int) -> np.ndarray:
+        """Filas [first, last) como (filas, ancho, canales) en uint8/uint16; first no puede ir hacia atras."""
+        if first < self.start:
+            raise ValueError("las bandas se leen hacia delante")
+        self.buffer = self.buffer[first - self.start:]
+        self.start = first
+        missing = last - first - len(self.buffer)
+        if missing > 0:
+            self.buffer = np.concatenate([self.buffer, self._decode(missing)])
+        return self.buffer[:last - first]
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _ImageBandReader:
+    """La misma interfaz que PngBandReader para lo que no se puede leer por bandas: se decodifica entero."""
+
+    def __init__(self, image: Image.Image, channels: int, peak: float):
+        self.image = image
+        self.size = image.size
+        self.channels = channels
+        self.peak = peak
+
+    def rows(self, first: int, last: int) -> np.ndarray:
+        return np.asarray(self.image.crop((0, first, self.image.width, last))).reshape(
+            last - first, self.image.width, self.channels)
+
+    def close(self):
+        self.image.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+def _linear_to_srgb(values: np.ndarray) -> np.ndarray:
+    return np.where(values <= 0.0031308, values * 12.92, 1.055 * np.maximum(values, 0.0) ** (1.0 / 2.4) - 0.055)
+
+def _lanczos_taps(source: int, target: int) -> tuple:
+    """Indices de origen (target, taps) y pesos Lanczos3 para pasar una dimension de source a target muestras."""
+    scale = target / source
+    support = 3.0 / min(scale, 1.0)
+    centres = (np.arange(target) + 0.5) / scale - 0.5
+    indices = np.floor(centres - support).astype(np.int64)[:, None] + 1 + np.arange(int(np.ceil(2 * support)) + 1)
+    x = (indices - centres[:, None]) * min(scale, 1.0)
+    weights = np.where(np.abs(x) < 3.0, np.sinc(x) * np.sinc(x / 3.0), 0.0)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.clip(indices, 0, source - 1), weights.astype(np.float32)
+
+class _ResizedBandReader:
+    """Otro lector de bandas reescalado a (width, height) con Lanczos3; da float32 entre 0 y 1 (peak 1).
+
+    Cada banda de salida lee del original solo las filas que cubren sus taps, siempre hacia
+    delante como pide PngBandReader, y filtra tap a tap como _downscale_2x. Con srgb los canales
+    de color se filtran en luz lineal y se devuelven otra vez en sRGB.
+    """
+
+    def __init__(self, reader, width: int, height: int, srgb: bool = False):
+        self.reader = reader
+        self.size = (width, height)
+        self.channels = reader.channels
+        self.peak = 1.0
+        self.srgb = srgb
+        self.colour = slice(0, 3) if reader.channels >= 3 else slice(0, 1)
+        source_width, source_height = reader.size
+        self.row_indices, self.row_weights = _lanczos_taps(source_height, height)
+        self.column_indices, self.column_weights = _lanczos_taps(source_width, width)
+
+    def rows(self, first: int, last: int) -> np.ndarray:
+        indices, weights = self.row_indices[first:last], self.row_weights[first:last]
+        low = int(indices.min())
+        band = self.reader.rows(low, int(indices.max()) + 1).astype(np.float32) / self.reader.peak
+        if self.srgb:
+            band[..., self.colour] = _srgb_to_linear(band[..., self.colour])
+        indices = indices - low
+        vertical = weights[:, 0, None, None] * band[indices[:, 0]]
+        for tap in range(1, indices.shape[1]):
+            vertical += weights[:, tap, None, None] * band[indices[:, tap]]
+        del band
+        result = self.column_weights[None, :, 0, None] * vertical[:, self.column_indices[:, 0]]
+        for tap in range(1, self.column_indices.shape[1]):
+            result += self.column_weights[None, :, tap, None] * vertical[:, self.column_indices[:, tap]]
+        result = np.clip(result, 0.0, 1.0)
+        if self.srgb:
+            result[..., self.colour] = _linear_to_srgb(result[..., self.colour])
+        return result
+
+    def close(self):
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _open_for_downscale(path: str):
+    """Abre una textura para leerla por bandas de filas (.rows, .size, .channels, .peak).
+
+    Los PNG de 8 y 16 bits no entrelazados se leen de verdad por bandas y conservan los 16 bits
+    en cualquier tipo de color. El resto (JPEG, TGA, TIFF, PNG entrelazados o de menos de 8 bits)
+    se decodifica entero con PIL, conservando los 16 bits solo en gris.
+    """
+    if path.lower().endswith('.png'):
+        try:
+            return PngBandReader(path)
+        except ValueError:
+            pass
+    image = Image.open(path)
+    if image.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+        return _ImageBandReader(image, 1, 65535.0)
+    if image.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+    return _ImageBandReader(image, len(image.getbands()), 255.0)
+
+def _downscale_2x(source: str, destination: str, srgb: bool, normal: bool):
+    """Reduce a la mitad con el filtro binomial, por bandas de filas.
+
+    Los PNG se leen por bandas (ver PngBandReader), asi que en memoria solo hay unas pocas
+    bandas de entrada y salida; los demas formatos se decodifican enteros en su tipo nativo.
+    El filtrado va en float32 por bandas de DOWNSCALE_STRIP_ROWS filas de salida. Los mapas de
+    color se filtran en luz lineal y los normal maps se renormalizan.
+    """
+    reader = _open_for_downscale(source)
+    with reader:
+        width, height = reader.size
+        channels, peak = reader.channels, reader.peak
+        out_width, out_height = max(1, width // 2), max(1, height // 2)
+        columns = np.clip(2 * np.arange(out_width)[:, None] + np.arange(-1, 3)[None, :], 0, width - 1)
+        colour = slice(0, 3) if channels >= 3 else slice(0, 1)
+        temporary = f"{destination}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            writer = PngStreamWriter(f, out_width, out_height, channels, 16 if peak > 255 else 8)
+            for top in range(0, out_height, DOWNSCALE_STRIP_ROWS):
+                bottom = min(out_height, top + DOWNSCALE_STRIP_ROWS)
+                first, last = max(0, 2 * top - 1), min(height, 2 * bottom + 2)
+                strip = reader.rows(first, last).astype(np.float32) / peak
+                if srgb:
+                    strip[..., colour] = _srgb_to_linear(strip[..., colour])
+                rows = np.clip(2 * np.arange(top, bottom)[:, None] + np.arange(-1, 3)[None, :], 0, height - 1) - first
+                # tap a tap en vez de con un gather (filas, 4, ...): asi no hay copias 4x mas grandes que la banda
+                vertical = _BINOMIAL_2X[0] * strip[rows[:, 0]]
+                for tap in range(1, 4):
+                    vertical += _BINOMIAL_2X[tap] * strip[rows[:, tap]]
+                strip = _BINOMIAL_2X[0] * vertical[:, columns[:, 0]]
+                for tap in range(1, 4):
+                    strip += _BINOMIAL_2X[tap] * vertical[:, columns[:, tap]]
+                del vertical
+                if normal and channels >= 3:
+                    vectors = strip[..., :3] * 2.0 - 1.0
+                    vectors /= np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-6)
+                    strip[..., :3] = vectors * 0.5 + 0.5
+                if srgb:
+                    strip[..., colour] = _linear_to_srgb(strip[..., colour])
+                strip = np.clip(np.rint(strip * peak), 0, peak)
+                writer.write_rows(strip.astype(np.uint16 if peak > 255 else np.uint8))
+            writer.close()
+        os.replace(temporary, destination)
+
+def _resize_to_long_side(source: str, destination: str, long_side: int, srgb: bool, normal: bool):
+    """Escala con Lanczos3 hasta que el lado mayor mida long_side, por bandas y con los bits del original.
+
+    Es el ultimo tramo (menos de 2x) de _derive_texture; como _downscale_2x, los mapas de color
+    se filtran en luz lineal y los normal maps se renormalizan.
+    """
+    reader = _open_for_downscale(source)
+    width, height = reader.size
+    scale = long_side / max(width, height)
+    peak, channels = reader.peak, reader.channels
+    with _ResizedBandReader(reader, max(1, round(width * scale)), max(1, round(height * scale)), srgb) as resized:
+        out_width, out_height = resized.size
+        temporary = f"{destination}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            writer = PngStreamWriter(f, out_width, out_height, channels, 16 if peak > 255 else 8)
+            for top in range(0, out_height, DOWNSCALE_STRIP_ROWS):
+                strip = resized.rows(top, min(out_height, top + DOWNSCALE_STRIP_ROWS))
+                if normal and channels >= 3:
+                    vectors = strip[..., :3] * 2.0 - 1.0
+                    vectors /= np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-6)
+                    strip[..., :3] = vectors * 0.5 + 0.5
+                strip = np.clip(np.rint(strip * peak), 0, peak)
+                writer.write_rows(strip.astype(np.uint16 if peak > 255 else np.uint8))
+            writer.close()
+        os.replace(temporary, destination)
+
+def _derive_texture(source: str, digest: Optional[str], long_side: int, cache_folder: str,
+                    srgb: bool = False, normal: bool = False) -> str:
+    """Version reducida de una textura, sacada de la piramide cacheada en cache_folder.
+
+    Los niveles se guardan como <hash>_<lado>.png, asi que pedir 2K de un 8K deja tambien el 4K
+    listo para la siguiente vez. Devuelve la ruta del nivel pedido con la extension del original.
+    """
+    digest = digest or _hash_file(source)
+    extension = os.path.splitext(source)[1].lower()
+    os.makedirs(cache_folder, exist_ok=True)
+    with Image.open(source) as image:
+        size = max(image.size)
+    current = source
+    while size >= 2 * long_side:
+        size //= 2
+        level = os.path.join(cache_folder, f"{digest}_{size}.png")
+        if not os.path.exists(level):
+            _downscale_2x(current, level, srgb, normal)
+        current = level
+    if size != long_side:
+        # lados que no son potencia de dos: el ultimo tramo (menos de 2x) con Lanczos
+        level = os.path.join(cache_folder, f"{digest}_{long_side}.png")
+        if not os.path.exists(level):
+            _resize_to_long_side(current, level, long_side, srgb, normal)
+        current = level
+    if extension == '.png' or current == source:
+        return current
+    # otros formatos: se convierte el nivel PNG (ya pequeño) al formato del original
+    converted = os.path.join(cache_folder, f"{digest}_{long_side}{extension}")
+    if not os.path.exists(converted):
+        with Image.open(current) as image:
+            if extension in ('.jpg', '.jpeg') and image.mode not in ('L', 'RGB'):
+                image = image.convert('RGB')
+            image.save(f"{converted}.{os.getpid()}.tmp", format=Image.registered_extensions()[extension])
+        os.replace(f"{converted}.{os.getpid()}.tmp", converted)
+    return converted
+
+# Orden de los canales en la textura empaquetada y valor si falta el mapa (AO blanco, no metalico)
+ORM_CHANNELS = [("Ambient Occlusion", 1.0), ("Roughness", 1.0), ("Metalness", 0.0)]
+GLOSS_TOKENS = {'gloss', 'glossiness'}
+
+def _orm_sources(members: List[tuple], slots: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """{hueco: ruta} de AO, Roughness y Metalness entre los miembros de un export.
+
+    slots es el hueco del manifiesto por ruta; si no lo hay se mira el nombre del fichero.
+    """
+    wanted = {slot for slot, _ in ORM_CHANNELS}
+    sources = {}
+    for path, _ in members:
+        if not path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        slot = slots.get(path)
+        if slot is None:
+            scores = _slot_name_scores(path)
+            slot = max(scores, key=scores.get) if scores else None
+        if slot in wanted and slot not in sources:
+            sources[slot] = path
+    return sources
+
+def _pack_orm(sources: Dict[str, str], digests: Dict[str, Optional[str]], cache_folder: str,
+              long_side: Optional[int] = None) -> str:
+    """Empaqueta AO, Roughness y Metalness en los canales R, G y B de un PNG cacheado.
+
+    La clave de la cache son los hashes de los mapas y el lado pedido. Si hay long_side, los
+    mapas mas grandes pasan antes por la piramide de _derive_texture. Se recorre por bandas de
+    filas con los mismos lectores que _downscale_2x (los PNG de verdad por bandas). Los mapas
+    mas pequeños que el mayor se escalan a su tamaño banda a banda y los de glossiness se invierten.
+    """
+    digests = {slot: digests.get(slot) or _hash_file(path) for slot, path in sources.items()}
+    key = hashlib.sha1(json.dumps([[digests.get(slot) for slot, _ in ORM_CHANNELS], long_side]).encode('utf-8'))
+    os.makedirs(cache_folder, exist_ok=True)
+    destination = os.path.join(cache_folder, f"orm_{key.hexdigest()}.png")
+    if os.path.exists(destination):
+        return destination
+    names = {slot: os.path.basename(path) for slot, path in sources.items()}
+    paths = dict(sources)
+    if long_side:
+        for slot, path in sources.items():
+            with Image.open(path) as image:
+                larger = max(image.size) > long_side
+            if larger:
+                paths[slot] = _derive_texture(path, digests[slot], long_side, cache_folder)
+
+    readers = {}
+    try:
+        for slot, path in paths.items():
+            readers[slot] = _open_for_downscale(path)
+        width, height = max((reader.size for reader in readers.values()), key=lambda size: size[0] * size[1])
+        out_peak = 65535.0 if any(reader.peak > 255 for reader in readers.values()) else 255.0
+        for slot, reader in readers.items():
+            if reader.size != (width, height):
+                readers[slot] = _ResizedBandReader(reader, width, height)
+        dtype = np.uint16 if out_peak > 255 else np.uint8
+        temporary = f"{destination}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            writer = PngStreamWriter(f, width, height, 3, 16 if out_peak > 255 else 8)
+            for top in range(0, height, DOWNSCALE_STRIP_ROWS):
+                bottom = min(height, top + DOWNSCALE_STRIP_ROWS)
+                strip = np.empty((bottom - top, width, 3), dtype=dtype)
+                for index, (slot, default) in enumerate(ORM_CHANNELS):
+                    if slot not in readers:
+                        strip[..., index] = round(default * out_peak)
+                        continue
+                    reader = readers[slot]
+                    values = reader.rows(top, bottom)[..., 0].astype(np.float32) * (out_peak / reader.peak)
+                    if GLOSS_TOKENS & set(re.split(r'[^a-z]+', names[slot].lower())):
+                        values = out_peak - values
+                    strip[..., index] = np.clip(np.rint(values), 0, out_peak)
+                writer.write_rows(strip)
+            writer.close()
+        os.replace(temporary, destination)
+    finally:
+        for reader in readers.values():
+            reader.close()
+    return destination
+
+def _orm_spec(members: List[tuple], slots: Dict[str, Optional[str]], digests: Dict[str, str],
+              cache_folder: str, arcname: str, long_side: Optional[int] = None) -> Optional[tuple]:
+    """Spec de _derive_textures para la ORM de unos miembros, o None si no tienen ninguno de los tres mapas."""
+    sources = _orm_sources(members, slots)
+    if not sources:
+        return None
+    return (_pack_orm, (sources, {slot: digests.get(path) for slot, path in sources.items()}, cache_folder, long_side),
+            arcname)
+
+def _derive_textures(specs: List[tuple], cancelled: threading.Event, max_workers: Optional[int] = None) -> List[tuple]:
+    """Genera en un pool de procesos las texturas derivadas (reducidas, empaquetadas...).
+
+    specs son (funcion, argumentos, nombre en el export); la funcion devuelve la ruta del
+    resultado, ya cacheado. Devuelve [(ruta derivada, nombre en el export)].
+    """
+    if not specs:
+        return []
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as pool:
+        futures = {pool.submit(worker, *args): name for worker, args, name in specs}
+        try:
+            for future in as_completed(futures):
+                if cancelled.is_set():
+                    raise ExportCancelled()
+                results.append((future.result(), futures[future]))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return sorted(results, key=lambda item: item[1])
+
+def _resolution_label_size(label: str) -> int:
+    return int(label[:-1]) * 1024
+
+def _plan_resolution(rows: List[Dict], resolution: Optional[str]) -> tuple:
+    """Elige los ficheros de una resolucion: (rel_paths tal cual, [(rel_path origen, rel_path destino)] a reducir).
+
+    Las variantes de una misma textura se agrupan por nombre sin el token de resolucion. Si no
+    existe la pedida se reduce la menor de las que son mas grandes; las texturas que solo
+    existen mas pequeñas no se exportan.
+    """
+    if not resolution:
+        return [row['rel_path'] for row in rows], []
+    target = int(resolution[:-1])
+    exact, derived = [], []
+    groups = {}
+    for row in rows:
+        if row['resolution'] is None:
+            exact.append(row['rel_path'])
+            continue
+        folder, name = os.path.split(row['rel_path'])
+        groups.setdefault((folder, _RESOLUTION_TOKEN_RE.sub('#', name).lower()), []).append(row)
+    for variants in groups.values():
+        match = [row for row in variants if row['resolution'] == resolution]
+        if match:
+            exact.append(match[0]['rel_path'])
+            continue
+        larger = [row for row in variants if int(row['resolution'][:-1]) > target
+                  and row['rel_path'].lower().endswith(IMAGE_EXTENSIONS)]
+        if larger:
+            source = min(larger, key=lambda row: int(row['resolution'][:-1]))['rel_path']
+            folder, name = os.path.split(source)
+            renamed = _RESOLUTION_TOKEN_RE.sub(lambda m: str(target) + ('K' if m.group(0)[-1] == 'K' else 'k'), name)
+            derived.append((source, os.path.join(folder, renamed)))
+    return exact, derived
+
+FOLDER_CHECKSUMS = 'checksums.json'
+FOLDER_JOURNAL = '.export-journal'
+
+def _export_signature(files: List[tuple], *settings) -> str:
+    """Identifica una exportacion (lista de ficheros y ajustes) para saber si un diario es suyo."""
+    return hashlib.sha1(json.dumps([list(settings)] + [list(item) for item in files]).encode('utf-8')).hexdigest()
+
+def _source_stat(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def _read_journal(path: str, signature: str) -> List[Dict]:
+    """Entradas de un diario de exportacion si es de la misma exportacion; una ultima linea cortada se ignora."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        if not lines or json.loads(lines[0]).get('signature') != signature:
+            return []
+    except (OSError, ValueError):
+        return []
+    entries = []
+    for line in lines[1:]:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            break
+    return entries
+
+def _write_checksums(path: str, entries: List[Dict]):
+    """Fichero de checksums (nombre, tamaño, BLAKE2b) que usa verify_export()."""
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump({'algorithm': 'blake2b-256', 'files': entries}, f, indent=1)
+    os.replace(temporary, path)
+
+class ExportJob:
+    """Exporta ficheros a un ZIP en un hilo aparte; la UI consulta progress/done/error.
+
+    Los miembros se comprimen en paralelo pero se escriben en orden, con una ventana limitada
+    de miembros en vuelo para no llenar el disco de temporales. Se escribe a un .part y solo se
+    renombra al final, asi que cancelar o fallar nunca deja un ZIP a medias.
+
+    Un diario (.journal) apunta cada miembro ya escrito, tras un fsync del .part cada pocos
+    segundos o 64 MiB. Si la exportacion falla, resumed() trunca el .part tras el ultimo miembro
+    confirmado y sigue desde ahi. Al acabar queda un .checksums.json al lado para verify_export().
+    """
+
+    CHECKPOINT_BYTES = 64 * 1024 * 1024
+    CHECKPOINT_SECONDS = 2.0
+
+    def __init__(self, files: List[tuple], destination: str, level: int = 6, max_workers: Optional[int] = None,
+                 cache: Optional[MemberCache] = None, digests: Optional[Dict[str, str]] = None,
+                 extra_members: Optional[Dict[str, bytes]] = None, derived: Optional[List[tuple]] = None,
+                 planner=None):
+        # planner(progress) -> (files, extra_members, derived, digests): se ejecuta en el hilo del job
+        # antes de nada, para que preparar una exportacion grande no bloquee la UI
+        self.planner = planner
+        self.plan_progress = 0.0
+        self.requested_files = files
+        self.files = list(files)  # [(ruta, nombre en el zip)]; al arrancar se añaden las texturas reducidas
+        self.derived = derived or []  # specs de _derive_textures (texturas reducidas, ORM...)
+        self.extra_members = extra_members or {}  # {nombre en el zip: contenido}, p.ej. manifest.json
+        self.destination = destination
+        self.temporary = destination + '.part'
+        self.journal_path = destination + '.journal'
+        self.level = level
+        self.cache = cache
+        self.digests = digests or {}
+        # hashes calculados durante la exportacion; el hilo de Tk los guarda luego en file_hashes
+        self.new_hashes = []
+        self.checksums = []
+        self.resumed_members = 0
+        self.done_names = set()
+        self.pending_entries = []
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.total = sum(os.path.getsize(path) for path, _ in files if os.path.isfile(path))
+        self.written = 0
+        self.cancelled = threading.Event()
+        self.done = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def resumed(self) -> 'ExportJob':
+        """Job nuevo con los mismos parametros; al arrancar sigue desde el diario de este."""
+        return ExportJob(self.requested_files, self.destination, self.level, self.max_workers,
+                         self.cache, self.digests, self.extra_members, self.derived, self.planner)
+
+    @property
+    def progress(self) -> float:
+        if self.planner is not None:
+            return self.plan_progress
+        return self.written / self.total if self.total else (1.0 if self.done else 0.0)
+
+    def _advance(self, size: int):
+        self.written += size
+
+    def _set_plan_progress(self, fraction: float):
+        if self.cancelled.is_set():
+            raise ExportCancelled()
+        self.plan_progress = fraction
+
+    def _plan(self):
+        if self.planner is None:
+            return
+        files, self.extra_members, self.derived, self.digests = self.planner(self._set_plan_progress)
+        self.requested_files = files
+        self.files = list(files)
+        self.total = sum(os.path.getsize(path) for path, _ in files if os.path.isfile(path))
+        # ya planificado: resumed() reutiliza el plan
+        self.planner = None
+
+    def _run(self):
+        futures = []
+        try:
+            self._plan()
+            self._add_derived()
+            signature = _export_signature(self.files, self.level, sorted(self.extra_members))
+            committed = _read_journal(self.journal_path, signature)
+            # los miembros van en orden: vale el tramo inicial cuyos originales no han cambiado
+            sources = {name: path for path, name in self.files}
+            for index, entry in enumerate(committed):
+                if entry['name'] in sources and entry.get('source') != _source_stat(sources[entry['name']]):
+                    committed = committed[:index]
+                    break
+            if committed and (not os.path.exists(self.temporary)
+                              or os.path.getsize(self.temporary) < committed[-1]['end']):
+                committed = []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                try:
+                    with open(self.temporary, 'r+b' if committed else 'wb') as f, \
+                            open(self.journal_path, 'w', encoding='utf-8') as journal:
+                        writer = self._resume(f, journal, signature, committed)
+                        self._write_archive(pool, writer, futures, journal)
+                except Exception:
+                    # que los hilos dejen de comprimir antes de que el pool espere por ellos
+                    self.cancelled.set()
+                    raise
+            _write_checksums(self.destination + '.checksums.json', self.checksums)
+            os.replace(self.temporary, self.destination)
+            os.remove(self.journal_path)
+            if self.cache:
+                self.cache.evict()
+        except ExportCancelled:
+            self._discard(futures)
+            for path in (self.temporary, self.journal_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        except Exception as error:
+            # el .part y el diario se quedan: resumed() sigue desde el ultimo miembro confirmado
+            self.error = error
+            self._discard(futures)
+        finally:
+            self.done = True
+
+    @property
+    def outputs(self) -> List[str]:
+        """Ficheros que el job escribe (o deja a medias) en disco."""
+        return [self.destination, self.destination + '.checksums.json', self.temporary, self.journal_path]
+
+    def _add_derived(self):
+        derived = _derive_textures(self.derived, self.cancelled)
+        self.files = list(self.requested_files) + derived
+        self.total += sum(os.path.getsize(path) for path, _ in derived)
+
+    def _resume(self, f, journal, signature: str, committed: List[Dict]) -> ZipStreamWriter:
+        """Deja el .part justo tras el ultimo miembro confirmado y rehace el diario con lo que vale."""
+        journal.write(json.dumps({'signature': signature}) + '\n')
+        for entry in committed:
+            journal.write(json.dumps(entry) + '\n')
+        journal.flush()
+        end = committed[-1]['end'] if committed else 0
+        f.truncate(end)
+        f.seek(end)
+        self.resumed_members = len(committed)
+        self.done_names = {entry['name'] for entry in committed}
+        self.checksums = [
+            {'name': entry['name'], 'size': entry['size'], 'blake2b': entry['digest']} for entry in committed
+        ]
+        sizes = {name: os.path.getsize(path) for path, name in self.files if os.path.isfile(path)}
+        self.written = sum(sizes.get(entry['name'], 0) for entry in committed)
+        self.pending_entries = []
+        self.checkpoint_bytes = 0
+        self.checkpoint_time = time.monotonic()
+        return ZipStreamWriter(f, end, [
+            (entry['name'].encode('utf-8'), entry['version'], entry['method'], entry['dos_time'], entry['dos_date'],
+             entry['crc'], entry['compressed_size'], entry['size'], entry['header_offset'])
+            for entry in committed
+        ])
+
+    def _commit(self, writer: ZipStreamWriter, journal, digest: str, source: Optional[List[int]] = None):
+        """Apunta el ultimo miembro escrito. El diario solo se escribe tras un fsync del .part,
+        agrupando miembros para no hacer un fsync por fichero."""
+        name, version, method, dos_time, dos_date, crc, compressed_size, size, header_offset = writer.central[-1]
+        entry = {
+            'name': name.decode('utf-8'), 'version': version, 'method': method, 'dos_time': dos_time,
+            'dos_date': dos_date, 'crc': crc, 'compressed_size': compressed_size, 'size': size,
+            'header_offset': header_offset, 'end': writer.offset, 'digest': digest, 'source': source
+        }
+        self.checksums.append({'name': entry['name'], 'size': size, 'blake2b': digest})
+        self.pending_entries.append(entry)
+        self.checkpoint_bytes += compressed_size
+        if self.checkpoint_bytes >= self.CHECKPOINT_BYTES \
+                or time.monotonic() - self.checkpoint_time >= self.CHECKPOINT_SECONDS:
+            writer.f.flush()
+            os.fsync(writer.f.fileno())
+            for pending in self.pending_entries:
+                journal.write(json.dumps(pending) + '\n')
+            journal.flush()
+            self.pending_entries = []
+            self.checkpoint_bytes = 0
+            self.checkpoint_time = time.monotonic()
+
+    def _write_archive(self, pool: ThreadPoolExecutor, writer: ZipStreamWriter, futures: List[tuple], journal):
+        pending = iter([(path, arcname) for path, arcname in self.files if arcname not in self.done_names])
+
+        def submit_next():
+            item = next(pending, None)
+            if item:
+                futures.append((*item, pool.submit(_compress_member, item[0], self.level, self.cancelled,
+                                                   self.digests.get(item[0]), self.cache)))
+
+        for _ in range(self.max_workers * 2):
+            submit_next()
+        while futures:
+            path, arcname, future = futures[0]
+            member = future.result()
+            futures.pop(0)
+            submit_next()
+            source = _source_stat(path)
+            digest = self._write_member(writer, path, arcname, member)
+            self._commit(writer, journal, digest, source)
+        for arcname, data in self.extra_members.items():
+            if arcname in self.done_names:
+                continue
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            writer.add(arcname, ZIP_DEFLATED, zlib.crc32(data), len(compressed), len(data), time.time(), BytesIO(compressed))
+            self._commit(writer, journal, hashlib.blake2b(data, digest_size=32).hexdigest())
+        writer.close()
+
+    def _write_member(self, writer: ZipStreamWriter, path: str, arcname: str, member: Dict) -> str:
+        if self.cancelled.is_set():
+            raise ExportCancelled()
+        payload = member.pop('payload')
+        hash_row = member.pop('hash_row')
+        digest = member.pop('digest')
+        if hash_row:
+            self.new_hashes.append(hash_row)
+        if payload is None:
+            # sin comprimir: se copia del original; el tamaño lo ha fijado el CRC, no debe cambiar
+            with open(path, 'rb') as source:
+                writer.add(arcname, payload=source, progress=self._advance, **member)
+        else:
+            with payload:
+                size = member['size']
+                writer.add(arcname, payload=payload, **member)
+                self._advance(size)
+        return digest
+
+    def _discard(self, futures: List[tuple]):
+        for _, _, future in futures:
+            if future.exception() is None and future.result()['payload']:
+                future.result()['payload'].close()
+
+def _safe_name(name: str) -> str:
+    """Nombre valido como fichero o carpeta en cualquier sistema."""
+    return re.sub(r'[<>:"/\\|?*\x00-\x1f]+', '_', name).strip(' .') or 'asset'
+
+class BatchExportService:
+    """Prepara la exportacion de varios assets en un solo destino, guardando una vez cada contenido repetido.
+
+    Cada asset va a su carpeta; los ficheros cuyo contenido aparece mas de una vez (texturas
+    compartidas, copias entre assets) van una sola vez a _shared/ y manifest.json dice que
+    fichero de cada asset es cual.
+    """
+
+    SHARED_FOLDER = '_shared'
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.hashes = HashService(db)
+
+    def plan(self, assets: List[Dict], progress=None) -> tuple:
+        """Devuelve ([(ruta, nombre en destino)], manifest) para ExportJob.
 
-            # Insertar etiquetas de ejemplo si la tabla de tags está vacía
-            cursor = self.conn.execute('SELECT COUNT(*) FROM tags')
-            if cursor.fetchone()[0] == 0:  # Si no hay tags en la tabla
-                with self.conn:
-                    self.conn.executemany(
-                        'INSERT INTO tags (name) VALUES (?)',
-                        [('Example Tag 1',), ('Example Tag 2',), ('Example Tag 3',)]
-                    )
+        progress(fraccion), si se da, avanza con el manifiesto de cada asset (la mitad) y con el hasheo.
+        """
+        manifests = ManifestService(self.db)
+        entries = []
+        for index, asset in enumerate(assets):
+            if progress:
+                progress(0.5 * index / len(assets))
+            rows = self.db.get_asset_files(asset['id'])
+            if not rows:
+                manifests.index_assets([asset])
+                rows = self.db.get_asset_files(asset['id'])
+            for row in rows:
+                path = os.path.join(asset['path'], row['rel_path'])
+                if os.path.isfile(path):
+                    entries.append((asset, row['rel_path'], path, row['size']))
 
-    def get_folders(self):
-        """consigue las carpetas y eso"""
-        cursor = self.conn.execute('SELECT id, name, parent_id FROM folders')
-        folders = [{'id': row[0], 'name': row[1], 'parent_id': row[2]} for row in cursor.fetchall()]
-        return folders
+        # Solo se hashea lo que tiene el mismo tamaño que otro fichero, como en duplicate_report
+        by_size = {}
+        for _, _, path, size in entries:
+            by_size.setdefault(size, []).append(path)
+        candidates = [path for paths in by_size.values() if len(paths) > 1 for path in paths]
+        hash_progress = None
+        if progress:
+            hash_progress = lambda done, total: progress(0.5 + 0.5 * done / total)
+        digests = self.hashes.hash_files(candidates, hash_progress)
+        counts = {}
+        for path in candidates:
+            if path in digests:
+                counts[digests[path]] = counts.get(digests[path], 0) + 1
 
-    def add_folder(self, name: str, parent_id: Optional[int] = None):
-        """pone una nueva carpeta"""
-        with self.conn:
-            self.conn.execute(
-                'INSERT INTO folders (name, parent_id) VALUES (?, ?)',
-                (name, parent_id)
-            )
+        members = []
+        written = set()
+        shared = {}
+        folders = {}
+        manifest = {'created': datetime.now().isoformat(timespec='seconds'), 'assets': []}
+        for asset in assets:
+            folder = self._folder_name(asset, folders)
+            manifest['assets'].append({
+                'id': asset['id'], 'name': asset['name'], 'type': asset['type'], 'folder': folder, 'files': {}
+            })
+        by_id = {entry['id']: entry for entry in manifest['assets']}
+        for asset, rel_path, path, _ in entries:
+            digest = digests.get(path)
+            if digest and counts[digest] > 1:
+                # el nombre lo pone la primera copia, aunque las demas se llamen distinto
+                arcname = shared.setdefault(digest, f"{self.SHARED_FOLDER}/{digest[:16]}_{os.path.basename(rel_path)}")
+            else:
+                arcname = f"{by_id[asset['id']]['folder']}/{rel_path.replace(os.sep, '/')}"
+            if arcname not in written:
+                written.add(arcname)
+                members.append((path, arcname))
+            by_id[asset['id']]['files'][rel_path.replace(os.sep, '/')] = arcname
+        manifest['shared_files'] = sum(1 for _, arcname in members if arcname.startswith(self.SHARED_FOLDER + '/'))
+        return members, manifest
 
-    def get_all_tags(self):
-        """saca las etiquetas de la base de datos"""
-        cursor = self.conn.execute('SELECT name FROM tags')
-        tags = [row[0] for row in cursor.fetchall()]
-        return tags
-    def search_assets(self, query: Optional[str] = None, asset_type: Optional[str] = None, 
-                      environment: Optional[str] = None, tags: Optional[List[str]] = None) -> List[Dict]:
-        """Busca assets según el nombre, tipo, entorno y etiquetas."""
-        sql_query = '''
-            SELECT assets.*
-            FROM assets
-            LEFT JOIN asset_tags ON assets.id = asset_tags.asset_id
-            LEFT JOIN tags ON tags.id = asset_tags.tag_id
-            WHERE 1=1
-        '''
-        parameters = []
+    def orm_specs(self, assets: List[Dict], manifest: Dict) -> List[tuple]:
+        """Specs de _derive_textures con la ORM de cada asset, en su carpeta; se generan en paralelo al exportar."""
+        folder = str(Path(self.db.config.get_path('cache_folder')) / 'derived')
+        by_id = {entry['id']: entry for entry in manifest['assets']}
+        specs = []
+        for asset in assets:
+            rows = self.db.get_asset_files(asset['id'])
+            members = [(os.path.join(asset['path'], row['rel_path']), row['rel_path']) for row in rows]
+            members = [(path, rel_path) for path, rel_path in members if os.path.isfile(path)]
+            slots = {os.path.join(asset['path'], row['rel_path']): row['slot'] for row in rows}
+            digests = self.hashes.cached_digests([path for path, _ in members])
+            entry = by_id[asset['id']]
+            arcname = f"{entry['folder']}/{_safe_name(asset['name'])}_ORM.png"
+            spec = _orm_spec(members, slots, digests, folder, arcname)
+            if spec:
+                specs.append(spec)
+                entry['files']['ORM'] = arcname
+        return specs
 
-        # Filtro por nombre
-        if query:
-            sql_query += " AND assets.name LIKE ?"
-            parameters.append(f"%{query}%")
+    @staticmethod
+    def _folder_name(asset: Dict, used: Dict[str, int]) -> str:
+        name = _safe_name(asset['name'])
+        if name in used or name == BatchExportService.SHARED_FOLDER:
+            name = f"{name}_{asset['id']}"
+        used[name] = asset['id']
+        return name
 
-        # Filtro por tipo
-        if asset_type:
-            sql_query += " AND assets.type = ?"
-            parameters.append(asset_type)
+def _plan_batch_export(config: Config, assets: List[Dict], pack_orm: bool, progress) -> tuple:
+    """planner de los jobs de exportacion por lotes: corre en el hilo del job con su propia conexion.
 
-        # Filtro por entorno
-        if environment:
-            sql_query += " AND assets.environment = ?"
-            parameters.append(environment)
+    Devuelve (ficheros, extra_members con manifest.json, specs derivadas, hashes ya conocidos).
+    """
+    db = Database(config)
+    try:
+        batch = BatchExportService(db)
+        members, manifest = batch.plan(assets, progress)
+        # la ORM de cada asset se empaqueta en el pool de procesos del job, todas en paralelo
+        derived = batch.orm_specs(assets, manifest) if pack_orm else []
+        digests = batch.hashes.cached_digests([path for path, _ in members])
+    finally:
+        db.close()
+    extra_members = {'manifest.json': json.dumps(manifest, indent=4).encode('utf-8')}
+    return members, extra_members, derived, digests
 
-        # Filtro por etiquetas
-        if tags:
-            sql_query += " AND tags.name IN ({})".format(",".join("?" for _ in tags))
-            parameters.extend(tags)
+FICLONE = 0x40049409  # ioctl de Linux para reflinks (Btrfs, XFS, bcachefs...)
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+DEVICE_CONCURRENCY = 4
 
-        # Ejecutar consulta
-        cursor = self.conn.execute(sql_query, parameters)
-        assets = [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
-        return assets
+def _reflink(source_fd: int, destination_fd: int) -> bool:
+    """Intenta compartir los bloques del original en vez de copiarlos; False si el FS no sabe."""
+    if fcntl is None or not hasattr(fcntl, 'ioctl'):
+        return False
+    try:
+        fcntl.ioctl(destination_fd, FICLONE, source_fd)
+        return True
+    except OSError:
+        return False
+
+def _copy_file_fast(source: str, destination: str, cancelled: threading.Event, progress=None):
+    """Copia source en destination dentro del kernel cuando se puede.
+
+    Orden: reflink (FICLONE), copy_file_range, sendfile y, si nada de eso existe (Windows,
+    macOS), shutil.copyfileobj. Se escribe a un .part y se renombra al terminar.
+    """
+    temporary = destination + '.part'
+    os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+    size = os.path.getsize(source)
+    try:
+        with open(source, 'rb') as src, open(temporary, 'wb') as dst:
+            if not _reflink(src.fileno(), dst.fileno()):
+                copied = 0
+                for method in ('copy_file_range', 'sendfile', None):
+                    if method and not hasattr(os, method):
+                        continue
+                    try:
+                        while copied < size:
+                            if cancelled.is_set():
+                                raise ExportCancelled()
+                            count = min(COPY_CHUNK_SIZE, size - copied)
+                            if method == 'copy_file_range':
+                                sent = os.copy_file_range(src.fileno(), dst.fileno(), count, copied, copied)
+                            elif method == 'sendfile':
+                                sent = os.sendfile(dst.fileno(), src.fileno(), copied, count)
+                            else:
+                                src.seek(copied)
+                                dst.seek(copied)
+                                chunk = src.read(count)
+                                dst.write(chunk)
+                                sent = len(chunk)
+                            if not sent:
+                                break
+                            copied += sent
+                            if progress:
+                                progress(sent)
+                        break
+                    except OSError as error:
+                        # EXDEV, EINVAL, ENOSYS...: este metodo no vale aqui, se prueba el siguiente
+                        if method is None or copied:
+                            raise error
+                if copied != size:
+                    raise OSError(f"{source} ha cambiado durante la copia")
+            elif progress:
+                progress(size)
+        shutil.copystat(source, temporary)
+        os.replace(temporary, destination)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+class FolderExportJob:
+    """Como ExportJob pero copiando a una carpeta, con la misma interfaz para ExportProgressWindow.
+
+    Las copias van en un pool de hilos pero con un maximo de DEVICE_CONCURRENCY a la vez por
+    disco (origen y destino), para no hundir un HDD o un share con accesos cruzados. Los ficheros
+    que ya estan en destino con el mismo tamaño y hash no se vuelven a copiar; los demas se copian
+    sin hashear antes y el hash para checksums.json sale de la copia.
+    """
+
+    def __init__(self, files: List[tuple], destination: str, max_workers: Optional[int] = None,
+                 digests: Optional[Dict[str, str]] = None, extra_members: Optional[Dict[str, bytes]] = None,
+                 derived: Optional[List[tuple]] = None, planner=None):
+        self.planner = planner  # como en ExportJob
+        self.plan_progress = 0.0
+        self.requested_files = files
+        self.files = list(files)  # [(ruta, ruta relativa en destino)]
+        self.derived = derived or []
+        self.destination = destination
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self.digests = digests or {}
+        self.extra_members = extra_members or {}
+        self.new_hashes = []
+        self.skipped = 0
+        self.total = sum(os.path.getsize(path) for path, _ in files if os.path.isfile(path))
+        self.written = 0
+        self.cancelled = threading.Event()
+        self.done = False
+        self.error = None
+        self.lock = threading.Lock()
+        self.devices = {}
+        self.journal_path = os.path.join(destination, FOLDER_JOURNAL)
+        self.committed = {}
+        self.checksums = {}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def resumed(self) -> 'FolderExportJob':
+        return FolderExportJob(self.requested_files, self.destination, self.max_workers, self.digests,
+                               self.extra_members, self.derived, self.planner)
+
+    @property
+    def progress(self) -> float:
+        if self.planner is not None:
+            return self.plan_progress
+        return self.written / self.total if self.total else (1.0 if self.done else 0.0)
+
+    def _set_plan_progress(self, fraction: float):
+        if self.cancelled.is_set():
+            raise ExportCancelled()
+        self.plan_progress = fraction
+
+    def _plan(self):
+        if self.planner is None:
+            return
+        files, self.extra_members, self.derived, self.digests = self.planner(self._set_plan_progress)
+        self.requested_files = files
+        self.total = sum(os.path.getsize(path) for path, _ in files if os.path.isfile(path))
+        self.planner = None
+
+    def _advance(self, size: int):
+        with self.lock:
+            self.written += size
+
+    @property
+    def outputs(self) -> List[str]:
+        """Ficheros que el job escribe (o deja a medias) en disco."""
+        relatives = [relative for _, relative in self.files] + list(self.extra_members)
+        return [os.path.join(self.destination, relative) for relative in relatives + [FOLDER_CHECKSUMS, FOLDER_JOURNAL]]
+
+    def _record(self, relative: str, target: str, digest: str, source: Optional[List[int]] = None):
+        """Apunta en el diario un fichero ya en su sitio, con el tamaño/mtime del original y del destino."""
+        st = os.stat(target)
+        entry = {'name': relative.replace(os.sep, '/'), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                 'digest': digest, 'source': source}
+        with self.lock:
+            self.checksums[entry['name']] = {'name': entry['name'], 'size': entry['size'], 'blake2b': digest}
+            self.journal.write(json.dumps(entry) + '\n')
+            self.journal.flush()
+
+    def _device_semaphores(self, *paths: str) -> List[threading.Semaphore]:
+        """Semaforos de los discos implicados, siempre en el mismo orden para no bloquearse entre hilos."""
+        devices = sorted({os.stat(path).st_dev for path in paths})
+        with self.lock:
+            return [self.devices.setdefault(device, threading.Semaphore(DEVICE_CONCURRENCY)) for device in devices]
+
+    def _source_digest(self, path: str, copy: Optional[str] = None) -> str:
+        """Hash del original; con copy se lee la copia recien escrita (que suele seguir en la cache
+        de paginas) en vez de volver a leer el original. Solo se cachea si el original no ha cambiado."""
+        digest = self.digests.get(path)
+        if digest is None:
+            st = os.stat(path)
+            digest = _hash_file(copy or path)
+            if _source_stat(path) == [st.st_size, st.st_mtime_ns]:
+                with self.lock:
+                    self.new_hashes.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def _copy(self, source: str, relative: str):
+        if self.cancelled.is_set():
+            raise ExportCancelled()
+        target = os.path.join(self.destination, relative)
+        size = os.path.getsize(source)
+        # Ya copiado en un intento anterior y sin tocar desde entonces: ni se lee
+        entry = self.committed.get(relative.replace(os.sep, '/'))
+        try:
+            st = os.stat(target)
+            if entry and (st.st_size, st.st_mtime_ns) == (entry['size'], entry['mtime_ns']) \
+                    and entry.get('source') == _source_stat(source):
+                with self.lock:
+                    self.skipped += 1
+                    self.checksums[entry['name']] = {'name': entry['name'], 'size': entry['size'],
+                                                     'blake2b': entry['digest']}
+                self._advance(size)
+                return
+        except OSError:
+            pass
+        semaphores = self._device_semaphores(source, self.destination)
+        for semaphore in semaphores:
+            semaphore.acquire()
+        try:
+            stat = _source_stat(source)
+            # Solo si ya hay algo del mismo tamaño en destino hace falta el hash antes de copiar
+            digest = None
+            if os.path.isfile(target) and os.path.getsize(target) == size:
+                digest = self._source_digest(source)
+            if digest and _hash_file(target) == digest:
+                with self.lock:
+                    self.skipped += 1
+                self._advance(size)
+            else:
+                _copy_file_fast(source, target, self.cancelled, self._advance)
+                digest = digest or self._source_digest(source, copy=target)
+            self._record(relative, target, digest, stat)
+        finally:
+            for semaphore in reversed(semaphores):
+                semaphore.release()
+
+    def _run(self):
+        try:
+            self._plan()
+            derived = _derive_textures(self.derived, self.cancelled)
+            self.files = list(self.requested_files) + derived
+            self.total += sum(os.path.getsize(path) for path, _ in derived)
+            os.makedirs(self.destination, exist_ok=True)
+            signature = _export_signature(self.files, sorted(self.extra_members))
+            self.committed = {entry['name']: entry for entry in _read_journal(self.journal_path, signature)}
+            with open(self.journal_path, 'w', encoding='utf-8') as self.journal:
+                self.journal.write(json.dumps({'signature': signature}) + '\n')
+                for entry in self.committed.values():
+                    self.journal.write(json.dumps(entry) + '\n')
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    futures = [pool.submit(self._copy, path, relative) for path, relative in self.files]
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                    except Exception:
+                        self.cancelled.set()
+                        raise
+                for relative, data in self.extra_members.items():
+                    target = os.path.join(self.destination, relative)
+                    with open(target, 'wb') as f:
+                        f.write(data)
+                    self._record(relative, target, hashlib.blake2b(data, digest_size=32).hexdigest())
+            _write_checksums(os.path.join(self.destination, FOLDER_CHECKSUMS), sorted(self.checksums.values(), key=lambda entry: entry['name']))
+            os.remove(self.journal_path)
+        except ExportCancelled:
+            pass
+        except Exception as error:
+            # el diario se queda en la carpeta: resumed() se salta lo que ya esta copiado
+            self.error = error
+        finally:
+            self.done = True
+
+def verify_export(path: str, max_workers: Optional[int] = None, cancelled: Optional[threading.Event] = None,
+                  progress=None) -> List[tuple]:
+    """Comprueba un ZIP o una carpeta exportados contra su fichero de checksums.
+
+    Devuelve [(nombre, problema)]; vacia si todo cuadra. Los miembros se hashean en paralelo;
+    con ZIP cada hilo abre su propio ZipFile, y zipfile ademas comprueba el CRC al leer.
+    """
+    folder = os.path.isdir(path)
+    with open(os.path.join(path, FOLDER_CHECKSUMS) if folder else path + '.checksums.json', encoding='utf-8') as f:
+        entries = json.load(f)['files']
+    local = threading.local()
+    archives = []
+    archives_lock = threading.Lock()
+
+    def open_member(name: str):
+        if folder:
+            return open(os.path.join(path, name), 'rb')
+        if not hasattr(local, 'archive'):
+            local.archive = zipfile.ZipFile(path)
+            with archives_lock:
+                archives.append(local.archive)
+        return local.archive.open(name)
+
+    def check(entry: Dict) -> Optional[tuple]:
+        if cancelled is not None and cancelled.is_set():
+            raise ExportCancelled()
+        digest = hashlib.blake2b(digest_size=32)
+        size = 0
+        try:
+            with open_member(entry['name']) as f:
+                while True:
+                    chunk = f.read(EXPORT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if progress:
+                        progress(len(chunk))
+        except (OSError, KeyError, zipfile.BadZipFile) as error:
+            return entry['name'], str(error)
+        if size != entry['size']:
+            return entry['name'], f"tamaño {size}, se esperaba {entry['size']}"
+        if digest.hexdigest() != entry['blake2b']:
+            return entry['name'], "el hash no coincide"
+        return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) * 2)) as pool:
+            return [problem for problem in pool.map(check, entries) if problem]
+    finally:
+        for archive in archives:
+            archive.close()
+
+class VerifyJob:
+    """verify_export() en segundo plano, con la interfaz de ExportJob para ExportProgressWindow."""
+
+    def __init__(self, path: str):
+        self.destination = path
+        self.problems = []
+        self.new_hashes = []
+        self.total = 0
+        self.written = 0
+        self.cancelled = threading.Event()
+        self.done = False
+        self.error = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    @property
+    def progress(self) -> float:
+        return self.written / self.total if self.total else (1.0 if self.done else 0.0)
+
+    def _advance(self, size: int):
+        with self.lock:
+            self.written += size
+
+    def _run(self):
+        try:
+            checksums = os.path.join(self.destination, FOLDER_CHECKSUMS) if os.path.isdir(self.destination) \
+                else self.destination + '.checksums.json'
+            with open(checksums, encoding='utf-8') as f:
+                self.total = sum(entry['size'] for entry in json.load(f)['files'])
+            self.problems = verify_export(self.destination, cancelled=self.cancelled, progress=self._advance)
+        except ExportCancelled:
+            pass
+        except Exception as error:
+            self.error = error
+        finally:
+            self.done = True
 
 class FolderTree(ctk.CTkFrame):
-    def __init__(self, master, db: Database, on_folder_select=None):
+    def __init__(self, master, db: Database, on_folder_select=None, get_selected_assets=None):
         super().__init__(master)
         
         self.db = db
         self.on_folder_select = on_folder_select
+        self.get_selected_assets = get_selected_assets
+        self.drag_item = None
         
         # Folder Tree
         self.tree = ttk.Treeview(self, show="tree")
         self.tree.pack(expand=True, fill="both")
+        self.tree.bind("<<TreeviewSelect>>", self.folder_selected)
+        # arrastrar una carpeta sobre otra la mueve dentro; soltarla en vacio la lleva a la raiz
+        self.tree.bind("<ButtonPress-1>", lambda event: setattr(self, 'drag_item', self.tree.identify_row(event.y)))
+        self.tree.bind("<ButtonRelease-1>", self.drop_folder)
         
         # Add Folder Button
         self.add_button = ctk.CTkButton(
@@ -247,6 +5071,16 @@ class FolderTree(ctk.CTkFrame):
             hover_color=self.db.config.get_color('hover_secondary')
         )
         self.add_button.pack(pady=5)
+
+        # Mete en la carpeta elegida los assets seleccionados (Ctrl+clic en las tarjetas)
+        self.add_assets_button = ctk.CTkButton(
+            self,
+            text="+ Add Selected Assets",
+            command=self.add_selected_assets,
+            fg_color=self.db.config.get_color('secondary_button'),
+            hover_color=self.db.config.get_color('hover_secondary')
+        )
+        self.add_assets_button.pack(pady=5)
         
         self.load_folders()
         
@@ -255,13 +5089,51 @@ class FolderTree(ctk.CTkFrame):
         
         # Load folders from database
         folders = self.db.get_folders()
-        for folder in folders:
+        counts = self.db.get_folder_asset_counts()
+        # los padres antes que los hijos, si no Treeview no encuentra donde colgarlos
+        depth = {}
+        by_id = {folder['id']: folder for folder in folders}
+        def folder_depth(folder_id):
+            if folder_id not in depth:
+                parent = by_id[folder_id]['parent_id']
+                depth[folder_id] = 0 if parent not in by_id else folder_depth(parent) + 1
+            return depth[folder_id]
+        for folder in sorted(folders, key=lambda folder: folder_depth(folder['id'])):
+            total = counts.get(folder['id'], (0, 0))[1]
             self.tree.insert(
                 folder['parent_id'] or '',
                 'end',
                 folder['id'],
-                text=folder['name']
+                text=f"{folder['name']} ({total})" if total else folder['name'],
+                open=True
             )
+
+    def folder_selected(self, event=None):
+        selected = self.tree.selection()
+        if selected and self.on_folder_select:
+            self.on_folder_select(int(selected[0]))
+
+    def drop_folder(self, event):
+        source, target = self.drag_item, self.tree.identify_row(event.y)
+        self.drag_item = None
+        if not source or source == target or (target and self.tree.parent(source) == target):
+            return
+        if not target and not self.tree.parent(source):
+            return
+        try:
+            self.db.move_folder(int(source), int(target) if target else None)
+        except ValueError:
+            return
+        self.load_folders()
+
+    def add_selected_assets(self):
+        selected = self.tree.selection()
+        if not selected or not self.get_selected_assets:
+            return
+        for asset in self.get_selected_assets():
+            self.db.add_asset_to_folder(asset['id'], int(selected[0]))
+        self.load_folders()
+        self.tree.selection_set(selected[0])
             
     def add_folder(self):
         dialog = ctk.CTkInputDialog(
@@ -304,6 +5176,9 @@ class ConfigWindow(ctk.CTkToplevel):
         
         self.resources_path_var = tk.StringVar(value=self.config.get_path('resources'))
         self.create_path_entry(paths_frame, "Resources Folder:", self.resources_path_var)
+
+        self.cache_path_var = tk.StringVar(value=self.config.get_path('cache_folder'))
+        self.create_path_entry(paths_frame, "Cache Folder:", self.cache_path_var)
         
         colors_frame = RoundedFrame(self)
         colors_frame.pack(fill="x", padx=10, pady=5)
@@ -383,7 +5258,8 @@ class ConfigWindow(ctk.CTkToplevel):
         self.config.config['Paths'] = {
             'database': self.db_path_var.get(),
             'assets_folder': self.assets_path_var.get(),
-            'resources': self.resources_path_var.get()
+            'resources': self.resources_path_var.get(),
+            'cache_folder': self.cache_path_var.get()
         }
         
         self.config.config['Colors'] = {
@@ -397,11 +5273,13 @@ class ConfigWindow(ctk.CTkToplevel):
         self.destroy()
 
 class AssetCard(RoundedFrame):
-    def __init__(self, master, asset_data: Dict, on_click=None, **kwargs):
+    def __init__(self, master, asset_data: Dict, on_click=None, thumbnails: Optional[ThumbnailPool] = None,
+                 on_select=None, selected: bool = False, **kwargs):
         super().__init__(master, **kwargs)
         
         self.asset_data = asset_data
         self.on_click = on_click
+        self.on_select = on_select
         
         # Load image
         try:
@@ -415,6 +5293,18 @@ class AssetCard(RoundedFrame):
         except:
             self.image_label = ctk.CTkLabel(self, text="No Image")
             self.image_label.pack(pady=5)
+            # Sin preview.png: miniatura de la cache, o se genera en segundo plano
+            if thumbnails:
+                source = _thumbnail_source(asset_data)
+                if source:
+                    cached = thumbnails.request_file(source, self.set_image)
+                else:
+                    # Materiales y texturas sin modelo: preview compuesta a partir de los mapas PBR
+                    maps = _asset_material_maps(asset_data)
+                    swatch = asset_data['type'] == 'Texture'
+                    cached = thumbnails.request_material(maps, self.set_image, swatch) if maps else None
+                if cached:
+                    self.set_image(cached)
         
         # Asset information
         self.name_label = ctk.CTkLabel(self, text=asset_data['name'])
@@ -424,15 +5314,307 @@ class AssetCard(RoundedFrame):
         self.type_label.pack()
         
         self.bind('<Button-1>', lambda e: self._on_click())
+        self.bind('<Control-Button-1>', lambda e: self._on_select())
+        self.set_selected(selected)
         
+    def set_image(self, path: str):
+        if not self.winfo_exists():
+            return
+        try:
+            image = Image.open(path)
+            image.thumbnail((150, 150))
+            photo = ImageTk.PhotoImage(image)
+        except (OSError, ValueError):
+            return
+        self.image_label.configure(image=photo, text="")
+        self.image_label.image = photo
+
     def _on_click(self):
         if self.on_click:
             self.on_click(self.asset_data)
 
+    def _on_select(self):
+        if self.on_select:
+            self.set_selected(self.on_select(self.asset_data))
+        return "break"
+
+    def set_selected(self, selected: bool):
+        self.configure(border_width=2 if selected else 0, border_color="#3B8ED0")
+
+def _finish_export(db: Database, job):
+    """on_finish de las exportaciones: guarda los hashes calculados y, si el destino cae dentro
+    de algun asset, actualiza su tamaño."""
+    db.save_file_hashes(job.new_hashes)
+    SizeService(db).files_changed(job.outputs)
+
+class ExportProgressWindow(ctk.CTkToplevel):
+    """Barra de progreso de un ExportJob con boton de cancelar."""
+
+    POLL_MS = 100
+
+    def __init__(self, master, job: ExportJob, on_finish=None):
+        super().__init__(master)
+        
+        self.job = job
+        self.on_finish = on_finish
+        self.title("Exporting")
+        self.geometry("400x130")
+        self.resizable(False, False)
+        
+        self.label = ctk.CTkLabel(self, text=os.path.basename(job.destination))
+        self.label.pack(pady=(10, 5))
+        
+        self.progress_bar = ctk.CTkProgressBar(self)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(fill="x", padx=20, pady=5)
+        
+        buttons = ctk.CTkFrame(self, fg_color="transparent")
+        buttons.pack(pady=10)
+        # Retry tras un fallo, Verify tras terminar bien
+        self.action_button = ctk.CTkButton(buttons, text="", width=100)
+        self.cancel_button = ctk.CTkButton(buttons, text="Cancel", width=100, command=self.job.cancel)
+        self.cancel_button.pack(side="right", padx=5)
+        
+        self.protocol("WM_DELETE_WINDOW", self.job.cancel)
+        self.after(self.POLL_MS, self._poll)
+
+    def _run_job(self, job):
+        self.job = job
+        self.job.start()
+        self.progress_bar.set(0)
+        self.action_button.pack_forget()
+        self.cancel_button.configure(text="Cancel", command=self.job.cancel)
+        self.protocol("WM_DELETE_WINDOW", self.job.cancel)
+        self.after(self.POLL_MS, self._poll)
+
+    def retry(self):
+        self.label.configure(text=f"Resuming {os.path.basename(self.job.destination)}")
+        self._run_job(self.job.resumed())
+
+    def verify(self):
+        self.label.configure(text=f"Verifying {os.path.basename(self.job.destination)}")
+        self._run_job(VerifyJob(self.job.destination))
+
+    def _poll(self):
+        self.progress_bar.set(self.job.progress)
+        if not self.job.done:
+            if getattr(self.job, 'planner', None) is not None:
+                self.label.configure(text=f"Planning {os.path.basename(self.job.destination)}")
+            elif self.label.cget("text").startswith("Planning "):
+                self.label.configure(text=os.path.basename(self.job.destination))
+            self.after(self.POLL_MS, self._poll)
+            return
+        if self.on_finish and not isinstance(self.job, VerifyJob):
+            self.on_finish(self.job)
+        self.cancel_button.configure(text="Close", command=self.destroy)
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+        if self.job.cancelled.is_set() and not self.job.error:
+            self.destroy()
+        elif self.job.error:
+            self.label.configure(text=f"Failed: {self.job.error}")
+            if not isinstance(self.job, VerifyJob):
+                self.action_button.configure(text="Retry", command=self.retry)
+                self.action_button.pack(side="left", padx=5)
+        elif isinstance(self.job, VerifyJob):
+            problems = self.job.problems
+            self.label.configure(text=f"{len(problems)} problems, first: {problems[0][0]}" if problems
+                                 else "Verified: all files match their checksums")
+        else:
+            self.label.configure(text="Export complete")
+            self.action_button.configure(text="Verify", command=self.verify)
+            self.action_button.pack(side="left", padx=5)
+
+class TextureViewer(ctk.CTkToplevel):
+    """Visor con zoom de texturas grandes a partir de la piramide de tiles cacheada.
+
+    La piramide se construye en un proceso aparte; el visor solo lee (en hilos) los tiles que
+    se ven con el zoom actual y guarda los ultimos TILE_CACHE_SIZE leidos y otros tantos ya
+    escalados, asi la memoria no depende del tamaño de la textura.
+    """
+
+    POLL_MS = 100
+    TILE_CACHE_SIZE = 192
+    ZOOM_STEP = 1.25
+    MAX_ZOOM = 8.0
+
+    def __init__(self, master, db: Database, path: str):
+        super().__init__(master)
+
+        self.path = path
+        self.title(os.path.basename(path))
+        self.geometry("900x700")
+        try:
+            st = os.stat(path)
+            with Image.open(path) as image:
+                # solo la cabecera: el tamaño sin decodificar nada
+                self.image_size = image.size
+        except OSError as error:
+            ctk.CTkLabel(self, text=f"Cannot read texture: {error}").pack(expand=True)
+            return
+        self.levels = _pyramid_levels(*self.image_size)
+        # la piramide va por contenido si el hash ya esta en cache; si no, por ruta, tamaño y mtime,
+        # porque hashear aqui una textura de 8K congelaria la UI antes de abrir la ventana
+        digest = HashService(db).cached_digests([path]).get(path)
+        if digest is None:
+            key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+            digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        self.folder = str(Path(db.config.get_path('cache_folder')) / 'tiles' / digest)
+        self.complete_levels = set()
+
+        self.tiles = OrderedDict()  # (nivel, x, y, ancho, alto) -> PhotoImage
+        self.sources = OrderedDict()  # (nivel, x, y) -> Image del tile tal cual
+        self.pending = {}
+        self.loader = ThreadPoolExecutor(max_workers=4)
+        self.builder = ProcessPoolExecutor(max_workers=1)
+        self.build = self.builder.submit(_build_tile_pyramid, path, self.folder)
+
+        self.canvas = tk.Canvas(self, background="#1a1a1a", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True)
+        self.status = ctk.CTkLabel(self, text="Building tiles...")
+        self.status.pack(fill="x")
+
+        self.scale = None  # pixeles de pantalla por pixel de la textura
+        self.origin = (0.0, 0.0)  # pixel de la textura en la esquina superior izquierda
+        self.drag_start = None
+        self.canvas.bind("<Configure>", lambda event: self.render())
+        self.canvas.bind("<ButtonPress-1>", self.start_drag)
+        self.canvas.bind("<B1-Motion>", self.drag)
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(event, event.delta > 0))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(event, True))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(event, False))
+        self.canvas.bind("<Double-Button-1>", lambda event: self.fit())
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.after(self.POLL_MS, self._poll)
+
+    def fit(self):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        self.scale = min(width / self.image_size[0], height / self.image_size[1])
+        self.origin = ((self.image_size[0] - width / self.scale) / 2, (self.image_size[1] - height / self.scale) / 2)
+        self.render()
+
+    def start_drag(self, event):
+        self.drag_start = (event.x, event.y, self.origin)
+
+    def drag(self, event):
+        x, y, (origin_x, origin_y) = self.drag_start
+        self.origin = (origin_x - (event.x - x) / self.scale, origin_y - (event.y - y) / self.scale)
+        self.render()
+
+    def zoom(self, event, zoom_in: bool):
+        if self.scale is None:
+            return
+        fit = min(self.canvas.winfo_width() / self.image_size[0], self.canvas.winfo_height() / self.image_size[1])
+        scale = self.scale * (self.ZOOM_STEP if zoom_in else 1 / self.ZOOM_STEP)
+        scale = min(max(scale, fit / 2), self.MAX_ZOOM)
+        # el pixel bajo el raton se queda donde esta
+        x, y = self.origin[0] + event.x / self.scale, self.origin[1] + event.y / self.scale
+        self.origin = (x - event.x / scale, y - event.y / scale)
+        self.scale = scale
+        self.render()
+
+    def _level_for_scale(self) -> int:
+        """Nivel cuyo tamaño se acerca mas al de pantalla sin quedarse corto; si no esta, el siguiente que si.
+
+        La piramide se hace del original hacia arriba, asi que mientras tanto vale tambien el nivel
+        de justo debajo (cuatro veces mas tiles, no mas).
+        """
+        wanted = min(len(self.levels) - 1, max(0, int(np.floor(np.log2(1 / self.scale)))))
+        ready = [level for level in self.complete_levels if level >= wanted]
+        if ready:
+            return min(ready)
+        return wanted - 1 if wanted - 1 in self.complete_levels else None
+
+    def render(self):
+        if self.scale is None:
+            if self.canvas.winfo_width() > 1:
+                self.fit()
+            return
+        self.canvas.delete("tile")
+        level = self._level_for_scale()
+        if level is None:
+            return
+        factor = 2 ** level
+        level_width, level_height = self.levels[level]
+        # tiles del nivel que caen en la ventana
+        tile = TILE_SIZE * factor
+        left, top = self.origin
+        right = left + self.canvas.winfo_width() / self.scale
+        bottom = top + self.canvas.winfo_height() / self.scale
+        columns = range(max(0, int(left // tile)), min(-(-level_width // TILE_SIZE), int(right // tile) + 1))
+        rows = range(max(0, int(top // tile)), min(-(-level_height // TILE_SIZE), int(bottom // tile) + 1))
+        for row in rows:
+            for column in columns:
+                # bordes redondeados a pixel de pantalla para que no queden rendijas entre tiles
+                x0 = round((column * tile - left) * self.scale)
+                y0 = round((row * tile - top) * self.scale)
+                x1 = round((min(level_width, (column + 1) * TILE_SIZE) * factor - left) * self.scale)
+                y1 = round((min(level_height, (row + 1) * TILE_SIZE) * factor - top) * self.scale)
+                photo = self._tile(level, column, row, max(1, x1 - x0), max(1, y1 - y0))
+                if photo is not None:
+                    self.canvas.create_image(x0, y0, image=photo, anchor="nw", tags="tile")
+        self.status.configure(text=f"{self.image_size[0]}x{self.image_size[1]}  "
+                                   f"{self.scale * 100:.0f}%  level {level}"
+                                   + ("" if self.build.done() else "  (building tiles...)"))
+
+    def _tile(self, level: int, column: int, row: int, width: int, height: int):
+        key = (level, column, row, width, height)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+        source = self.sources.get((level, column, row))
+        if source is None:
+            if (level, column, row) not in self.pending:
+                path = os.path.join(self.folder, str(level), f"{column}_{row}.png")
+                self.pending[(level, column, row)] = self.loader.submit(self._read_tile, path)
+            return None
+        self.sources.move_to_end((level, column, row))
+        photo = ImageTk.PhotoImage(source.resize((width, height), Image.BILINEAR if width < source.width * 2
+                                                 else Image.NEAREST))
+        self.tiles[key] = photo
+        if len(self.tiles) > self.TILE_CACHE_SIZE:
+            self.tiles.popitem(last=False)
+        return photo
+
+    @staticmethod
+    def _read_tile(path: str) -> Image.Image:
+        with Image.open(path) as image:
+            image.load()
+            return image.copy()
+
+    def _poll(self):
+        if not self.winfo_exists():
+            return
+        redraw = False
+        if len(self.complete_levels) < len(self.levels):
+            complete = {level for level in range(len(self.levels))
+                        if os.path.exists(os.path.join(self.folder, str(level), TILE_LEVEL_DONE))}
+            redraw = complete != self.complete_levels
+            self.complete_levels = complete
+        if self.build.done() and self.build.exception() is not None:
+            self.status.configure(text=f"Cannot read texture: {self.build.exception()}")
+        for key, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[key]
+                if future.exception() is None:
+                    self.sources[key] = future.result()
+                    if len(self.sources) > self.TILE_CACHE_SIZE:
+                        self.sources.popitem(last=False)
+                    redraw = True
+        if redraw:
+            self.render()
+        self.after(self.POLL_MS, self._poll)
+
+    def close(self):
+        self.loader.shutdown(wait=False, cancel_futures=True)
+        # la piramide se deja acabar: la proxima vez se abre al instante
+        self.builder.shutdown(wait=False)
+        self.destroy()
+
 class AssetConfigWindow(ctk.CTkToplevel):
-    def __init__(self, master, asset_data: Dict):
+    def __init__(self, master, db: Database, asset_data: Dict):
         super().__init__(master)
         
+        self.db = db
         self.title("Asset Configuration")
         self.geometry("400x600")
         self.resizable(False, False)
@@ -451,35 +5633,91 @@ class AssetConfigWindow(ctk.CTkToplevel):
         
         ctk.CTkLabel(texture_frame, text="Texture Resolution").pack()
         
-        resolutions = ["2K", "4K", "8K"]
+        # Solo las variantes que hay en el manifiesto; los assets de antes del manifiesto se indexan aqui
+        if not self.db.get_asset_file_stats(asset_data['id']):
+            ManifestService(self.db).index_assets([asset_data])
+        resolutions, lod_levels = self.db.get_asset_variants(asset_data['id'])
+        if resolutions:
+            # las menores que la mayor existente se pueden generar al exportar
+            largest = _resolution_label_size(resolutions[-1])
+            resolutions = [label for label in RESOLUTION_RANGES
+                           if label in resolutions or _resolution_label_size(label) < largest]
+        resolutions = resolutions or ["All"]
         self.resolution_var = ctk.StringVar(value=resolutions[0])
         resolution_combo = ctk.CTkComboBox(
             texture_frame,
             values=resolutions,
-            variable=self.resolution_var
+            variable=self.resolution_var,
+            state="readonly" if resolutions != ["All"] else "disabled"
         )
         resolution_combo.pack(pady=5)
+
+        # Ver una textura con zoom sin salir de la app
+        images = [row['rel_path'] for row in self.db.get_asset_files(asset_data['id'])
+                  if row['rel_path'].lower().endswith(IMAGE_EXTENSIONS)]
+        view_row = ctk.CTkFrame(texture_frame, fg_color="transparent")
+        view_row.pack(pady=5)
+        self.view_texture_var = ctk.StringVar(value=images[0] if images else "")
+        ctk.CTkComboBox(
+            view_row,
+            values=images or [""],
+            variable=self.view_texture_var,
+            state="readonly" if images else "disabled"
+        ).pack(side="left", padx=5)
+        ctk.CTkButton(
+            view_row,
+            text="View",
+            width=60,
+            state="normal" if images else "disabled",
+            command=lambda: self.view_texture(asset_data)
+        ).pack(side="left", padx=5)
         
         lod_frame = RoundedFrame(self)
         lod_frame.pack(fill="x", padx=10, pady=5)
         
         ctk.CTkLabel(lod_frame, text="LOD Level").pack()
         
-        lods = ["LOD0", "LOD1", "LOD2"]
+        lods = [f"LOD{level}" for level in lod_levels] or ["All"]
         self.lod_var = ctk.StringVar(value=lods[0])
-        lod_combo = ctk.CTkComboBox(
+        self.lod_combo = ctk.CTkComboBox(
             lod_frame,
             values=lods,
-            variable=self.lod_var
+            variable=self.lod_var,
+            state="readonly" if lods != ["All"] else "disabled"
+        )
+        self.lod_combo.pack(pady=5)
+
+        self.generate_lods_button = ctk.CTkButton(
+            lod_frame,
+            text="Generate LODs",
+            command=lambda: self.generate_lods(asset_data)
         )
-        lod_combo.pack(pady=5)
+        self.generate_lods_button.pack(pady=(0, 5))
+
+        # AO / Roughness / Metalness en una sola textura, como la quieren Unreal y compañia
+        self.pack_orm_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(self, text="Pack ORM texture", variable=self.pack_orm_var).pack(pady=(10, 0))
         
         export_button = ctk.CTkButton(
             self,
             text="Export Asset",
             command=lambda: self.export_asset(asset_data)
         )
-        export_button.pack(pady=20)
+        export_button.pack(pady=(20, 5))
+
+        export_folder_button = ctk.CTkButton(
+            self,
+            text="Export to Folder",
+            command=lambda: self.export_asset_to_folder(asset_data)
+        )
+        export_folder_button.pack(pady=(5, 20))
+
+        similar_button = ctk.CTkButton(
+            self,
+            text="Find Similar",
+            command=lambda: self.find_similar(asset_data)
+        )
+        similar_button.pack(pady=5)
         
         close_button = ctk.CTkButton(
             self,
@@ -488,6 +5726,65 @@ class AssetConfigWindow(ctk.CTkToplevel):
         )
         close_button.pack(pady=5)
         
+    def find_similar(self, asset_data: Dict):
+        self.master.show_similar_assets(asset_data)
+        self.destroy()
+
+    def view_texture(self, asset_data: Dict):
+        path = os.path.join(asset_data['path'], self.view_texture_var.get())
+        if os.path.isfile(path):
+            TextureViewer(self.master, self.db, path)
+
+    def generate_lods(self, asset_data: Dict):
+        if LodService(self.db).source_mesh(asset_data) is None:
+            self.generate_lods_button.configure(text="No OBJ mesh found")
+            return
+        self.generate_lods_button.configure(state="disabled", text="Generating...")
+        # se sondea desde la ventana principal: esta se puede cerrar antes de que acabe
+        LodService(self.db).run(self.master, [asset_data], on_done=lambda written: self.on_lods_generated(asset_data))
+
+    def on_lods_generated(self, asset_data: Dict):
+        if not self.winfo_exists():
+            return
+        _, lod_levels = self.db.get_asset_variants(asset_data['id'])
+        lods = [f"LOD{level}" for level in lod_levels] or ["All"]
+        self.lod_combo.configure(values=lods, state="readonly" if lods != ["All"] else "disabled")
+        self.lod_var.set(lods[0])
+        self.generate_lods_button.configure(state="normal", text="Generate LODs")
+
+    def selected_members(self, asset_data: Dict) -> tuple:
+        """([(ruta, ruta relativa)], specs de texturas derivadas) para la variante y opciones elegidas."""
+        resolution = self.resolution_var.get()
+        lod = self.lod_var.get()
+        rows = self.db.get_asset_files(asset_data['id'], lod=None if lod == "All" else int(lod[3:]))
+        exact, derived = _plan_resolution(rows, None if resolution == "All" else resolution)
+        base_path = asset_data['path']
+        members = [
+            (os.path.join(base_path, rel_path), rel_path) for rel_path in exact
+            if os.path.isfile(os.path.join(base_path, rel_path))
+        ]
+        slots = {row['rel_path']: row['slot'] for row in rows}
+        sources = [os.path.join(base_path, source) for source, _ in derived]
+        digests = HashService(self.db).cached_digests(sources)
+        folder = str(Path(self.db.config.get_path('cache_folder')) / 'derived')
+        specs = [
+            (_derive_texture, (path, digests.get(path), _resolution_label_size(resolution), folder,
+                               slots.get(source) == "Color/Albedo"
+                               or (slots.get(source) is None and _is_colour_texture(source)),
+                               slots.get(source) == "Normal"), target)
+            for path, (source, target) in zip(sources, derived) if os.path.isfile(path)
+        ]
+        if self.pack_orm_var.get():
+            # la ORM sale de los mismos mapas que se exportan y a la resolucion elegida
+            planned = members + [(path, target) for path, (_, target) in zip(sources, derived)]
+            slot_paths = {os.path.join(base_path, rel_path): slot for rel_path, slot in slots.items()}
+            digests.update(HashService(self.db).cached_digests([path for path, _ in members]))
+            spec = _orm_spec(planned, slot_paths, digests, folder, f"{_safe_name(asset_data['name'])}_ORM.png",
+                             None if resolution == "All" else _resolution_label_size(resolution))
+            if spec:
+                specs.append(spec)
+        return members, specs
+
     def export_asset(self, asset_data: Dict):
         export_path = filedialog.asksaveasfilename(
             defaultextension=".zip",
@@ -495,24 +5792,32 @@ class AssetConfigWindow(ctk.CTkToplevel):
         )
         
         if export_path:
-            with zipfile.ZipFile(export_path, 'w') as zf:
-                base_path = asset_data['path']
-                resolution = self.resolution_var.get()
-                lod = self.lod_var.get()
-                
-                for root, _, files in os.walk(base_path):
-                    for file in files:
-                        if resolution in file or lod in file:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, base_path)
-                            zf.write(file_path, arcname)
+            members, derived = self.selected_members(asset_data)
+            # Solo hashes ya conocidos; los que falten se calculan al comprimir y se guardan al acabar
+            db = self.db
+            digests = HashService(db).cached_digests([path for path, _ in members])
+            job = ExportJob(members, export_path, cache=MemberCache(db.config), digests=digests, derived=derived)
+            job.start()
+            ExportProgressWindow(self.master, job, on_finish=lambda job: _finish_export(db, job))
+
+    def export_asset_to_folder(self, asset_data: Dict):
+        export_path = filedialog.askdirectory()
+        if export_path:
+            members, derived = self.selected_members(asset_data)
+            db = self.db
+            digests = HashService(db).cached_digests([path for path, _ in members])
+            job = FolderExportJob(members, export_path, digests=digests, derived=derived)
+            job.start()
+            ExportProgressWindow(self.master, job, on_finish=lambda job: _finish_export(db, job))
 
 class AddAssetWindow(ctk.CTkToplevel):
-    def __init__(self, master, db: Database, on_asset_added=None):
+    def __init__(self, master, db: Database, on_asset_added=None, executor=None):
         super().__init__(master)
         
         self.db = db
         self.on_asset_added = on_asset_added
+        # pool de procesos para clasificar texturas (el de las miniaturas de la ventana principal)
+        self.executor = executor
         
         self.title("Add New Asset")
         self.geometry("600x800")
@@ -569,10 +5874,10 @@ class AddAssetWindow(ctk.CTkToplevel):
         )
         env_combo.pack(pady=5)
         
-        tags_frame = self.create_section("Tags")
+        self.tags_frame = self.create_section("Tags")
         self.tags_var = tk.StringVar()
         tags_entry = ctk.CTkEntry(
-            tags_frame,
+            self.tags_frame,
             textvariable=self.tags_var,
             placeholder_text="Enter tags separated by commas (e.g., furniture, wood, modern)"
         )
@@ -588,6 +5893,19 @@ class AddAssetWindow(ctk.CTkToplevel):
             placeholder_text="Path to .fbx, .obj or other 3D model file"
         )
         model_entry.pack(fill="x", padx=5)
+
+        model_browse_button = ctk.CTkButton(
+            self.model_frame,
+            text="Browse",
+            width=70,
+            command=self.browse_model,
+            fg_color=self.db.config.get_color('secondary_button'),
+            hover_color=self.db.config.get_color('hover_secondary')
+        )
+        model_browse_button.pack(pady=2)
+
+        self.model_stats_label = ctk.CTkLabel(self.model_frame, text="")
+        self.model_stats_label.pack()
         
         lod_label = ctk.CTkLabel(self.model_frame, text="LOD Levels")
         lod_label.pack(pady=(10,5))
@@ -603,17 +5921,13 @@ class AddAssetWindow(ctk.CTkToplevel):
             lod_entry.pack(fill="x", padx=5, pady=2)
             self.lod_vars.append(lod_var)
         
-        textures_frame = self.create_section("Textures")
+        self.textures_frame = self.create_section("Textures")
         
         self.texture_entries = {}
-        texture_types = [
-            "Color/Albedo", "Normal", "Roughness", "Specular", 
-            "Displacement", "Metalness", "Ambient Occlusion",
-            "Anisotropy", "Opacity", "Opacity Mask"
-        ]
+        self.texture_confidence_labels = {}
         
-        for tex_type in texture_types:
-            tex_frame = ctk.CTkFrame(textures_frame)
+        for tex_type in TEXTURE_SLOTS:
+            tex_frame = ctk.CTkFrame(self.textures_frame)
             tex_frame.pack(fill="x", pady=2)
             
             ctk.CTkLabel(tex_frame, text=tex_type).pack(side="left", padx=5)
@@ -633,9 +5947,22 @@ class AddAssetWindow(ctk.CTkToplevel):
                 hover_color=self.db.config.get_color('hover_secondary')
             )
             browse_btn.pack(side="right", padx=5)
+
+            confidence_label = ctk.CTkLabel(tex_frame, text="", width=40)
+            confidence_label.pack(side="right")
+            self.texture_confidence_labels[tex_type] = confidence_label
+
+        self.detect_button = ctk.CTkButton(
+            self.textures_frame,
+            text="Auto-detect",
+            command=self.detect_textures,
+            fg_color=self.db.config.get_color('secondary_button'),
+            hover_color=self.db.config.get_color('hover_secondary')
+        )
+        self.detect_button.pack(pady=(10, 0))
         
         add_texture_btn = ctk.CTkButton(
-            textures_frame,
+            self.textures_frame,
             text="+ Add Texture Type",
             command=self.add_texture_type,
             fg_color=self.db.config.get_color('secondary_button'),
@@ -661,6 +5988,95 @@ class AddAssetWindow(ctk.CTkToplevel):
         
         return frame
 
+    def browse_path(self):
+        path = filedialog.askdirectory()
+        if path:
+            self.path_var.set(path)
+
+    def browse_model(self):
+        path = filedialog.askopenfilename(
+            filetypes=[("3D models", "*.obj *.stl *.glb *.gltf *.fbx *.blend"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        self.model_path_var.set(path)
+        try:
+            stats = _read_mesh_stats(path)
+        except (OSError, ValueError, KeyError, IndexError, struct.error):
+            self.model_stats_label.configure(text="")
+            return
+        self.model_stats_label.configure(
+            text=f"{stats['triangles']:,} tris · {stats['vertices']:,} verts · {stats['materials']} materials"
+        )
+
+    def save_asset(self):
+        if not self.path_var.get():
+            return
+        asset_path = os.path.abspath(self.path_var.get())
+        sizes = SizeService(self.db)
+
+        asset_data = {
+            'name': self.name_var.get(),
+            'path': asset_path,
+            'type': self.type_var.get(),
+            'environment': self.env_var.get(),
+            'image_path': os.path.join(asset_path, "preview.png"),
+            'size': sizes.folder_size(asset_path)
+        }
+        asset_id = self.db.add_asset(asset_data)
+
+        tags = [tag.strip() for tag in self.tags_var.get().split(',') if tag.strip()]
+        self.db.add_tags(asset_id, tags)
+
+        json_data = {
+            **asset_data,
+            'tags': tags,
+            'model_path': self.model_path_var.get(),
+            'lods': [lod_var.get() for lod_var in self.lod_vars],
+            'textures': {tex_type: var.get() for tex_type, var in self.texture_entries.items() if var.get()}
+        }
+        json_path = os.path.join(asset_path, "asset_info.json")
+        with open(json_path, 'w') as f:
+            json.dump(json_data, f, indent=4)
+        # el json acaba dentro de la carpeta, asi que el total del asset cambia
+        sizes.file_changed(json_path)
+        saved_asset = {**asset_data, 'id': asset_id}
+        PerceptualHashService(self.db).index_assets([saved_asset])
+        ColourPaletteService(self.db).index_assets([saved_asset])
+        TextureMetadataService(self.db).index_assets([saved_asset])
+        MeshStatsService(self.db).index_assets([saved_asset])
+        ManifestService(self.db).index_assets([saved_asset])
+
+        if self.on_asset_added:
+            self.on_asset_added()
+
+        self.destroy()
+
+    def detect_textures(self):
+        """Rellena los huecos vacios con las texturas detectadas en la carpeta del asset."""
+        if not self.path_var.get() or not os.path.isdir(self.path_var.get()):
+            return
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor()
+        self.detect_button.configure(state="disabled", text="Detecting...")
+        # se sondea desde la ventana principal: el dialogo se puede cerrar antes de que acabe
+        TextureSlotClassifier().classify_folder_async(self.master, self.executor, self.path_var.get(),
+                                                      self.on_textures_detected, self.on_detect_failed)
+
+    def on_detect_failed(self, error: Exception):
+        if not self.winfo_exists():
+            return
+        self.detect_button.configure(state="normal", text="Auto-detect")
+
+    def on_textures_detected(self, detected: Dict[str, tuple]):
+        if not self.winfo_exists():
+            return
+        self.detect_button.configure(state="normal", text="Auto-detect")
+        for tex_type, (path, confidence) in detected.items():
+            if tex_type in self.texture_entries and not self.texture_entries[tex_type].get():
+                self.texture_entries[tex_type].set(path)
+                self.texture_confidence_labels[tex_type].configure(text=f"{confidence:.0%}")
+
     def on_type_change(self, _):
         if self.type_var.get() == "Model":
             self.model_frame.pack(after=self.tags_frame)
@@ -701,12 +6117,34 @@ class AddAssetWindow(ctk.CTkToplevel):
             )
             browse_btn.pack(side="right", padx=5)
 
+def _index_library(config: Config):
+    """Pone al dia tamaños e indices de toda la biblioteca con una conexion propia, para correr fuera del hilo de Tk."""
+    db = Database(config)
+    try:
+        SizeService(db).refresh_assets()
+        PerceptualHashService(db).index_assets()
+        ColourPaletteService(db).index_assets()
+        TextureMetadataService(db).index_assets()
+        MeshStatsService(db).index_assets()
+        ManifestService(db).index_assets()
+    finally:
+        db.close()
+
 class MainWindow(ctk.CTk):
+    INDEX_POLL_MS = 200
+
     def __init__(self):
         super().__init__()
         
         self.config = Config()
         self.db = Database(self.config)
+        self.similarity = PerceptualHashService(self.db)
+        self.colours = ColourPaletteService(self.db)
+        self.thumbnails = ThumbnailPool(self, ThumbnailCache(self.config), HashService(self.db),
+                                        meshes=MeshCache(self.config))
+        self.selected_assets = {}
+        self.displayed_assets = []
+        self.indexing = None
         
         self.title("VaultXplorer")
         self.geometry("1280x720")
@@ -772,11 +6210,15 @@ class MainWindow(ctk.CTk):
             btn.pack(pady=5, padx=10, fill="x")
         
         # Folder tree (initially hidden)
-        self.folder_tree = FolderTree(sidebar, self.db)
+        self.folder_tree = FolderTree(
+            sidebar, self.db,
+            on_folder_select=lambda folder_id: self.display_assets(self.db.get_assets_in_folder(folder_id)),
+            get_selected_assets=lambda: list(self.selected_assets.values())
+        )
         self.folder_tree.pack_forget()
         
         # Settings and Reload buttons
-        reload_button = ctk.CTkButton(
+        self.reload_button = ctk.CTkButton(
             sidebar,
             text="Reload Database",
             image=self.icons['reload'],
@@ -784,7 +6226,7 @@ class MainWindow(ctk.CTk):
             fg_color=self.config.get_color('secondary_button'),
             hover_color=self.config.get_color('hover_secondary')
         )
-        reload_button.pack(pady=5, padx=10, side="bottom", fill="x")
+        self.reload_button.pack(pady=5, padx=10, side="bottom", fill="x")
         
         settings_button = ctk.CTkButton(
             sidebar,
@@ -849,6 +6291,39 @@ class MainWindow(ctk.CTk):
             width=120
         )
         env_combo.pack(side="left", padx=5)
+
+        # ComboBox resolucion de textura
+        self.resolution_var = tk.StringVar(value="All")
+        resolution_combo = ctk.CTkComboBox(
+            search_frame,
+            values=["All"] + list(RESOLUTION_RANGES),
+            variable=self.resolution_var,
+            command=self.update_assets,
+            width=90
+        )
+        resolution_combo.pack(side="left", padx=5)
+
+        # Filtro por color (hex o nombre de color de Tk)
+        self.colour_var = tk.StringVar()
+        self.colour_var.trace_add("write", lambda *args: self.update_assets())
+        colour_entry = ctk.CTkEntry(
+            search_frame,
+            textvariable=self.colour_var,
+            placeholder_text="Colour (#hex)",
+            width=120
+        )
+        colour_entry.pack(side="left", padx=5)
+
+        # Filtro por poligonos
+        self.max_tris_var = tk.StringVar()
+        self.max_tris_var.trace_add("write", lambda *args: self.update_assets())
+        max_tris_entry = ctk.CTkEntry(
+            search_frame,
+            textvariable=self.max_tris_var,
+            placeholder_text="Max tris",
+            width=90
+        )
+        max_tris_entry.pack(side="left", padx=5)
         
         # Cuadro de busqueda
         search_button = ctk.CTkButton(
@@ -861,6 +6336,41 @@ class MainWindow(ctk.CTk):
             hover_color=self.config.get_color('hover_button')
         )
         search_button.pack(side="left", padx=5)
+
+        # Exportar la seleccion (Ctrl+clic en las tarjetas) o, si no hay, lo que se esta viendo
+        export_button = ctk.CTkButton(
+            search_frame,
+            text="Export",
+            width=60,
+            command=self.export_batch,
+            fg_color=self.config.get_color('secondary_button'),
+            hover_color=self.config.get_color('hover_secondary')
+        )
+        export_button.pack(side="left", padx=5)
+
+        export_folder_button = ctk.CTkButton(
+            search_frame,
+            text="To Folder",
+            width=70,
+            command=lambda: self.export_batch(to_folder=True),
+            fg_color=self.config.get_color('secondary_button'),
+            hover_color=self.config.get_color('hover_secondary')
+        )
+        export_folder_button.pack(side="left", padx=5)
+
+        self.pack_orm_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(search_frame, text="ORM", width=60, variable=self.pack_orm_var).pack(side="left", padx=5)
+
+        # LOD1/LOD2 para la seleccion (o lo que se ve), segun [LOD] ratios del config.ini
+        lods_button = ctk.CTkButton(
+            search_frame,
+            text="LODs",
+            width=50,
+            command=self.generate_lods,
+            fg_color=self.config.get_color('secondary_button'),
+            hover_color=self.config.get_color('hover_secondary')
+        )
+        lods_button.pack(side="left", padx=5)
         
         # Tags Frame
         self.tags_frame = RoundedFrame(main_frame)
@@ -876,7 +6386,30 @@ class MainWindow(ctk.CTk):
         self.update_assets()
     
     def reload_database(self):
-        self.db = Database(self.config)
+        """Reabre la base de datos si ha cambiado de ruta y reindexa la biblioteca en un hilo aparte."""
+        if self.indexing is not None and not self.indexing.done():
+            return
+        if self.config.get_path('database') != self.db.path:
+            self.db.close()
+            self.db = Database(self.config)
+            self.thumbnails.hashes = HashService(self.db)
+            self.folder_tree.db = self.db
+            self.folder_tree.load_folders()
+        self.reload_button.configure(state="disabled", text="Indexing...")
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.indexing = executor.submit(_index_library, self.config)
+        executor.shutdown(wait=False)
+        self.after(self.INDEX_POLL_MS, self._poll_indexing)
+
+    def _poll_indexing(self):
+        if not self.indexing.done():
+            self.after(self.INDEX_POLL_MS, self._poll_indexing)
+            return
+        failed = self.indexing.exception() is not None
+        self.reload_button.configure(state="normal", text="Reload failed, retry" if failed else "Reload Database")
+        # los indices de similitud y color se reconstruyen con lo recien indexado
+        self.similarity = PerceptualHashService(self.db)
+        self.colours = ColourPaletteService(self.db)
         self.update_assets()
         self.update_tags()
         
@@ -925,15 +6458,43 @@ class MainWindow(ctk.CTk):
         self.update_assets()
         
     def update_assets(self, *args):
-        for widget in self.assets_canvas.winfo_children():
-            widget.destroy()
-        
         assets = self.db.search_assets(
             query=self.search_var.get(),
             asset_type=self.type_var.get() if self.type_var.get() != "All" else None,
             environment=self.env_var.get() if self.env_var.get() != "All" else None,
-            tags=list(self.selected_tags) if self.selected_tags else None
+            tags=list(self.selected_tags) if self.selected_tags else None,
+            resolution=self.resolution_var.get() if self.resolution_var.get() != "All" else None,
+            max_triangles=int(self.max_tris_var.get()) if self.max_tris_var.get().isdigit() else None
         )
+        colour = self.parse_colour(self.colour_var.get())
+        if colour:
+            by_id = {asset['id']: asset for asset in assets}
+            assets = [by_id[asset_id] for asset_id, _ in self.colours.rank_assets(colour) if asset_id in by_id]
+        self.display_assets(assets)
+
+    def parse_colour(self, value: str) -> Optional[tuple]:
+        """Convierte '#rrggbb', '#rgb' o un nombre de color de Tk a (r, g, b)."""
+        value = value.strip()
+        if not value:
+            return None
+        if re.fullmatch(r'#?[0-9a-fA-F]{6}', value):
+            value = value.lstrip('#')
+            return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+        if re.fullmatch(r'#?[0-9a-fA-F]{3}', value):
+            return tuple(int(c * 2, 16) for c in value.lstrip('#'))
+        try:
+            return tuple(channel >> 8 for channel in self.winfo_rgb(value))
+        except tk.TclError:
+            return None
+
+    def show_similar_assets(self, asset_data: Dict):
+        results = self.similarity.similar_assets(asset_data['id'])
+        self.display_assets(self.db.get_assets_by_ids([asset_id for asset_id, _, _ in results]))
+
+    def display_assets(self, assets: List[Dict]):
+        for widget in self.assets_canvas.winfo_children():
+            widget.destroy()
+        self.displayed_assets = assets
         
         row = 0
         col = 0
@@ -943,7 +6504,10 @@ class MainWindow(ctk.CTk):
             card = AssetCard(
                 self.assets_canvas,
                 asset_data=asset,
-                on_click=self.show_asset_config
+                on_click=self.show_asset_config,
+                thumbnails=self.thumbnails,
+                on_select=self.toggle_selection,
+                selected=asset['id'] in self.selected_assets
             )
             card.grid(row=row, column=col, padx=5, pady=5)
             
@@ -952,14 +6516,57 @@ class MainWindow(ctk.CTk):
                 col = 0
                 row += 1
     
+    def toggle_selection(self, asset_data: Dict) -> bool:
+        if asset_data['id'] in self.selected_assets:
+            del self.selected_assets[asset_data['id']]
+            return False
+        self.selected_assets[asset_data['id']] = asset_data
+        return True
+
+    def export_batch(self, to_folder: bool = False):
+        assets = list(self.selected_assets.values()) or self.displayed_assets
+        if not assets:
+            return
+        if to_folder:
+            export_path = filedialog.askdirectory()
+        else:
+            export_path = filedialog.asksaveasfilename(
+                defaultextension=".zip",
+                filetypes=[("ZIP files", "*.zip")]
+            )
+        if not export_path:
+            return
+        db = self.db
+        config = self.config
+        pack_orm = self.pack_orm_var.get()
+        # manifiestos y hashes de deduplicacion se sacan en el hilo del job, con la barra de progreso ya visible
+        planner = lambda progress: _plan_batch_export(config, assets, pack_orm, progress)
+        if to_folder:
+            job = FolderExportJob([], export_path, planner=planner)
+        else:
+            job = ExportJob([], export_path, cache=MemberCache(self.config), planner=planner)
+        job.start()
+        ExportProgressWindow(self, job, on_finish=lambda job: _finish_export(db, job))
+
+    def generate_lods(self):
+        assets = list(self.selected_assets.values()) or self.displayed_assets
+        if assets:
+            LodService(self.db).run(self, assets)
+
     def show_recent_assets(self):
         pass
     
     def show_add_asset_window(self):
-        AddAssetWindow(self, self.db, self.update_assets)
+        AddAssetWindow(self, self.db, self.on_asset_added, self.thumbnails.executor)
+
+    def on_asset_added(self):
+        # los indices de similitud y color se reconstruyen en la proxima busqueda
+        self.similarity = PerceptualHashService(self.db)
+        self.colours = ColourPaletteService(self.db)
+        self.update_assets()
     
     def show_asset_config(self, asset_data: Dict):
-        AssetConfigWindow(self, asset_data)
+        AssetConfigWindow(self, self.db, asset_data)
 
 def main():
     app = MainWindow()
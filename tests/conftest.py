@@ -0,0 +1,5 @@
+import os
+import sys
+
+# los tests importan VaultXplorer3 directamente desde la raiz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
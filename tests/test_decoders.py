@@ -0,0 +1,324 @@
+import gzip
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import VaultXplorer3 as vx
+
+
+def _blend_block(header, code, payload):
+    """Bloque de .blend con la cabecera que toca segun la version del fichero."""
+    endian = '>' if header[-4:-3] == b'V' else '<'
+    if header[7:9].isdigit():
+        return struct.pack(endian + '4siQqq', code, 0, 0, len(payload), 1) + payload
+    pointer = 'Q' if header[7:8] == b'-' else 'I'
+    return struct.pack(endian + '4si' + pointer + 'ii', code, len(payload), 0, 0, 1) + payload
+
+
+def _write_blend(path, header, thumbnail=None, compress=False):
+    endian = '>' if header[-4:-3] == b'V' else '<'
+    data = header + _blend_block(header, b'REND', bytes(72))
+    if thumbnail is not None:
+        width, height = thumbnail.size
+        # Blender guarda las filas de abajo a arriba
+        pixels = thumbnail.transpose(Image.FLIP_TOP_BOTTOM).tobytes()
+        data += _blend_block(header, b'TEST', struct.pack(endian + 'ii', width, height) + pixels)
+    data += _blend_block(header, b'ENDB', b'')
+    path.write_bytes(gzip.compress(data) if compress else data)
+
+
+def _thumbnail():
+    values = np.arange(24 * 17 * 4, dtype=np.uint32).reshape(17, 24, 4) * 7 % 256
+    return Image.fromarray(values.astype(np.uint8), 'RGBA')
+
+
+@pytest.mark.parametrize('header', [b'BLENDER-v280', b'BLENDER_v279', b'BLENDER-V280', b'BLENDER17-01v0500'],
+                         ids=['64_bits', '32_bits', 'big_endian', 'blender_5'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_blend_thumbnail(tmp_path, header, compress):
+    path = tmp_path / 'scene.blend'
+    _write_blend(path, header, _thumbnail(), compress)
+    thumbnail = vx._read_blend_thumbnail(str(path))
+    assert thumbnail.mode == 'RGBA'
+    assert np.array_equal(np.asarray(thumbnail), np.asarray(_thumbnail()))
+
+
+def test_blend_without_thumbnail_raises(tmp_path):
+    path = tmp_path / 'scene.blend'
+    _write_blend(path, b'BLENDER-v280')
+    with pytest.raises(ValueError):
+        vx._read_blend_thumbnail(str(path))
+    path.write_bytes(b'PK\x03\x04 no es un blend')
+    with pytest.raises(ValueError):
+        vx._read_blend_thumbnail(str(path))
+
+
+HALF, FLOAT = 1, 2
+EXR_DTYPES = {HALF: '<f2', FLOAT: '<f4'}
+
+
+def _exr_attribute(name, kind, data):
+    return name.encode() + b'\0' + kind.encode() + b'\0' + struct.pack('<i', len(data)) + data
+
+
+def _exr_predict(raw):
+    """Lo contrario de _exr_unpredict: bytes pares e impares por separado y diferencias + 128."""
+    data = np.frombuffer(raw, dtype=np.uint8)
+    split = np.concatenate([data[0::2], data[1::2]]).astype(np.int64)
+    split[1:] = (np.diff(split) + 128) & 255
+    return split.astype(np.uint8).tobytes()
+
+
+def _exr_rle(data):
+    out = bytearray()
+    position = 0
+    while position < len(data):
+        run = 1
+        while position + run < len(data) and run < 128 and data[position + run] == data[position]:
+            run += 1
+        if run < 3:
+            # literales hasta que empiece un tramo de 3 iguales
+            run = 1
+            while position + run < len(data) and run < 127 and \
+                    data[position + run:position + run + 3] != bytes([data[position + run]]) * 3:
+                run += 1
+            out += bytes([256 - run]) + data[position:position + run]
+        else:
+            out += bytes([run - 1, data[position]])
+        position += run
+    return bytes(out)
+
+
+def _exr_compress(raw, compression):
+    if compression == 0:
+        return raw
+    packed = _exr_rle(_exr_predict(raw)) if compression == 1 else zlib.compress(_exr_predict(raw))
+    # como en OpenEXR: si comprimido no gana, el bloque va tal cual
+    return packed if len(packed) < len(raw) else raw
+
+
+def _exr_block(planes, channels, rows, columns):
+    return b''.join(planes[name][y, columns].astype(EXR_DTYPES[kind]).tobytes()
+                    for y in rows for name, kind in channels)
+
+
+def _write_exr(path, planes, pixel_type, compression, tile=None):
+    """EXR de una parte, por lineas o por tiles con mipmaps (redondeando hacia abajo)."""
+    channels = sorted((name, pixel_type) for name in planes)
+    height, width = planes[channels[0][0]].shape
+    window = struct.pack('<4i', 0, 0, width - 1, height - 1)
+    header = (_exr_attribute('channels', 'chlist', b''.join(
+                  name.encode() + b'\0' + struct.pack('<iB3xii', kind, 0, 1, 1) for name, kind in channels) + b'\0')
+              + _exr_attribute('compression', 'compression', bytes([compression]))
+              + _exr_attribute('dataWindow', 'box2i', window)
+              + _exr_attribute('displayWindow', 'box2i', window)
+              + _exr_attribute('lineOrder', 'lineOrder', b'\0')
+              + _exr_attribute('pixelAspectRatio', 'float', struct.pack('<f', 1))
+              + _exr_attribute('screenWindowCenter', 'v2f', struct.pack('<2f', 0, 0))
+              + _exr_attribute('screenWindowWidth', 'float', struct.pack('<f', 1)))
+    if tile:
+        header += _exr_attribute('tiles', 'tiledesc', struct.pack('<IIB', tile, tile, 1))
+    head = b'\x76\x2f\x31\x01' + struct.pack('<I', 2 | (0x200 if tile else 0)) + header + b'\0'
+    chunks = []
+    if not tile:
+        lines = vx.EXR_BLOCK_LINES[compression]
+        for y in range(0, height, lines):
+            data = _exr_compress(_exr_block(planes, channels, range(y, min(height, y + lines)), slice(None)), compression)
+            chunks.append(struct.pack('<ii', y, len(data)) + data)
+    else:
+        level = planes
+        for index in range(max(width, height).bit_length()):
+            level_height, level_width = level[channels[0][0]].shape
+            for y in range(0, level_height, tile):
+                for x in range(0, level_width, tile):
+                    data = _exr_compress(_exr_block(level, channels, range(y, min(level_height, y + tile)),
+                                                    slice(x, x + tile)), compression)
+                    chunks.append(struct.pack('<5i', x // tile, y // tile, index, index, len(data)) + data)
+            level = {name: plane[::2, ::2][:max(1, level_height // 2), :max(1, level_width // 2)]
+                     for name, plane in level.items()}
+    offsets = []
+    position = len(head) + 8 * len(chunks)
+    for chunk in chunks:
+        offsets.append(position)
+        position += len(chunk)
+    path.write_bytes(head + struct.pack(f'<{len(offsets)}Q', *offsets) + b''.join(chunks))
+
+
+def _exr_planes(height=90, width=131):
+    y, x = np.mgrid[0:height, 0:width]
+    return {
+        'R': (x / width * 4).astype(np.float32),
+        'G': (y / height).astype(np.float32),
+        'B': np.where((x // 20 + y // 20) % 2, 0.0, 2.5).astype(np.float32),
+    }
+
+
+@pytest.mark.parametrize('compression', [0, 1, 2, 3])
+@pytest.mark.parametrize('pixel_type', [HALF, FLOAT])
+def test_exr_scanlines(tmp_path, compression, pixel_type):
+    planes = _exr_planes()
+    path = tmp_path / 'lines.exr'
+    _write_exr(path, planes, pixel_type, compression)
+    expected = np.stack([planes[name] for name in 'RGB'], axis=-1).astype(EXR_DTYPES[pixel_type])
+
+    assert np.array_equal(vx._read_exr_pixels(str(path), max_size=1000), expected)
+    # reducido: solo se decodifican las lineas que se quedan
+    assert np.array_equal(vx._read_exr_pixels(str(path), max_size=30), expected[::5, ::5])
+    with open(path, 'rb') as f:
+        header = vx._read_exr_header(f)
+    assert (header['width'], header['height']) == (131, 90)
+
+
+def test_exr_tiled_mipmaps(tmp_path):
+    planes = _exr_planes()
+    path = tmp_path / 'tiled.exr'
+    _write_exr(path, planes, HALF, 3, tile=32)
+    expected = np.stack([planes[name] for name in 'RGB'], axis=-1).astype(np.float16)
+
+    assert np.array_equal(vx._read_exr_pixels(str(path), max_size=1000), expected)
+    # el nivel mas pequeño con un lado de al menos max_size: 131x90 -> 65x45 -> 32x22
+    assert np.array_equal(vx._read_exr_pixels(str(path), max_size=65), expected[::2, ::2][:45, :65])
+    level = vx._read_exr_pixels(str(path), max_size=32)
+    assert np.array_equal(level, expected[::4, ::4][:22, :32])
+
+
+def test_exr_single_channel_is_grey(tmp_path):
+    luminance = _exr_planes()['G']
+    path = tmp_path / 'luminance.exr'
+    _write_exr(path, {'Y': luminance}, FLOAT, 3)
+    pixels = vx._read_exr_pixels(str(path), max_size=1000)
+    assert pixels.shape == luminance.shape + (3,)
+    assert all(np.array_equal(pixels[..., channel], luminance) for channel in range(3))
+
+
+def _to_rgbe(rgb):
+    peak = rgb.max(axis=-1)
+    exponent = np.where(peak > 1e-32, np.ceil(np.log2(np.maximum(peak, 1e-32))), -128).astype(np.int64)
+    mantissa = np.floor(rgb / np.ldexp(1.0, exponent)[..., None] * 256)
+    mantissa = np.where(peak[..., None] > 1e-32, mantissa, 0).clip(0, 255)
+    return np.concatenate([mantissa, (exponent + 128).clip(0, 255)[..., None]], axis=-1).astype(np.uint8)
+
+
+def _hdr_rle_channel(values):
+    """Un canal de una linea RLE nueva: tramos de repeticion (128 + n) o literales (n)."""
+    out = bytearray()
+    position = 0
+    while position < len(values):
+        run = 1
+        while position + run < len(values) and run < 127 and values[position + run] == values[position]:
+            run += 1
+        if run >= 4:
+            out += bytes([128 + run, values[position]])
+        else:
+            run = min(128, len(values) - position)
+            for end in range(position + 1, position + run):
+                if values[end:end + 4] == bytes([values[end]]) * 4:
+                    run = end - position
+                    break
+            out += bytes([run]) + values[position:position + run]
+        position += run
+    return bytes(out)
+
+
+def _write_hdr(path, rgbe, rle=True, orientation=b'-Y'):
+    height, width = rgbe.shape[:2]
+    out = bytearray(b'#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n' + orientation + b' %d +X %d\n' % (height, width))
+    for row in (rgbe if orientation == b'-Y' else rgbe[::-1]):
+        if rle:
+            out += bytes([2, 2, width >> 8, width & 255])
+            out += b''.join(_hdr_rle_channel(row[:, channel].tobytes()) for channel in range(4))
+        else:
+            out += row.tobytes()
+    path.write_bytes(bytes(out))
+
+
+def _from_rgbe(rgbe):
+    scale = np.where(rgbe[..., 3] > 0, np.ldexp(1.0, rgbe[..., 3].astype(np.int64) - 136), 0.0)
+    return (rgbe[..., :3] + 0.5) * scale[..., None]
+
+
+def _hdr_rgbe(height=64, width=150):
+    y, x = np.mgrid[0:height, 0:width]
+    rgb = np.stack([x / width * 10, y / height, np.where(x > 100, 50.0, 0.2)], axis=-1)
+    rgb[:8] = 0.0  # negro: exponente 0
+    return _to_rgbe(rgb)
+
+
+@pytest.mark.parametrize('rle', [True, False])
+@pytest.mark.parametrize('orientation', [b'-Y', b'+Y'])
+def test_hdr_round_trip(tmp_path, rle, orientation):
+    rgbe = _hdr_rgbe()
+    path = tmp_path / 'sky.hdr'
+    _write_hdr(path, rgbe, rle, orientation)
+    expected = _from_rgbe(rgbe)
+
+    assert np.allclose(vx._read_hdr_pixels(str(path), max_size=1000), expected, rtol=1e-6, atol=0)
+    # las lineas que no se quedan solo se recorren
+    assert np.allclose(vx._read_hdr_pixels(str(path), max_size=50), expected[::3, ::3], rtol=1e-6, atol=0)
+
+
+def test_hdr_rejects_xyze(tmp_path):
+    path = tmp_path / 'xyze.hdr'
+    path.write_bytes(b'#?RADIANCE\nFORMAT=32-bit_rle_xyze\n\n-Y 1 +X 1\n\0\0\0\0')
+    with pytest.raises(ValueError):
+        vx._read_hdr_pixels(str(path))
+
+
+def _dds_header(width, height, mips, fourcc=b'', bit_count=0, masks=(0, 0, 0, 0)):
+    # DDPF_FOURCC, o DDPF_RGB | DDPF_ALPHAPIXELS con mascaras
+    pixel_flags = 0x4 if fourcc else 0x41
+    pixel_format = struct.pack('<II4sI4I', 32, pixel_flags, fourcc.ljust(4, b'\0'), bit_count, *masks)
+    return b'DDS ' + struct.pack('<7I44x', 124, 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000, height, width, 0, 0, mips) \
+        + pixel_format + bytes(20)
+
+
+@pytest.mark.parametrize('fourcc, block_bytes', [(b'DXT1', 8), (b'DXT5', 16), (b'ATI1', 8), (b'ATI2', 16)])
+def test_dds_blocks_match_pil(tmp_path, fourcc, block_bytes):
+    # bloques aleatorios: salen todos los modos de paleta (c0 <= c1, a0 <= a1...)
+    width, height = 36, 20
+    rng = np.random.default_rng(block_bytes)
+    blocks = rng.integers(0, 256, (width // 4) * (height // 4) * block_bytes, dtype=np.uint8).tobytes()
+    path = tmp_path / 'blocks.dds'
+    path.write_bytes(_dds_header(width, height, 1, fourcc) + blocks)
+
+    with open(path, 'rb') as f:
+        header = vx._read_dds_header(f)
+    decoded = vx._decode_dds_level(blocks, header, width, height)
+    with Image.open(path) as image:
+        expected = np.asarray(image.convert('RGBA'))
+    if fourcc == b'ATI1':
+        assert np.array_equal(decoded[..., 0], expected[..., 0])
+    elif fourcc == b'ATI2':
+        # Z se reconstruye aparte; X e Y tienen que cuadrar
+        assert np.array_equal(decoded[..., :2], expected[..., :2])
+    else:
+        assert np.array_equal(decoded, expected)
+
+
+def test_dds_uncompressed_masks(tmp_path):
+    rng = np.random.default_rng(5)
+    pixels = rng.integers(0, 256, (9, 7, 4), dtype=np.uint8)
+    path = tmp_path / 'bgra.dds'
+    bgra = pixels[..., [2, 1, 0, 3]].tobytes()
+    path.write_bytes(_dds_header(7, 9, 1, bit_count=32,
+                                 masks=(0x00FF0000, 0x0000FF00, 0x000000FF, 0xFF000000)) + bgra)
+    assert np.array_equal(np.asarray(vx._read_dds_thumbnail(str(path))), pixels)
+
+
+def test_dds_thumbnail_reads_smallest_covering_mip(tmp_path):
+    # BC1 de un color por nivel: 64 -> 32 -> 16 -> 8
+    colours = [0xF800, 0x07E0, 0x001F, 0xFFFF]
+    data = b''
+    for level, colour in enumerate(colours):
+        blocks = max(1, (64 >> level) // 4) ** 2
+        data += struct.pack('<HHI', colour, colour, 0) * blocks
+    path = tmp_path / 'mips.dds'
+    path.write_bytes(_dds_header(64, 64, len(colours), b'DXT1') + data)
+
+    thumbnail = vx._read_dds_thumbnail(str(path), size=16)
+    assert thumbnail.size == (16, 16)
+    assert np.asarray(thumbnail)[0, 0].tolist() == [0, 0, 255, 255]
+    assert vx._read_dds_thumbnail(str(path), size=40).size == (64, 64)
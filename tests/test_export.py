@@ -0,0 +1,398 @@
+import hashlib
+import os
+import struct
+import threading
+import zipfile
+import zlib
+
+import pytest
+
+import VaultXplorer3 as vx
+
+
+def _write_zip(path, files):
+    """ZIP con los miembros de files [(ruta, nombre)] comprimidos por _compress_member."""
+    with open(path, 'wb') as f:
+        writer = vx.ZipStreamWriter(f)
+        _add_members(writer, files)
+        writer.close()
+
+
+def _add_members(writer, files):
+    for source, name in files:
+        member = vx._compress_member(source, 6, threading.Event())
+        payload = member['payload'] or open(source, 'rb')
+        with payload:
+            writer.add(name, member['method'], member['crc'], member['compressed_size'],
+                       member['size'], member['mtime'], payload)
+
+
+def _sample_files(folder):
+    os.makedirs(folder / 'sub')
+    files = {
+        'a.txt': b'hola mundo\n' * 5000,
+        'sub/random.bin': os.urandom(200_000),
+        'empty.bin': b'',
+        'sub/albedo.png': os.urandom(1000),  # .png va siempre sin comprimir
+    }
+    for name, data in files.items():
+        (folder / name).write_bytes(data)
+    return files
+
+
+def test_zip_stream_writer_round_trip(tmp_path):
+    files = _sample_files(tmp_path / 'src')
+    path = tmp_path / 'out.zip'
+    _write_zip(path, [(str(tmp_path / 'src' / name), name) for name in files])
+
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(files)
+        for name, data in files.items():
+            assert archive.read(name) == data
+        methods = {info.filename: info.compress_type for info in archive.infolist()}
+    assert methods['a.txt'] == zipfile.ZIP_DEFLATED
+    # deflate no encoge bytes aleatorios, asi que se guardan tal cual
+    assert methods['sub/random.bin'] == zipfile.ZIP_STORED
+    assert methods['sub/albedo.png'] == zipfile.ZIP_STORED
+
+
+def test_zip64_member_count(tmp_path):
+    # 0xFFFF miembros ya no caben en el registro de fin normal
+    source = tmp_path / 'one.txt'
+    source.write_bytes(b'x')
+    path = tmp_path / 'many.zip'
+    with open(path, 'wb') as f:
+        writer = vx.ZipStreamWriter(f)
+        for index in range(0x10000):
+            with open(source, 'rb') as payload:
+                writer.add(f'm{index}.txt', vx.ZIP_STORED, zlib.crc32(b'x'), 1, 1, 0, payload)
+        writer.close()
+
+    with zipfile.ZipFile(path) as archive:
+        assert len(archive.infolist()) == 0x10000
+        assert archive.read('m65535.txt') == b'x'
+
+
+def _run(job):
+    job.start()
+    job.thread.join()
+    assert job.done
+    return job
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Config y Database trabajan sobre el directorio actual (config.ini, assets.db)
+    monkeypatch.chdir(tmp_path)
+    database = vx.Database(vx.Config())
+    yield database
+    database.conn.close()
+
+
+def test_finish_export_refreshes_asset_size(db, tmp_path):
+    # exportar dentro de la carpeta del propio asset cambia su tamaño
+    files = _sample_files(tmp_path / 'rock')
+    asset_id = db.add_asset({'name': 'rock', 'path': str(tmp_path / 'rock'), 'type': 'Texture',
+                             'environment': 'Any', 'image_path': '', 'size': 0})
+    vx.SizeService(db).refresh_assets()
+    before = sum(len(data) for data in files.values())
+    assert db.get_assets()[0]['size'] == before
+
+    destination = tmp_path / 'rock' / 'exports' / 'rock.zip'
+    destination.parent.mkdir()
+    job = _run(vx.ExportJob([(str(tmp_path / 'rock' / name), name) for name in files], str(destination)))
+    assert job.error is None
+    vx._finish_export(db, job)
+    size = db.get_assets()[0]['size']
+    assert size == before + sum(os.path.getsize(path) for path in job.outputs if os.path.isfile(path))
+    assert vx.SizeService(db).folder_sizes([str(tmp_path / 'rock')])[str(tmp_path / 'rock')] == size
+
+
+def test_cached_digests_never_reads_files(db, tmp_path, monkeypatch):
+    known, unknown = tmp_path / 'known.bin', tmp_path / 'unknown.bin'
+    known.write_bytes(b'hola')
+    unknown.write_bytes(b'adio')
+    hashes = vx.HashService(db)
+    digest = hashes.hash_file(str(known))
+    monkeypatch.setattr(vx, '_hash_file', None)
+    assert hashes.cached_digests([str(known), str(unknown), str(tmp_path / 'missing.bin')]) == {str(known): digest}
+
+
+def test_batch_export_stores_each_digest_once(db, tmp_path):
+    shared, other = os.urandom(3000), os.urandom(3000)
+    files = {
+        'rock': {'albedo.png': shared, 'maps/normal.png': other, 'readme.txt': b'roca'},
+        # misma textura con otro nombre, una copia dentro del propio asset y un readme del mismo tamaño
+        'cliff': {'cliff_albedo.png': shared, 'copy/albedo.png': shared, 'readme.txt': b'roc2'},
+    }
+    for name, contents in files.items():
+        for rel_path, data in contents.items():
+            (tmp_path / name / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / name / rel_path).write_bytes(data)
+        db.add_asset({'name': name, 'path': str(tmp_path / name), 'type': 'Texture', 'environment': 'Any',
+                      'image_path': '', 'size': 0})
+    assets = sorted(db.get_assets(), key=lambda asset: asset['id'])
+    members, manifest = vx.BatchExportService(db).plan(assets)
+
+    destination = str(tmp_path / 'batch.zip')
+    job = _run(vx.ExportJob(members, destination, extra_members={'manifest.json': b'{}'}))
+    assert job.error is None
+    with zipfile.ZipFile(destination) as archive:
+        contents = {name: archive.read(name) for name in archive.namelist() if name != 'manifest.json'}
+    digests = [hashlib.blake2b(data).digest() for data in contents.values()]
+    assert len(digests) == len(set(digests))
+
+    digest = vx._hash_file(str(tmp_path / 'rock' / 'albedo.png'))[:16]
+    by_name = {entry['name']: entry['files'] for entry in manifest['assets']}
+    assert by_name['rock'] == {'albedo.png': f'_shared/{digest}_albedo.png', 'maps/normal.png': 'rock/maps/normal.png',
+                               'readme.txt': 'rock/readme.txt'}
+    assert by_name['cliff'] == {'cliff_albedo.png': f'_shared/{digest}_albedo.png',
+                                'copy/albedo.png': f'_shared/{digest}_albedo.png', 'readme.txt': 'cliff/readme.txt'}
+    assert sorted(contents) == sorted({arcname for names in by_name.values() for arcname in names.values()})
+    assert contents[f'_shared/{digest}_albedo.png'] == shared
+    assert contents['cliff/readme.txt'] == b'roc2'
+    assert manifest['shared_files'] == 1
+
+
+class _NoReflink:
+    """fcntl falso: el FS no sabe hacer reflinks."""
+
+    @staticmethod
+    def ioctl(*args):
+        raise OSError(95, "Operation not supported")
+
+
+def _unsupported(*args):
+    raise OSError(18, "Invalid cross-device link")
+
+
+@pytest.mark.parametrize('broken', [[], ['reflink'], ['reflink', 'copy_file_range'],
+                                    ['reflink', 'copy_file_range', 'sendfile']],
+                         ids=['fastest', 'copy_file_range', 'sendfile', 'userspace'])
+def test_copy_file_fast_falls_back(tmp_path, monkeypatch, broken):
+    # cada metodo que falla deja paso al siguiente; la copia tiene que salir igual
+    if 'reflink' in broken:
+        monkeypatch.setattr(vx, 'fcntl', _NoReflink)
+    for method in broken[1:]:
+        monkeypatch.setattr(vx.os, method, _unsupported, raising=False)
+    data = os.urandom(300_000)
+    source = tmp_path / 'source.bin'
+    source.write_bytes(data)
+    progress = []
+    destination = tmp_path / 'out' / 'copy.bin'
+    vx._copy_file_fast(str(source), str(destination), vx.threading.Event(), progress.append)
+    assert destination.read_bytes() == data
+    assert sum(progress) == len(data)
+    assert os.listdir(tmp_path / 'out') == ['copy.bin']
+
+
+def test_folder_export_skips_identical_files(tmp_path):
+    files = _sample_files(tmp_path / 'src')
+    items = [(str(tmp_path / 'src' / name), name) for name in files]
+    destination = tmp_path / 'out'
+    (destination / 'sub').mkdir(parents=True)
+    # mismo contenido: no se copia; mismo tamaño pero distinto: si
+    (destination / 'a.txt').write_bytes(files['a.txt'])
+    os.utime(destination / 'a.txt', ns=(0, 0))
+    (destination / 'sub' / 'random.bin').write_bytes(bytes(len(files['sub/random.bin'])))
+
+    job = _run(vx.FolderExportJob(items, str(destination), max_workers=2))
+    assert job.error is None
+    assert job.skipped == 1
+    assert os.stat(destination / 'a.txt').st_mtime_ns == 0
+    for name, data in files.items():
+        assert (destination / name).read_bytes() == data
+
+
+def test_zip64_offsets_past_4gib(tmp_path):
+    # el ZIP empieza pasados los 4 GiB de un fichero disperso: los offsets van en el extra ZIP64
+    # y hace falta el registro de fin ZIP64, sin escribir gigas de verdad
+    files = _sample_files(tmp_path / 'src')
+    path = tmp_path / 'big.zip'
+    with open(path, 'wb') as f:
+        f.seek(vx.ZIP64_LIMIT + 100)
+        writer = vx.ZipStreamWriter(f, vx.ZIP64_LIMIT + 100)
+        _add_members(writer, [(str(tmp_path / 'src' / name), name) for name in files])
+        writer.close()
+
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            assert info.header_offset > vx.ZIP64_LIMIT
+            assert archive.read(info.filename) == files[info.filename]
+
+
+def test_export_job_verifies(tmp_path):
+    files = _sample_files(tmp_path / 'src')
+    destination = str(tmp_path / 'out.zip')
+    job = _run(vx.ExportJob([(str(tmp_path / 'src' / name), name) for name in files], destination,
+                            max_workers=2, extra_members={'manifest.json': b'{}'}))
+    assert job.error is None
+    assert not os.path.exists(job.temporary) and not os.path.exists(job.journal_path)
+    with zipfile.ZipFile(destination) as archive:
+        assert archive.read('manifest.json') == b'{}'
+        for name, data in files.items():
+            assert archive.read(name) == data
+    assert vx.verify_export(destination) == []
+
+    # un checksum que no cuadra tiene que salir
+    checksums = destination + '.checksums.json'
+    with open(checksums, encoding='utf-8') as f:
+        text = f.read()
+    digest = hashlib.blake2b(files['a.txt'], digest_size=32).hexdigest()
+    with open(checksums, 'w', encoding='utf-8') as f:
+        f.write(text.replace(digest, '0' * len(digest)))
+    assert vx.verify_export(destination) == [('a.txt', "el hash no coincide")]
+
+
+def test_export_job_resumes_after_failure(tmp_path):
+    files = _sample_files(tmp_path / 'src')
+    items = [(str(tmp_path / 'src' / name), name) for name in files]
+    missing = tmp_path / 'src' / 'late.bin'
+    items.insert(2, (str(missing), 'late.bin'))
+    destination = str(tmp_path / 'out.zip')
+
+    job = vx.ExportJob(items, destination, max_workers=1)
+    job.CHECKPOINT_SECONDS = 0  # cada miembro va al diario en cuanto se escribe
+    _run(job)
+    assert isinstance(job.error, FileNotFoundError)
+    assert os.path.exists(job.temporary) and os.path.exists(job.journal_path)
+
+    missing.write_bytes(b'ya esta')
+    resumed = _run(job.resumed())
+    assert resumed.error is None
+    # los dos miembros de antes del fallo no se vuelven a escribir
+    assert resumed.resumed_members == 2
+    with zipfile.ZipFile(destination) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [name for _, name in items]
+        assert archive.read('late.bin') == b'ya esta'
+    assert vx.verify_export(destination) == []
+
+
+def _rows(*items):
+    return [{'rel_path': rel_path, 'resolution': resolution} for rel_path, resolution in items]
+
+
+def test_plan_resolution_picks_or_derives_variants():
+    rows = _rows(('albedo_2K.png', '2K'), ('albedo_8K.png', '8K'), ('albedo_16K.png', '16K'),
+                 (os.path.join('maps', 'normal_8k.png'), '8K'), ('height_1K.exr', '1K'),
+                 ('mesh.fbx', None), ('readme.txt', None))
+    assert vx._plan_resolution(rows, None) == ([row['rel_path'] for row in rows], [])
+
+    exact, derived = vx._plan_resolution(rows, '2K')
+    assert sorted(exact) == ['albedo_2K.png', 'mesh.fbx', 'readme.txt']
+    # el normal se reduce del 8K y respeta la k minuscula; el height de 1K no se agranda
+    assert derived == [(os.path.join('maps', 'normal_8k.png'), os.path.join('maps', 'normal_2k.png'))]
+
+    exact, derived = vx._plan_resolution(rows, '4K')
+    assert sorted(exact) == ['mesh.fbx', 'readme.txt']
+    assert sorted(derived) == [('albedo_8K.png', 'albedo_4K.png'),
+                               (os.path.join('maps', 'normal_8k.png'), os.path.join('maps', 'normal_4k.png'))]
+
+
+def test_folder_export_hashes_copies_not_sources(tmp_path, monkeypatch):
+    files = _sample_files(tmp_path / 'src')
+    items = [(str(tmp_path / 'src' / name), name) for name in files]
+    destination = tmp_path / 'out'
+    destination.mkdir()
+    (destination / 'a.txt').write_bytes(files['a.txt'])
+    hashed = []
+    hash_file = vx._hash_file
+    monkeypatch.setattr(vx, '_hash_file', lambda path: hashed.append(path) or hash_file(path))
+
+    job = _run(vx.FolderExportJob(items, str(destination), max_workers=2))
+    assert job.error is None and job.skipped == 1
+    # solo a.txt, que ya estaba en destino, necesita el hash del original antes de copiar
+    sources = {path for path, _ in items}
+    assert [path for path in hashed if path in sources] == [str(tmp_path / 'src' / 'a.txt')]
+    assert sorted(os.path.relpath(path, destination) for path in hashed if path not in sources) == \
+        sorted(os.path.normpath(name) for name in files)
+    assert vx.verify_export(str(destination)) == []
+
+
+@pytest.fixture
+def member_cache(tmp_path, monkeypatch):
+    # Config lee config.ini del directorio actual; la cache va a tmp_path/cache
+    monkeypatch.chdir(tmp_path)
+    return vx.MemberCache(vx.Config())
+
+
+def _read_member(member):
+    with member['payload'] as payload:
+        return zlib.decompress(payload.read(member['compressed_size']), -15)
+
+
+def test_member_cache_hit_and_miss(tmp_path, member_cache):
+    source = tmp_path / 'a.txt'
+    source.write_bytes(b'hola mundo\n' * 5000)
+    digest = hashlib.blake2b(source.read_bytes(), digest_size=32).hexdigest()
+    assert member_cache.open(digest, 6) is None
+
+    first = vx._compress_member(str(source), 6, threading.Event(), digest, member_cache)
+    assert _read_member(first) == source.read_bytes()
+    assert os.path.exists(member_cache.path_for(digest, 6))
+    # mismo tamaño y otro contenido: si sale lo de antes es que no ha leido el original
+    source.write_bytes(b'adios mundo' * 5000)
+    second = vx._compress_member(str(source), 6, threading.Event(), digest, member_cache)
+    assert (second['crc'], second['compressed_size']) == (first['crc'], first['compressed_size'])
+    assert _read_member(second) == b'hola mundo\n' * 5000
+    # con otro nivel es otra entrada
+    assert member_cache.open(digest, 9) is None
+
+
+@pytest.mark.parametrize('data', [b'\x08\x00', struct.pack('<BIQQ', 8, 0, 1000, 5000) + b'corto',
+                                  struct.pack('<BIQQ', 3, 0, 0, 0)])
+def test_member_cache_ignores_bad_entries(tmp_path, member_cache, data):
+    source = tmp_path / 'a.txt'
+    source.write_bytes(b'hola mundo\n' * 5000)
+    digest = hashlib.blake2b(source.read_bytes(), digest_size=32).hexdigest()
+    path = member_cache.path_for(digest, 6)
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    assert member_cache.open(digest, 6) is None
+    # se vuelve a comprimir y la entrada buena sustituye a la rota
+    member = vx._compress_member(str(source), 6, threading.Event(), digest, member_cache)
+    assert _read_member(member) == source.read_bytes()
+    assert member_cache.open(digest, 6)[0]['size'] == 55000
+
+
+def test_member_cache_evicts_least_recently_used(tmp_path, member_cache):
+    sources = {}
+    for index, name in enumerate(['viejo', 'usado', 'nuevo']):
+        source = tmp_path / f'{name}.txt'
+        source.write_bytes(os.urandom(1000) * 10)
+        digest = hashlib.blake2b(source.read_bytes(), digest_size=32).hexdigest()
+        vx._compress_member(str(source), 6, threading.Event(), digest, member_cache)['payload'].close()
+        os.utime(member_cache.path_for(digest, 6), (1000 + index, 1000 + index))
+        sources[name] = digest
+    # leer 'usado' lo pone el mas reciente
+    member_cache.open(sources['usado'], 6)[1].close()
+    member_cache.limit = sum(os.path.getsize(member_cache.path_for(sources[name], 6)) for name in ('usado', 'nuevo'))
+    member_cache.evict()
+
+    assert not os.path.exists(member_cache.path_for(sources['viejo'], 6))
+    assert os.path.exists(member_cache.path_for(sources['usado'], 6))
+    assert os.path.exists(member_cache.path_for(sources['nuevo'], 6))
+
+
+def test_member_cache_sweeps_stale_temporaries(tmp_path, member_cache):
+    stale, fresh = member_cache.new_entry(), member_cache.new_entry()
+    stale.close()
+    fresh.close()
+    os.utime(stale.name, (0, 0))
+    vx.MemberCache(vx.Config())
+    assert not os.path.exists(stale.name)
+    # el de una exportacion que sigue en marcha no se toca
+    assert os.path.exists(fresh.name)
+
+
+def test_export_job_trims_member_cache(tmp_path, member_cache):
+    files = _sample_files(tmp_path / 'src')
+    member_cache.limit = 0
+    job = _run(vx.ExportJob([(str(tmp_path / 'src' / name), name) for name in files], str(tmp_path / 'out.zip'),
+                            cache=member_cache))
+    assert job.error is None
+    assert list(member_cache._entries()) == []
@@ -0,0 +1,149 @@
+import random
+
+import pytest
+
+import VaultXplorer3 as vx
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Config y Database trabajan sobre el directorio actual (config.ini, assets.db)
+    monkeypatch.chdir(tmp_path)
+    database = vx.Database(vx.Config())
+    yield database
+    database.conn.close()
+
+
+def _add_asset(db, name):
+    return db.add_asset({'name': name, 'path': name, 'type': 'Model', 'environment': 'Any',
+                         'image_path': '', 'size': 0})
+
+
+def _check_invariants(db):
+    """Compara el cierre, los contadores y get_assets_in_folder con lo que sale recorriendo parent_id."""
+    parents = {row[0]: row[1] for row in db.conn.execute('SELECT id, parent_id FROM folders')}
+    members = db.conn.execute('SELECT asset_id, folder_id FROM asset_folders').fetchall()
+
+    def ancestors(folder_id):
+        chain = [folder_id]
+        while parents[chain[-1]] is not None:
+            chain.append(parents[chain[-1]])
+        return chain
+
+    closure = {(ancestor, descendant, depth) for descendant in parents
+               for depth, ancestor in enumerate(ancestors(descendant))}
+    assert set(db.conn.execute('SELECT ancestor_id, descendant_id, depth FROM folder_closure')) == closure
+    counts = db.get_folder_asset_counts()
+    for folder_id in parents:
+        subtree = {asset_id for asset_id, member in members if folder_id in ancestors(member)}
+        direct = sum(1 for _, member in members if member == folder_id)
+        assert counts[folder_id] == (direct, len(subtree))
+        assert {asset['id'] for asset in db.get_assets_in_folder(folder_id)} == subtree
+
+
+def test_add_folder_closure_depths(db):
+    root = db.add_folder('Texturas')
+    wood = db.add_folder('Madera', root)
+    oak = db.add_folder('Roble', wood)
+    rows = set(db.conn.execute('SELECT ancestor_id, descendant_id, depth FROM folder_closure WHERE descendant_id = ?',
+                               (oak,)))
+    assert rows == {(oak, oak, 0), (wood, oak, 1), (root, oak, 2)}
+    _check_invariants(db)
+
+
+def test_counts_are_distinct_per_subtree(db):
+    root = db.add_folder('Texturas')
+    wood = db.add_folder('Madera', root)
+    stone = db.add_folder('Piedra', root)
+    asset = _add_asset(db, 'roble')
+    # el mismo asset en dos hermanas cuenta una vez en el padre
+    db.add_asset_to_folder(asset, wood)
+    db.add_asset_to_folder(asset, stone)
+    db.add_asset_to_folder(asset, stone)
+    assert db.get_folder_asset_counts() == {root: (0, 1), wood: (1, 1), stone: (1, 1)}
+    db.remove_asset_from_folder(asset, wood)
+    assert db.get_folder_asset_counts()[root] == (0, 1)
+    db.remove_asset_from_folder(asset, stone)
+    assert db.get_folder_asset_counts()[root] == (0, 0)
+    _check_invariants(db)
+
+
+def test_move_folder_carries_subtree(db):
+    textures = db.add_folder('Texturas')
+    models = db.add_folder('Modelos')
+    wood = db.add_folder('Madera', textures)
+    oak = db.add_folder('Roble', wood)
+    asset = _add_asset(db, 'tablon')
+    db.add_asset_to_folder(asset, oak)
+
+    db.move_folder(wood, models)
+    assert db.get_folder_asset_counts()[textures] == (0, 0)
+    assert db.get_folder_asset_counts()[models] == (0, 1)
+    assert db.conn.execute('SELECT depth FROM folder_closure WHERE ancestor_id = ? AND descendant_id = ?',
+                           (models, oak)).fetchone() == (2,)
+    _check_invariants(db)
+
+    db.move_folder(wood, None)
+    assert db.get_folder_asset_counts()[models] == (0, 0)
+    _check_invariants(db)
+
+
+def test_move_folder_rejects_cycles(db):
+    root = db.add_folder('Texturas')
+    wood = db.add_folder('Madera', root)
+    oak = db.add_folder('Roble', wood)
+    before = set(db.conn.execute('SELECT * FROM folder_closure'))
+    for parent in (root, oak):
+        with pytest.raises(ValueError):
+            db.move_folder(root, parent)
+    assert set(db.conn.execute('SELECT * FROM folder_closure')) == before
+    assert db.conn.execute('SELECT parent_id FROM folders WHERE id = ?', (root,)).fetchone() == (None,)
+
+
+def test_random_operations_keep_invariants(db):
+    rng = random.Random(1)
+    folders = []
+    for index in range(25):
+        folders.append(db.add_folder(f'f{index}', rng.choice(folders + [None, None])))
+    assets = [_add_asset(db, f'a{index}') for index in range(30)]
+    for step in range(300):
+        roll = rng.random()
+        if roll < 0.45:
+            db.add_asset_to_folder(rng.choice(assets), rng.choice(folders))
+        elif roll < 0.7:
+            row = db.conn.execute('SELECT asset_id, folder_id FROM asset_folders ORDER BY RANDOM() LIMIT 1').fetchone()
+            if row:
+                db.remove_asset_from_folder(*row)
+        elif roll < 0.95:
+            folder_id, parent_id = rng.choice(folders), rng.choice(folders + [None])
+            cycle = parent_id is not None and db.conn.execute(
+                'SELECT 1 FROM folder_closure WHERE ancestor_id = ? AND descendant_id = ?',
+                (folder_id, parent_id)).fetchone()
+            if cycle:
+                with pytest.raises(ValueError):
+                    db.move_folder(folder_id, parent_id)
+            else:
+                db.move_folder(folder_id, parent_id)
+        else:
+            folders.append(db.add_folder('nueva', rng.choice(folders)))
+        if step % 25 == 0:
+            _check_invariants(db)
+    _check_invariants(db)
+
+
+def test_old_database_rebuilds_closure(db):
+    root = db.add_folder('Texturas')
+    wood = db.add_folder('Madera', root)
+    db.add_asset_to_folder(_add_asset(db, 'roble'), wood)
+    # como una base de datos de antes del cierre: solo parent_id y asset_folders
+    with db.conn:
+        db.conn.execute('DELETE FROM folder_closure')
+        db.conn.execute('DELETE FROM folder_asset_counts')
+    db.conn.close()
+
+    reopened = vx.Database(vx.Config())
+    try:
+        assert reopened.get_folder_asset_counts() == {root: (0, 1), wood: (1, 1)}
+        _check_invariants(reopened)
+    finally:
+        reopened.conn.close()
@@ -0,0 +1,99 @@
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+import VaultXplorer3 as vx
+
+
+WIDTH, HEIGHT = 45, 23
+
+
+@pytest.mark.parametrize('name, mode, options, expected', [
+    ('gray.png', 'L', {}, ('PNG', 1, 8, 'sRGB')),
+    ('gray_alpha.png', 'LA', {}, ('PNG', 2, 8, 'sRGB')),
+    ('rgb.png', 'RGB', {}, ('PNG', 3, 8, 'sRGB')),
+    ('rgba.png', 'RGBA', {}, ('PNG', 4, 8, 'sRGB')),
+    ('height.png', 'I;16', {}, ('PNG', 1, 16, 'sRGB')),
+    ('palette.png', 'P', {}, ('PNG', 3, 8, 'sRGB')),
+    ('palette_alpha.png', 'P', {'transparency': 0}, ('PNG', 4, 8, 'sRGB')),
+    # en PNG sale el nombre del perfil del iCCP, que PIL llama "ICC Profile"
+    ('profile.png', 'RGB', {'icc_profile': bytes(200)}, ('PNG', 3, 8, 'ICC Profile')),
+    ('gray.jpg', 'L', {}, ('JPEG', 1, 8, 'gray')),
+    ('rgb.jpg', 'RGB', {}, ('JPEG', 3, 8, 'sRGB')),
+    ('cmyk.jpg', 'CMYK', {}, ('JPEG', 4, 8, 'CMYK')),
+    ('profile.jpg', 'RGB', {'icc_profile': bytes(200)}, ('JPEG', 3, 8, 'ICC')),
+    ('rgb.tif', 'RGB', {}, ('TIFF', 3, 8, 'sRGB')),
+    ('rgba.tif', 'RGBA', {'compression': 'tiff_lzw'}, ('TIFF', 4, 8, 'sRGB')),
+    ('height.tif', 'I;16', {}, ('TIFF', 1, 16, 'gray')),
+    ('float.tif', 'F', {}, ('TIFF', 1, 32, 'linear')),
+    ('motorola.tif', 'I;16B', {}, ('TIFF', 1, 16, 'gray')),
+    ('big.tif', 'RGB', {'big_tiff': True}, ('TIFF', 3, 8, 'sRGB')),
+    ('rgb.tga', 'RGB', {}, ('TGA', 3, 8, 'sRGB')),
+    ('rgba.tga', 'RGBA', {'compression': 'tga_rle'}, ('TGA', 4, 8, 'sRGB')),
+    ('gray.tga', 'L', {}, ('TGA', 1, 8, 'sRGB')),
+])
+def test_texture_header_matches_pil(tmp_path, name, mode, options, expected):
+    path = tmp_path / name
+    Image.new(mode, (WIDTH, HEIGHT)).save(path, **options)
+
+    header = vx._read_texture_header(str(path))
+    assert (header['width'], header['height']) == (WIDTH, HEIGHT)
+    assert (header['format'], header['channels'], header['bit_depth'], header['colour_space']) == expected
+    with Image.open(path) as image:
+        assert image.size == (header['width'], header['height'])
+
+
+def test_png_linear_gamma(tmp_path):
+    # gAMA de 1.0 (100000) marca la textura como lineal
+    path = tmp_path / 'linear.png'
+    Image.new('RGB', (WIDTH, HEIGHT)).save(path)
+    data = path.read_bytes()
+    gamma = b'gAMA' + (100000).to_bytes(4, 'big')
+    chunk = (4).to_bytes(4, 'big') + gamma + zlib.crc32(gamma).to_bytes(4, 'big')
+    path.write_bytes(data[:33] + chunk + data[33:])
+    assert vx._read_texture_header(str(path))['colour_space'] == 'linear'
+
+
+def test_unknown_format_raises(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('hola')
+    with pytest.raises(ValueError):
+        vx._read_texture_header(str(path))
+
+
+def _tiff(entries):
+    """TIFF little-endian minimo con las entradas [(tag, tipo, valor)] en el IFD, sin pixeles."""
+    ifd = struct.pack('<H', len(entries)) + b''.join(
+        struct.pack('<HHI4s', tag, kind, 1, struct.pack('<I', value)) for tag, kind, value in entries)
+    return b'II*\0' + struct.pack('<I', 8) + ifd + bytes(4)
+
+
+@pytest.mark.parametrize('data', [
+    _tiff([(258, 3, 8), (262, 3, 1)]),  # sin ancho ni alto
+    _tiff([(256, 3, 45), (257, 12, 23)]),  # alto como double: tipo que no leemos
+    _tiff([(256, 3, 45), (257, 3, 23)])[:20],  # cortado a media entrada
+    b'II*\0' + struct.pack('<I', 5000),  # el IFD apunta fuera del fichero
+], ids=['no_size', 'double_height', 'truncated', 'ifd_past_end'])
+def test_broken_tiff_raises_value_error(tmp_path, data):
+    path = tmp_path / 'broken.tif'
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        vx._read_texture_header(str(path))
+
+
+def test_index_assets_skips_broken_tiff(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = vx.Database(vx.Config())
+    try:
+        folder = tmp_path / 'rock'
+        folder.mkdir()
+        (folder / 'broken.tif').write_bytes(_tiff([(258, 3, 8)]))
+        Image.new('RGB', (WIDTH, HEIGHT)).save(folder / 'albedo.png')
+        asset_id = db.add_asset({'name': 'rock', 'path': str(folder), 'type': 'Texture', 'environment': 'Any',
+                                 'image_path': '', 'size': 0})
+        vx.TextureMetadataService(db).index_assets()
+        assert [row['path'] for row in db.get_textures(asset_id)] == [str(folder / 'albedo.png')]
+    finally:
+        db.close()
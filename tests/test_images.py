@@ -0,0 +1,348 @@
+import json
+import shutil
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import VaultXplorer3 as vx
+
+
+def _flat_map(path, colour, mode='RGB'):
+    Image.new(mode, (64, 64), colour).save(path)
+    return str(path)
+
+
+def _preview(tmp_path, maps, swatch):
+    destination = vx._render_material_preview(maps, str(tmp_path / 'preview.png'), swatch, size=32)
+    with Image.open(destination) as image:
+        assert image.size == (32, 32) and image.mode == 'RGBA'
+        return np.asarray(image, dtype=np.int32)
+
+
+def test_material_swatch_of_flat_maps_is_flat(tmp_path):
+    maps = {"Color/Albedo": _flat_map(tmp_path / 'albedo.png', (180, 90, 40)),
+            "Roughness": _flat_map(tmp_path / 'roughness.png', 140, 'L'),
+            "Opacity": _flat_map(tmp_path / 'opacity.png', 128, 'L')}
+    swatch = _preview(tmp_path, maps, swatch=True)
+    assert (swatch == swatch[0, 0]).all()
+    red, green, blue, alpha = swatch[0, 0]
+    assert red > green > blue and alpha == 128
+
+    # un normal map plano (0, 0, 1) no cambia nada
+    maps["Normal"] = _flat_map(tmp_path / 'normal.png', (128, 128, 255))
+    assert np.abs(_preview(tmp_path, maps, swatch=True) - swatch).max() <= 2
+
+
+def test_material_sphere_shading(tmp_path):
+    white = {"Color/Albedo": _flat_map(tmp_path / 'white.png', (255, 255, 255))}
+    sphere = _preview(tmp_path, white, swatch=False)
+    # fuera de la esfera transparente, dentro opaca y mas clara hacia la luz (arriba a la izquierda)
+    assert sphere[0, 0, 3] == 0 and sphere[0, -1, 3] == 0
+    assert (sphere[12:20, 12:20, 3] == 255).all()
+    assert sphere[10, 10, :3].sum() > sphere[22, 22, :3].sum()
+
+    # negro dielectrico: queda el brillo blanco del F0 de 0.04; negro metalico: casi nada
+    maps = {"Color/Albedo": _flat_map(tmp_path / 'black.png', (0, 0, 0))}
+    dielectric = _preview(tmp_path, maps, swatch=True)[0, 0]
+    maps["Metalness"] = _flat_map(tmp_path / 'metal.png', 255, 'L')
+    metal = _preview(tmp_path, maps, swatch=True)[0, 0]
+    assert dielectric[0] == dielectric[1] == dielectric[2] > metal[:3].max()
+    dark = _preview(tmp_path, {"Ambient Occlusion": _flat_map(tmp_path / 'ao.png', 0, 'L')}, swatch=True)[0, 0]
+    assert dark[:3].sum() < _preview(tmp_path, {}, swatch=True)[0, 0, :3].sum()
+
+
+WIDTH, HEIGHT = 37, 53
+
+
+def _save_map(path, values):
+    Image.fromarray(np.asarray(values, dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def test_pack_orm_channels_and_defaults(tmp_path):
+    rng = np.random.default_rng(3)
+    ao = rng.integers(0, 256, (HEIGHT, WIDTH))
+    roughness = rng.integers(0, 256, (HEIGHT, WIDTH))
+    sources = {"Ambient Occlusion": _save_map(tmp_path / 'rock_ao.png', ao),
+               "Roughness": _save_map(tmp_path / 'rock_roughness.png', roughness)}
+    packed = vx._pack_orm(sources, {}, str(tmp_path / 'cache'))
+
+    with Image.open(packed) as image:
+        orm = np.asarray(image)
+    assert orm.shape == (HEIGHT, WIDTH, 3)
+    assert np.array_equal(orm[..., 0], ao) and np.array_equal(orm[..., 1], roughness)
+    assert (orm[..., 2] == 0).all()  # sin metalness: no metalico
+
+
+def test_pack_orm_inverts_gloss_and_resizes(tmp_path):
+    rng = np.random.default_rng(4)
+    gloss = rng.integers(0, 256, (HEIGHT, WIDTH))
+    sources = {"Roughness": _save_map(tmp_path / 'rock_gloss.png', gloss),
+               # mas pequeño y plano: al escalarlo a 37x53 tiene que seguir igual
+               "Metalness": _save_map(tmp_path / 'rock_metal.png', np.full((10, 8), 200))}
+    packed = vx._pack_orm(sources, {}, str(tmp_path / 'cache'))
+
+    with Image.open(packed) as image:
+        orm = np.asarray(image)
+    assert orm.shape == (HEIGHT, WIDTH, 3)
+    assert (orm[..., 0] == 255).all()  # sin AO: blanco
+    assert np.array_equal(orm[..., 1], 255 - gloss)
+    assert (orm[..., 2] == 200).all()
+
+
+def test_pack_orm_reduces_without_touching_sources(tmp_path):
+    sources = {"Ambient Occlusion": _save_map(tmp_path / 'rock_ao.png', np.full((HEIGHT, WIDTH), 90)),
+               "Metalness": _save_map(tmp_path / 'rock_metal.png', np.full((10, 8), 200))}
+    given = dict(sources)
+    packed = vx._pack_orm(sources, {}, str(tmp_path / 'cache'), long_side=20)
+
+    assert sources == given  # las rutas reducidas no se cuelan en el dict del que llama
+    with Image.open(packed) as image:
+        orm = np.asarray(image)
+    assert orm.shape == (20, 14, 3)
+    assert np.abs(orm[..., 0].astype(int) - 90).max() <= 1
+    assert (orm[..., 1] == 255).all() and np.abs(orm[..., 2].astype(int) - 200).max() <= 1
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    return a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _encode_png(path, raw, depth, colour_type, palette=None, transparency=None):
+    """PNG a mano con los cinco filtros por turnos y los IDAT partidos en trozos pequeños."""
+    height = len(raw)
+    bpp = max(1, raw.shape[1] // WIDTH)
+    out = bytearray()
+    previous = [0] * raw.shape[1]
+    for y in range(height):
+        row = [int(value) for value in raw[y]]
+        kind = y % 5
+        out.append(kind)
+        for i, value in enumerate(row):
+            a = row[i - bpp] if i >= bpp else 0
+            b = previous[i]
+            c = previous[i - bpp] if i >= bpp else 0
+            out.append((value - [0, a, b, (a + b) // 2, _paeth(a, b, c)][kind]) % 256)
+        previous = row
+    data = zlib.compress(bytes(out))
+    png = b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', struct.pack('>IIBBBBB', WIDTH, height, depth, colour_type, 0, 0, 0))
+    if palette is not None:
+        png += _chunk(b'PLTE', palette.tobytes())
+    if transparency is not None:
+        png += _chunk(b'tRNS', transparency.tobytes())
+    for start in range(0, len(data), 500):
+        png += _chunk(b'IDAT', data[start:start + 500])
+    path.write_bytes(png + _chunk(b'IEND', b''))
+
+
+def _read_in_bands(path, band=16, overlap=3):
+    """Todas las filas leidas por bandas que se solapan, como hace el reductor."""
+    with vx.PngBandReader(str(path)) as reader:
+        out = np.empty((reader.height, reader.width, reader.channels), dtype=reader.buffer.dtype)
+        for top in range(0, reader.height, band):
+            first = max(0, top - overlap)
+            out[first:top + band] = reader.rows(first, min(reader.height, top + band))
+    return out
+
+
+@pytest.mark.parametrize('colour_type, channels', [(0, 1), (2, 3), (4, 2), (6, 4)])
+@pytest.mark.parametrize('depth', [8, 16])
+def test_png_band_reader_matches_source(tmp_path, colour_type, channels, depth):
+    rng = np.random.default_rng(colour_type * 100 + depth)
+    pixels = rng.integers(0, 2 ** depth, (HEIGHT, WIDTH, channels))
+    raw = np.ascontiguousarray(pixels.astype('>u2' if depth == 16 else np.uint8)).view(np.uint8).reshape(HEIGHT, -1)
+    path = tmp_path / 'source.png'
+    _encode_png(path, raw, depth, colour_type)
+
+    decoded = _read_in_bands(path)
+    assert decoded.dtype == (np.uint16 if depth == 16 else np.uint8)
+    assert np.array_equal(decoded, pixels)
+
+
+def test_png_band_reader_expands_palette(tmp_path):
+    rng = np.random.default_rng(7)
+    indices = rng.integers(0, 200, (HEIGHT, WIDTH)).astype(np.uint8)
+    palette = rng.integers(0, 256, (200, 3)).astype(np.uint8)
+    transparency = rng.integers(0, 256, 50).astype(np.uint8)
+    path = tmp_path / 'palette.png'
+    _encode_png(path, indices, 8, 3, palette, transparency)
+
+    with Image.open(path) as image:
+        expected = np.asarray(image.convert('RGBA'))
+    assert np.array_equal(_read_in_bands(path), expected)
+
+
+def test_png_band_reader_reads_forward_only(tmp_path):
+    path = tmp_path / 'gray.png'
+    Image.new('L', (WIDTH, HEIGHT)).save(path)
+    with vx.PngBandReader(str(path)) as reader:
+        reader.rows(10, 20)
+        with pytest.raises(ValueError):
+            reader.rows(5, 15)
+
+
+@pytest.mark.parametrize('channels, depth', [(1, 8), (2, 8), (3, 8), (4, 8), (1, 16), (3, 16)])
+def test_png_stream_writer_round_trip(tmp_path, channels, depth):
+    rng = np.random.default_rng(channels * 10 + depth)
+    pixels = rng.integers(0, 2 ** depth, (HEIGHT, WIDTH, channels)).astype(np.uint16 if depth == 16 else np.uint8)
+    path = tmp_path / 'out.png'
+    with open(path, 'wb') as f:
+        writer = vx.PngStreamWriter(f, WIDTH, HEIGHT, channels, depth)
+        for top in range(0, HEIGHT, 10):
+            writer.write_rows(pixels[top:top + 10])
+        writer.close()
+
+    assert np.array_equal(_read_in_bands(path), pixels)
+    if depth == 8:
+        with Image.open(path) as image:
+            assert np.array_equal(np.asarray(image).reshape(pixels.shape), pixels)
+
+
+def _binomial_2x(pixels):
+    """Referencia de _downscale_2x sin bandas ni sRGB: la imagen entera de una vez."""
+    height, width = pixels.shape[:2]
+    taps = np.array([1.0, 3.0, 3.0, 1.0]) / 8.0
+    rows = np.clip(2 * np.arange(height // 2)[:, None] + np.arange(-1, 3), 0, height - 1)
+    columns = np.clip(2 * np.arange(width // 2)[:, None] + np.arange(-1, 3), 0, width - 1)
+    vertical = sum(taps[tap] * pixels[rows[:, tap]] for tap in range(4))
+    return sum(taps[tap] * vertical[:, columns[:, tap]] for tap in range(4))
+
+
+@pytest.mark.parametrize('extension', ['.png', '.tga'])
+def test_downscale_2x_matches_whole_image(tmp_path, monkeypatch, extension):
+    # bandas pequeñas para que el solape entre bandas cuente
+    monkeypatch.setattr(vx, 'DOWNSCALE_STRIP_ROWS', 4)
+    rng = np.random.default_rng(11)
+    pixels = rng.integers(0, 256, (HEIGHT, WIDTH, 4)).astype(np.uint8)
+    source = tmp_path / f'source{extension}'
+    Image.fromarray(pixels).save(source)
+    destination = tmp_path / 'half.png'
+    vx._downscale_2x(str(source), str(destination), srgb=False, normal=False)
+
+    with Image.open(destination) as image:
+        result = np.asarray(image)
+    expected = _binomial_2x(pixels.astype(np.float64) / 255.0)
+    assert result.shape == (HEIGHT // 2, WIDTH // 2, 4)
+    assert np.abs(result.astype(np.int32) - np.rint(expected * 255.0)).max() <= 1
+
+
+def _write_png(path, pixels):
+    with open(path, 'wb') as f:
+        writer = vx.PngStreamWriter(f, pixels.shape[1], pixels.shape[0], pixels.shape[2],
+                                    16 if pixels.dtype == np.uint16 else 8)
+        writer.write_rows(pixels)
+        writer.close()
+    return str(path)
+
+
+def test_derive_texture_keeps_16_bits(tmp_path):
+    # 40 -> 30: solo el ultimo tramo con Lanczos; un color plano de 16 bits tiene que salir igual
+    pixels = np.empty((20, 40, 3), dtype=np.uint16)
+    pixels[...] = [40000, 1234, 65535]
+    source = _write_png(tmp_path / 'albedo.png', pixels)
+    derived = vx._derive_texture(source, 'abc', 30, str(tmp_path / 'cache'), srgb=True)
+
+    with vx.PngBandReader(derived) as reader:
+        assert reader.size == (30, 15) and reader.depth == 16
+        assert (reader.rows(0, 15) == [40000, 1234, 65535]).all()
+
+
+@pytest.mark.parametrize('srgb, expected', [(True, 188), (False, 128)])
+def test_derive_texture_filters_colour_in_linear_light(tmp_path, srgb, expected):
+    # rayas de un pixel blanco/negro: en luz lineal la media es 0.5, que en sRGB es ~188
+    pixels = np.zeros((20, 40, 3), dtype=np.uint8)
+    pixels[:, ::2] = 255
+    source = _write_png(tmp_path / 'stripes.png', pixels)
+    derived = vx._derive_texture(source, 'abc', 30, str(tmp_path / 'cache'), srgb=srgb)
+
+    with Image.open(derived) as image:
+        assert image.size == (30, 15)
+        assert abs(np.asarray(image, dtype=np.float64).mean() - expected) < 4
+
+
+def _stitch_level(folder, level, size):
+    """Vuelve a pegar los tiles de un nivel en una sola imagen."""
+    width, height = size
+    out = np.zeros((height, width, 4), dtype=np.uint8)
+    for row in range(-(-height // vx.TILE_SIZE)):
+        for column in range(-(-width // vx.TILE_SIZE)):
+            with Image.open(folder / str(level) / f'{column}_{row}.png') as tile:
+                pixels = np.asarray(tile.convert('RGBA'))
+            top, left = row * vx.TILE_SIZE, column * vx.TILE_SIZE
+            assert pixels.shape[:2] == (min(vx.TILE_SIZE, height - top), min(vx.TILE_SIZE, width - left))
+            out[top:top + pixels.shape[0], left:left + pixels.shape[1]] = pixels
+    return out
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'LA'])
+def test_tile_pyramid_matches_image(tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(vx, 'TILE_SIZE', 16)
+    rng = np.random.default_rng(5)
+    source = tmp_path / 'big.png'
+    pixels = rng.integers(0, 256, (HEIGHT, 70, len(mode))).astype(np.uint8)
+    if mode == 'LA':
+        pixels[..., 1] = 255  # alfa opaco: reduce(2) de PIL premultiplica el alfa
+    image = Image.fromarray(pixels)
+    image.save(source)
+    folder = tmp_path / 'tiles'
+    vx._build_tile_pyramid(str(source), str(folder))
+
+    levels = vx._pyramid_levels(70, HEIGHT)
+    assert levels == [(70, 53), (35, 27), (18, 14), (9, 7)]
+    assert json.loads((folder / vx.PYRAMID_DONE).read_text()) == {'width': 70, 'height': 53, 'levels': 4}
+    expected = image
+    for level, size in enumerate(levels):
+        assert (folder / str(level) / vx.TILE_LEVEL_DONE).exists()
+        if level:
+            expected = expected.reduce(2)
+        # reduce(2) de PIL redondea un poco distinto
+        difference = _stitch_level(folder, level, size).astype(np.int32) - np.asarray(expected.convert('RGBA'))
+        assert np.abs(difference).max() <= 1
+
+
+def test_tile_pyramid_scales_16_bits(tmp_path, monkeypatch):
+    monkeypatch.setattr(vx, 'TILE_SIZE', 16)
+    pixels = np.full((HEIGHT, WIDTH, 1), 32896, dtype=np.uint16)  # 32896 / 257 = 128
+    source = _write_png(tmp_path / 'height.png', pixels)
+    folder = tmp_path / 'tiles'
+    vx._build_tile_pyramid(source, str(folder))
+    assert (_stitch_level(folder, 0, (WIDTH, HEIGHT))[..., :3] == 128).all()
+
+
+def test_tile_pyramid_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr(vx, 'TILE_SIZE', 16)
+    source = tmp_path / 'big.png'
+    Image.fromarray(np.random.default_rng(6).integers(0, 256, (HEIGHT, 70, 3)).astype(np.uint8)).save(source)
+    folder = tmp_path / 'tiles'
+    vx._build_tile_pyramid(str(source), str(folder))
+    complete = [_stitch_level(folder, level, size) for level, size in enumerate(vx._pyramid_levels(70, HEIGHT))]
+
+    # como si se hubiera cortado a medio nivel 1: sin .done, sin pyramid.json y con un tile de menos
+    (folder / vx.PYRAMID_DONE).unlink()
+    (folder / '1' / vx.TILE_LEVEL_DONE).unlink()
+    (folder / '1' / '0_1.png').unlink()
+    shutil.rmtree(folder / '2')
+    shutil.rmtree(folder / '3')
+
+    def no_source(path):
+        raise AssertionError('el nivel 0 esta hecho: no se vuelve a leer el original')
+    monkeypatch.setattr(vx, '_open_for_tiles', no_source)
+    vx._build_tile_pyramid(str(source), str(folder))
+
+    assert (folder / vx.PYRAMID_DONE).exists()
+    for level, size in enumerate(vx._pyramid_levels(70, HEIGHT)):
+        assert (folder / str(level) / vx.TILE_LEVEL_DONE).exists()
+        assert np.array_equal(_stitch_level(folder, level, size), complete[level])
+    # y con pyramid.json ya no hace nada
+    shutil.rmtree(folder / '1')
+    vx._build_tile_pyramid(str(source), str(folder))
+    assert not (folder / '1').exists()
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import VaultXplorer3 as vx
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Config y Database trabajan sobre el directorio actual (config.ini, assets.db)
+    monkeypatch.chdir(tmp_path)
+    database = vx.Database(vx.Config())
+    yield database
+    database.conn.close()
+
+
+def _add_asset(db, folder, name='roca'):
+    return db.add_asset({'name': name, 'path': str(folder), 'type': 'Texture', 'environment': 'Any',
+                         'image_path': '', 'size': 0})
+
+
+def _asset_size(db, asset_id):
+    return next(asset['size'] for asset in db.get_assets() if asset['id'] == asset_id)
+
+
+def _write(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * size)
+
+
+def _rewrite_keeping_mtime(path, size):
+    """Reescribe un fichero sin que cambie el mtime de su carpeta, como quien lo pisa en sitio."""
+    st = os.stat(path.parent)
+    _write(path, size)
+    os.utime(path.parent, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def test_folder_sizes_are_recursive(db, tmp_path):
+    rock = tmp_path / 'rock'
+    _write(rock / 'albedo.png', 100)
+    _write(rock / 'maps' / 'normal.png', 200)
+    _write(rock / 'maps' / '4k' / 'height.png', 300)
+    wood = tmp_path / 'wood'
+    _write(wood / 'albedo.png', 50)
+    sizes = vx.SizeService(db).folder_sizes([str(rock), str(wood), str(tmp_path / 'missing')])
+    assert sizes == {str(rock): 600, str(wood): 50, str(tmp_path / 'missing'): 0}
+    # la segunda vez sale de la cache de dir_sizes y da lo mismo
+    assert vx.SizeService(db).folder_size(str(rock)) == 600
+    assert db.get_dir_sizes(str(rock))[str(rock / 'maps')][3] == 500  # (padre, mtime, propios, total)
+
+
+def test_file_changed_updates_totals(db, tmp_path):
+    rock = tmp_path / 'rock'
+    _write(rock / 'maps' / 'normal.png', 200)
+    asset_id = _add_asset(db, rock)
+    sizes = vx.SizeService(db)
+    sizes.refresh_assets()
+    assert _asset_size(db, asset_id) == 200
+
+    _rewrite_keeping_mtime(rock / 'maps' / 'normal.png', 1000)
+    # el mtime de la carpeta no cambia: sin aviso el total se queda viejo
+    assert sizes.folder_size(str(rock)) == 200
+    touched = sizes.file_changed(str(rock / 'maps' / 'normal.png'))
+    assert set(touched) == {str(rock / 'maps'), str(rock)}
+    assert sizes.folder_size(str(rock)) == 1000
+    assert _asset_size(db, asset_id) == 1000
+
+
+def test_files_changed_picks_up_new_folders(db, tmp_path):
+    # como al escribir LODs o una exportacion: carpetas nuevas y ficheros reescritos a la vez
+    rock = tmp_path / 'rock'
+    _write(rock / 'mesh.obj', 100)
+    _write(rock / 'asset_info.json', 10)
+    asset_id = _add_asset(db, rock)
+    sizes = vx.SizeService(db)
+    sizes.refresh_assets()
+
+    _write(rock / 'lods' / 'mesh_LOD1.obj', 50)
+    _rewrite_keeping_mtime(rock / 'asset_info.json', 40)
+    sizes.files_changed([str(rock / 'lods' / 'mesh_LOD1.obj'), str(rock / 'asset_info.json'),
+                         str(tmp_path / 'outside.zip')])
+    assert _asset_size(db, asset_id) == 190
+    assert sizes.folder_size(str(rock)) == 190
+
+
+def _count_reads(monkeypatch):
+    read = []
+    original = vx._hash_file
+    monkeypatch.setattr(vx, '_hash_file', lambda path: read.append(path) or original(path))
+    return read
+
+
+def test_hash_files_cache_and_invalidation(db, tmp_path, monkeypatch):
+    first, second = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    first.write_bytes(b'hola' * 1000)
+    second.write_bytes(os.urandom(3 * 1024 * 1024))  # varios bloques de HASH_CHUNK_SIZE
+    read = _count_reads(monkeypatch)
+    hashes = vx.HashService(db)
+    digests = hashes.hash_files([str(first), str(second), str(tmp_path / 'missing.bin')])
+    assert digests == {path: hashlib.blake2b(open(path, 'rb').read(), digest_size=32).hexdigest()
+                       for path in (str(first), str(second))}
+    assert sorted(read) == [str(first), str(second)]
+
+    # sin cambios no se vuelve a leer nada, tampoco por otra ruta al mismo inode
+    read.clear()
+    os.link(first, tmp_path / 'link.bin')
+    assert hashes.hash_files([str(first), str(tmp_path / 'link.bin')])[str(first)] == digests[str(first)]
+    assert read == []
+
+    # mismo tamaño con otro mtime: se rehashea
+    st = os.stat(first)
+    first.write_bytes(b'adio' * 1000)
+    os.utime(first, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert hashes.hash_file(str(first)) == hashlib.blake2b(b'adio' * 1000, digest_size=32).hexdigest()
+    # otro inode con el mismo tamaño y mtime (copiado encima con os.replace): tambien
+    replacement = tmp_path / 'new.bin'
+    replacement.write_bytes(b'otro' * 1000)
+    os.utime(replacement, ns=(st.st_atime_ns, os.stat(first).st_mtime_ns))
+    os.replace(replacement, first)
+    assert hashes.hash_file(str(first)) == hashlib.blake2b(b'otro' * 1000, digest_size=32).hexdigest()
+    assert read == [str(first), str(first)]
+
+
+def test_duplicate_report_groups_copies_across_assets(db, tmp_path):
+    rock, stone, wood = tmp_path / 'rock', tmp_path / 'stone', tmp_path / 'wood'
+    _write(rock / 'albedo.png', 1000)
+    _write(rock / 'normal.png', 300)
+    stone.mkdir()
+    (stone / 'albedo_copy.png').write_bytes((rock / 'albedo.png').read_bytes())
+    # un hardlink no ocupa mas disco: no es una copia recuperable
+    os.link(rock / 'normal.png', stone / 'normal.png')
+    _write(wood / 'albedo.png', 1000)
+    (wood / 'albedo.png').write_bytes(b'y' * 1000)  # mismo tamaño, otro contenido
+    (wood / 'albedo_2.png').write_bytes((rock / 'albedo.png').read_bytes())
+    (wood / 'big.bin').write_bytes(b'z' * 5000)
+    (rock / 'big.bin').write_bytes(b'z' * 5000)
+    ids = {folder.name: _add_asset(db, folder, folder.name) for folder in (rock, stone, wood)}
+
+    report = vx.HashService(db).duplicate_report()
+    assert [(group['size'], group['reclaimable']) for group in report] == [(5000, 5000), (1000, 2000)]
+    albedo = report[1]
+    assert albedo['digest'] == hashlib.blake2b(b'x' * 1000, digest_size=32).hexdigest()
+    assert albedo['assets'] == sorted(ids.values())
+    assert sorted(entry['path'] for entry in albedo['files']) == sorted(
+        [str(rock / 'albedo.png'), str(stone / 'albedo_copy.png'), str(wood / 'albedo_2.png')])
+
+
+@pytest.mark.parametrize('max_distance', [0, 3, 7, 10, 15, 20])
+def test_hash_index_matches_brute_force(max_distance):
+    rng = np.random.default_rng(max_distance)
+    base = [int(value) for value in rng.integers(0, 1 << 63, 300, dtype=np.uint64) * 2 + rng.integers(0, 2, 300)]
+    hashes = list(base)
+    # vecinos de cada hash a unos pocos bits, para que haya de todo cerca y lejos
+    for value in base:
+        for bits in rng.integers(1, 24, 10):
+            flips = rng.choice(64, bits, replace=False)
+            hashes.append(value ^ sum(1 << int(bit) for bit in flips))
+    # en sqlite van con signo: el indice tiene que aceptar negativos
+    rows = [(index, f'{index}.png', vx._to_signed64(value)) for index, value in enumerate(hashes)]
+    index = vx.PerceptualHashIndex(rows)
+    assert len(index) == len(hashes)
+
+    for value in rng.choice(hashes, 50):
+        matches, distances = index.query(int(value), max_distance)
+        expected = {i: bin(int(value) ^ other).count('1') for i, other in enumerate(hashes)}
+        expected = {i: distance for i, distance in expected.items() if distance <= max_distance}
+        assert dict(zip(matches.tolist(), distances.tolist())) == expected
+
+
+def test_similar_assets_finds_resaved_preview(db, tmp_path):
+    rng = np.random.default_rng(0)
+    # algo con estructura grande, que sobreviva a reducir y recomprimir
+    gradient = np.linspace(0, 255, 256)[None, :] * np.linspace(0.2, 1.0, 256)[:, None]
+    pixels = np.stack([gradient, gradient[::-1], np.full((256, 256), 90)], axis=2).astype(np.uint8)
+    ids = {}
+    for name in ('rock', 'rock_copy', 'wood'):
+        (tmp_path / name).mkdir()
+        ids[name] = _add_asset(db, tmp_path / name, name)
+    Image.fromarray(pixels).save(tmp_path / 'rock' / 'preview.png')
+    Image.fromarray(pixels).resize((200, 200)).save(tmp_path / 'rock_copy' / 'preview.jpg', quality=70)
+    Image.fromarray(rng.integers(0, 256, (256, 256, 3)).astype(np.uint8)).save(tmp_path / 'wood' / 'preview.png')
+
+    service = vx.PerceptualHashService(db)
+    service.index_assets()
+    assert [asset_id for asset_id, _, _ in service.similar_assets(ids['rock'])] == [ids['rock_copy']]
+    assert service.similar_assets(ids['wood']) == []
+
+
+@pytest.mark.parametrize('rgb, lab', [
+    ((255, 255, 255), (100.0, 0.0, 0.0)),
+    ((0, 0, 0), (0.0, 0.0, 0.0)),
+    ((255, 0, 0), (53.24, 80.09, 67.20)),
+    ((0, 0, 255), (32.30, 79.19, -107.86)),
+    ((128, 128, 128), (53.59, 0.0, 0.0)),
+])
+def test_srgb_to_lab_reference_values(rgb, lab):
+    assert vx._srgb_to_lab(np.array(rgb, dtype=np.uint8)) == pytest.approx(lab, abs=0.1)
+
+
+def test_palette_recovers_colour_blocks(tmp_path):
+    # tres bloques de color con un 50/30/20 % del area
+    pixels = np.empty((100, 100, 3), dtype=np.uint8)
+    pixels[:50] = (200, 40, 40)
+    pixels[50:80] = (30, 90, 200)
+    pixels[80:] = (240, 230, 200)
+    path = tmp_path / 'albedo.png'
+    Image.fromarray(pixels).save(path)
+
+    palette = vx._compute_palette(str(path), k=3)
+    assert palette.shape == (3, 4)
+    assert palette[:, 3] == pytest.approx([0.5, 0.3, 0.2], abs=0.03)
+    expected = vx._srgb_to_lab(np.array([(200, 40, 40), (30, 90, 200), (240, 230, 200)], dtype=np.uint8))
+    assert np.abs(palette[:, :3] - expected).max() < 2.0
+
+
+def test_colour_search_ranks_by_coverage(db, tmp_path):
+    def texture(name, colours):
+        # colours: [(rgb, filas de 64)]
+        folder = tmp_path / name
+        folder.mkdir()
+        rows = np.concatenate([np.tile(np.array(rgb, dtype=np.uint8), (count, 64, 1)) for rgb, count in colours])
+        Image.fromarray(rows).save(folder / f'{name}_albedo.png')
+        # los mapas de datos no entran en la paleta
+        Image.fromarray(np.full((64, 64, 3), (200, 30, 30), dtype=np.uint8)).save(folder / f'{name}_normal.png')
+        return _add_asset(db, folder, name)
+
+    red = texture('brick', [((190, 40, 35), 60), ((90, 90, 90), 4)])
+    speck = texture('marble', [((230, 230, 230), 60), ((190, 40, 35), 4)])
+    grass = texture('grass', [((60, 140, 50), 64)])
+    service = vx.ColourPaletteService(db)
+    service.index_assets()
+    assert len(db.get_palettes()) == 3
+
+    ranking = service.rank_assets((200, 45, 40))
+    # mucho rojo gana a una mancha roja, y la mancha a nada de rojo
+    assert [asset_id for asset_id, _ in ranking] == [red, speck, grass]
+    assert ranking[0][1] < 5.0
+    assert [asset_id for asset_id, _ in service.rank_assets((60, 140, 50))][0] == grass
+
+
+@pytest.mark.parametrize('rel_path, expected', [
+    ('rock_albedo_4K.png', ('4K', None, "Color/Albedo")),
+    ('maps/Rock_Normal_2k.jpg', ('2K', None, "Normal")),
+    ('rock_LOD1.fbx', (None, 1, None)),
+    ('rock_lod_0.obj', (None, 0, None)),
+    ('preview.png', (None, None, None)),
+    ('notes.txt', (None, None, None)),
+    # "4k" dentro de otra palabra no es una resolucion
+    ('rock4kx_roughness.png', (None, None, "Roughness")),
+])
+def test_parse_file_variant_from_name(rel_path, expected):
+    assert vx._parse_file_variant(rel_path, {}, {}, {}) == expected
+
+
+def test_parse_file_variant_prefers_asset_info_and_header():
+    lods = {'mesh.fbx': 2}
+    slots = {'rock_diffuse_8k.png': "Normal"}
+    pixels = {'height.png': 2048}
+    assert vx._parse_file_variant('mesh.fbx', lods, {}, {}) == (None, 2, None)
+    # el token del nombre manda sobre la cabecera, el slot de asset_info sobre el nombre
+    assert vx._parse_file_variant('rock_diffuse_8k.png', {}, slots, {'rock_diffuse_8k.png': 1024}) == \
+        ('8K', None, "Normal")
+    assert vx._parse_file_variant('height.png', {}, {}, pixels)[0] == '2K'
+
+
+def test_manifest_variants_and_reindex(db, tmp_path):
+    rock = tmp_path / 'rock'
+    for name in ('rock_albedo_2K.png', 'rock_albedo_4K.png', 'rock_normal_4K.png', 'rock_LOD0.obj',
+                 'rock_LOD1.obj', 'readme.txt'):
+        _write(rock / name, 10)
+    asset_id = _add_asset(db, rock)
+    service = vx.ManifestService(db)
+    service.index_assets()
+
+    assert db.get_asset_variants(asset_id) == (['2K', '4K'], [0, 1])
+    assert [row['rel_path'] for row in db.get_asset_files(asset_id, '4K', 1)] == \
+        ['readme.txt', 'rock_LOD1.obj', 'rock_albedo_4K.png', 'rock_normal_4K.png']
+
+    # asset_info.json cambia el LOD de un fichero y borrar uno lo saca del manifiesto
+    (rock / 'asset_info.json').write_text(json.dumps({'lods': [str(rock / 'rock_LOD1.obj')]}))
+    os.remove(rock / 'rock_albedo_2K.png')
+    os.utime(rock / 'rock_LOD1.obj', ns=(0, 0))
+    service.index_assets()
+    assert db.get_asset_variants(asset_id) == (['4K'], [0])
+    assert [row['rel_path'] for row in db.get_asset_files(asset_id, lod=0)] == \
+        ['asset_info.json', 'readme.txt', 'rock_LOD0.obj', 'rock_LOD1.obj', 'rock_albedo_4K.png',
+         'rock_normal_4K.png']
+
+
+def test_duplicate_report_needs_more_than_one_asset(db, tmp_path):
+    rock, wood = tmp_path / 'rock', tmp_path / 'wood'
+    _write(rock / 'albedo.png', 1000)
+    _write(rock / 'backup' / 'albedo.png', 1000)
+    _write(wood / 'notes.txt', 10)
+    rock_id, wood_id = _add_asset(db, rock, 'rock'), _add_asset(db, wood, 'wood')
+    hashes = vx.HashService(db)
+    # las dos copias estan dentro del mismo asset
+    assert hashes.duplicate_report() == []
+
+    _write(wood / 'albedo.png', 1000)
+    [group] = hashes.duplicate_report()
+    assert group['assets'] == sorted([rock_id, wood_id])
+    assert len(group['files']) == 3 and group['reclaimable'] == 2000
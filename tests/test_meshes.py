@@ -0,0 +1,314 @@
+import json
+import os
+import struct
+import time
+
+import numpy as np
+import pytest
+
+import VaultXplorer3 as vx
+
+
+# cubo de lado 2 centrado en (1, 2, 3): 8 vertices, 6 quads, 12 triangulos
+CUBE_LOW, CUBE_HIGH = (0.0, 1.0, 2.0), (2.0, 3.0, 4.0)
+CUBE_VERTICES = np.array([[x, y, z] for x in (0, 2) for y in (1, 3) for z in (2, 4)], dtype=np.float32)
+CUBE_QUADS = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+CUBE_TRIANGLES = [(a, b, c) for a, b, c, d in CUBE_QUADS] + [(a, c, d) for a, b, c, d in CUBE_QUADS]
+
+
+def _check_cube(stats, vertices, triangles, materials=0):
+    assert (stats['vertices'], stats['triangles'], stats['materials']) == (vertices, triangles, materials)
+    assert stats['bbox_min'] == pytest.approx(CUBE_LOW) and stats['bbox_max'] == pytest.approx(CUBE_HIGH)
+
+
+def test_obj_stats(tmp_path):
+    lines = ['# cubo', 'mtllib cube.mtl', 'o Cube']
+    lines += [f'v {x:g} {y:g}\t{z:g}' for x, y, z in CUBE_VERTICES]
+    lines += ['vt 0 0', 'vn 0 0 1', 'usemtl Stone']
+    # quads con v/vt/vn, triangulos sueltos y un pentagono (3 triangulos)
+    lines += [f'f {a + 1}/1/1 {b + 1}/1/1 {c + 1}/1/1 {d + 1}/1/1 ' for a, b, c, d in CUBE_QUADS[:4]]
+    lines += ['usemtl Moss', 'usemtl Stone']
+    lines += [f'f {a + 1} {b + 1} {c + 1}' for a, b, c in CUBE_TRIANGLES[4:6] + CUBE_TRIANGLES[10:12]]
+    lines += ['f -1 -2 -3 -4 -5']
+    path = tmp_path / 'cube.obj'
+    path.write_bytes('\r\n'.join(lines).encode())
+    _check_cube(vx._read_mesh_stats(str(path)), 8, 4 * 2 + 4 + 3, materials=2)
+
+
+def test_line_chunks_cover_the_data():
+    data = b''.join(b'v %d 0 0\n' % index for index in range(1000))
+    chunks = list(vx._iter_line_chunks(data, chunk_size=100))
+    assert len(chunks) > 10
+    assert all(chunk.startswith(b'\n') and chunk.endswith(b'\n') for chunk in chunks)
+    assert b''.join(chunk[1:] for chunk in chunks) == data
+    assert sum(len(vx._OBJ_VERTEX_RE.findall(chunk)) for chunk in chunks) == 1000
+
+
+def _stl_facets():
+    return [(np.zeros(3), CUBE_VERTICES[list(triangle)]) for triangle in CUBE_TRIANGLES]
+
+
+def test_binary_stl_stats(tmp_path):
+    data = bytearray(b'solid ' + bytes(74))  # cabecera que empieza como un ASCII
+    data += struct.pack('<I', len(CUBE_TRIANGLES))
+    for normal, corners in _stl_facets():
+        data += struct.pack('<3f', *normal) + corners.astype('<f4').tobytes() + struct.pack('<H', 0)
+    path = tmp_path / 'cube.stl'
+    path.write_bytes(bytes(data))
+    stats = vx._read_mesh_stats(str(path))
+    assert stats['format'] == 'STL'
+    _check_cube(stats, 36, 12)
+
+
+def test_ascii_stl_stats(tmp_path):
+    lines = ['solid cube']
+    for normal, corners in _stl_facets():
+        lines += ['  facet normal 0 0 0', '    outer loop']
+        lines += ['      vertex {:e} {:e} {:e}'.format(*corner) for corner in corners]
+        lines += ['    endloop', '  endfacet']
+    path = tmp_path / 'cube.stl'
+    path.write_text('\n'.join(lines + ['endsolid cube']) + '\n')
+    stats = vx._read_mesh_stats(str(path))
+    assert stats['format'] == 'STL (ASCII)'
+    _check_cube(stats, 36, 12)
+
+
+def _gltf_document():
+    return {
+        'asset': {'version': '2.0'},
+        'materials': [{'name': 'Stone'}, {'name': 'Moss'}],
+        'accessors': [
+            {'count': 8, 'type': 'VEC3', 'componentType': 5126, 'min': list(CUBE_LOW), 'max': list(CUBE_HIGH)},
+            {'count': 36, 'type': 'SCALAR', 'componentType': 5123},
+            {'count': 6, 'type': 'VEC3', 'componentType': 5126, 'min': [0, 0, 0], 'max': [1, 1, 1]},
+        ],
+        'meshes': [
+            {'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1}]},
+            # tira de triangulos sin indices: 6 vertices, 4 triangulos
+            {'primitives': [{'attributes': {'POSITION': 2}, 'mode': 5}]},
+        ],
+    }
+
+
+def test_gltf_and_glb_stats(tmp_path):
+    gltf = tmp_path / 'cube.gltf'
+    gltf.write_text(json.dumps(_gltf_document()))
+    document = json.dumps(_gltf_document()).encode()
+    document += b' ' * (-len(document) % 4)
+    # GLB: cabecera, chunk JSON y un chunk BIN que no se llega a leer
+    binary = bytes(64)
+    glb = tmp_path / 'cube.glb'
+    glb.write_bytes(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(document) + 8 + len(binary))
+                    + struct.pack('<I4s', len(document), b'JSON') + document
+                    + struct.pack('<I4s', len(binary), b'BIN\0') + binary)
+
+    for path, fmt in ((gltf, 'GLTF'), (glb, 'GLB')):
+        stats = vx._read_mesh_stats(str(path))
+        assert stats['format'] == fmt
+        assert (stats['vertices'], stats['triangles'], stats['materials']) == (14, 16, 2)
+        assert stats['bbox_min'] == pytest.approx((0, 0, 0)) and stats['bbox_max'] == pytest.approx(CUBE_HIGH)
+
+
+def test_empty_mesh_raises(tmp_path):
+    path = tmp_path / 'empty.obj'
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        vx._read_mesh_stats(str(path))
+
+
+def _uv_sphere(rings=40):
+    theta, phi = np.meshgrid(np.linspace(0, np.pi, rings), np.linspace(0, 2 * np.pi, 2 * rings, endpoint=False),
+                             indexing='ij')
+    vertices = np.stack([np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)], axis=-1)
+    ring = np.arange(rings - 1)[:, None] * 2 * rings
+    step = np.arange(2 * rings)[None, :]
+    a = (ring + step).ravel()
+    b = (ring + (step + 1) % (2 * rings)).ravel()
+    faces = np.concatenate([np.stack([a, b, a + 2 * rings], axis=1), np.stack([b, b + 2 * rings, a + 2 * rings], axis=1)])
+    return vertices.reshape(-1, 3).astype(np.float32), faces.astype(np.int32)
+
+
+def _quad(z=0.0):
+    vertices = np.array([[-1, -1, z], [1, -1, z], [1, 1, z], [-1, 1, z]], dtype=np.float32)
+    return vertices, np.array([[0, 1, 2], [0, 2, 3]], dtype=np.int32)
+
+
+def test_rasterize_quad_coverage():
+    vertices, faces = _quad()
+    alpha = np.asarray(vx._rasterize_mesh(vertices, faces, size=200, yaw=0, pitch=0))[..., 3]
+    # de frente: un cuadrado centrado de 2 * 0.45 / sqrt(2) del lado de la imagen, sin huecos en la diagonal
+    rows, columns = np.nonzero(alpha)
+    side = 200 * 0.9 / np.sqrt(2)
+    assert abs(rows.max() - rows.min() + 1 - side) <= 1 and abs(columns.max() - columns.min() + 1 - side) <= 1
+    assert abs((rows.max() + rows.min()) / 2 - 99.5) <= 0.5
+    assert (alpha[rows.min():rows.max() + 1, columns.min():columns.max() + 1] == 255).all()
+
+
+@pytest.mark.parametrize('front_first', [True, False])
+def test_rasterize_keeps_nearest_triangle(front_first):
+    back, back_faces = _quad(-1.0)
+    # un triangulo inclinado (otro sombreado) por delante del cuadrado
+    front = np.array([[-0.5, -0.5, 0.5], [0.5, -0.5, 0.5], [0.0, 0.5, 1.0]], dtype=np.float32)
+    vertices = np.concatenate([back, front])
+    faces = np.concatenate([back_faces, [[4, 5, 6]]]).astype(np.int32)
+    if front_first:
+        faces = faces[::-1].copy()
+    image = np.asarray(vx._rasterize_mesh(vertices, faces, size=100, yaw=0, pitch=0))
+    alone = np.asarray(vx._rasterize_mesh(front, np.array([[0, 1, 2]], dtype=np.int32), size=100, yaw=0, pitch=0))
+    behind = np.asarray(vx._rasterize_mesh(back, back_faces, size=100, yaw=0, pitch=0))
+    assert not np.array_equal(alone[50, 50], behind[50, 50])
+    assert np.array_equal(image[50, 50], alone[50, 50])
+    assert np.array_equal(image[30, 30], behind[50, 50])  # fuera del triangulo se ve el cuadrado
+
+
+def test_rasterize_million_triangles_in_time():
+    vertices, faces = _uv_sphere(500)
+    assert len(faces) > 990_000
+    start = time.perf_counter()
+    alpha = np.asarray(vx._rasterize_mesh(vertices, faces))[..., 3]
+    # ~0.5 s en un portatil; el margen es para maquinas de CI lentas
+    assert time.perf_counter() - start < 5
+    # la esfera sale entera: un disco de radio 0.45 / sqrt(3) del lado
+    assert abs((alpha > 0).mean() - np.pi * (0.45 / np.sqrt(3)) ** 2) < 0.01
+
+
+def _grid(size=20):
+    x, y = np.meshgrid(np.arange(size), np.arange(size))
+    vertices = np.stack([x.ravel(), y.ravel(), np.zeros(size * size)], axis=1).astype(np.float32)
+    corner = (np.arange(size - 1)[:, None] * size + np.arange(size - 1)[None, :]).ravel()
+    faces = np.concatenate([np.stack([corner, corner + 1, corner + size], axis=1),
+                            np.stack([corner + 1, corner + size + 1, corner + size], axis=1)])
+    return vertices, faces.astype(np.int32)
+
+
+def _normals(vertices, faces):
+    return np.cross(vertices[faces[:, 1]] - vertices[faces[:, 0]], vertices[faces[:, 2]] - vertices[faces[:, 0]])
+
+
+def _check_valid(vertices, faces):
+    assert faces.min() >= 0 and faces.max() == len(vertices) - 1
+    assert len(np.unique(faces)) == len(vertices)  # sin vertices sueltos
+    assert ((faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])).all()
+    assert len(np.unique(np.sort(faces, axis=1), axis=0)) == len(faces)
+
+
+@pytest.mark.parametrize('ratio', [0.5, 0.25, 0.1])
+def test_decimate_sphere_keeps_shape(ratio):
+    vertices, faces = _uv_sphere()
+    target = int(len(faces) * ratio)
+    decimated, new_faces = vx._decimate_mesh(vertices, faces, target)
+
+    _check_valid(decimated, new_faces)
+    assert abs(len(new_faces) - target) <= 0.02 * target + 2
+    # los vertices que quedan siguen sobre la esfera
+    assert np.abs(np.linalg.norm(decimated, axis=1) - 1.0).max() < 0.03
+
+
+def test_decimate_plane_keeps_outline_and_orientation():
+    vertices, faces = _grid()
+    decimated, new_faces = vx._decimate_mesh(vertices, faces, 100)
+
+    _check_valid(decimated, new_faces)
+    assert len(new_faces) <= 100
+    assert np.array_equal(decimated[:, 2], np.zeros(len(decimated)))
+    assert decimated.min(axis=0).tolist() == [0, 0, 0] and decimated.max(axis=0).tolist() == [19, 19, 0]
+    # ninguna cara da la vuelta y el area del plano no cambia
+    normals = _normals(decimated, new_faces)[:, 2]
+    assert (normals > 0).all()
+    assert normals.sum() / 2 == pytest.approx(19 * 19)
+
+
+def test_generate_lods_writes_obj_chain(tmp_path):
+    vertices, faces = _uv_sphere(20)
+    source = tmp_path / 'sphere.obj'
+    vx._write_obj(str(source), vertices, faces)
+    loaded, loaded_faces = vx._load_mesh(str(source))
+    assert np.allclose(loaded, vertices, atol=1e-5) and np.array_equal(loaded_faces, faces)
+
+    paths = vx._generate_lods(str(source), 'abc', [0.5, 0.25], str(tmp_path / 'lods'))
+    counts = [len(vx._load_mesh(path)[1]) for path in paths]
+    assert counts[0] <= len(faces) * 0.5 + 2 and counts[1] <= len(faces) * 0.25 + 2
+    assert counts[1] < counts[0]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Config y Database trabajan sobre el directorio actual (config.ini, assets.db)
+    monkeypatch.chdir(tmp_path)
+    database = vx.Database(vx.Config())
+    yield database
+    database.conn.close()
+
+
+def test_register_lods_refreshes_asset_size(db, tmp_path):
+    folder = tmp_path / 'rock'
+    folder.mkdir()
+    vertices, faces = _uv_sphere(20)
+    vx._write_obj(str(folder / 'rock_LOD0.obj'), vertices, faces)
+    asset_id = db.add_asset({'name': 'rock', 'path': str(folder), 'type': 'Model', 'environment': 'Any',
+                             'image_path': '', 'size': 0})
+    vx.SizeService(db).refresh_assets()
+    # el manifiesto apunta el OBJ como LOD0
+    vx.ManifestService(db).index_assets()
+    asset = next(asset for asset in db.get_assets() if asset['id'] == asset_id)
+
+    lods = vx._generate_lods(str(folder / 'rock_LOD0.obj'), None, [0.5], str(tmp_path / 'cache'))
+    written = vx.LodService(db).register(asset, lods)
+    assert written == [str(folder / 'rock_LOD1.obj')]
+    total = sum(entry.stat().st_size for entry in os.scandir(folder))
+    assert next(asset['size'] for asset in db.get_assets() if asset['id'] == asset_id) == total
+
+
+def test_mesh_cache_round_trip_and_eviction(db, tmp_path, monkeypatch):
+    cache = vx.MeshCache(db.config)
+    parsed = []
+    original = vx._parse_mesh
+    monkeypatch.setattr(vx, '_parse_mesh', lambda path: parsed.append(path) or original(path))
+    meshes = {}
+    for rings in (10, 14, 18):
+        path = str(tmp_path / f'sphere_{rings}.obj')
+        vx._write_obj(path, *_uv_sphere(rings))
+        meshes[path] = vx._hash_file(path)
+
+    first = {path: cache.load(path, digest) for path, digest in meshes.items()}
+    assert len(parsed) == 3
+    # la segunda vez sale de los .npy con mmap, sin parsear, y es identica
+    for path, digest in meshes.items():
+        vertices, faces = cache.load(path, digest)
+        assert isinstance(vertices, np.memmap)
+        assert np.array_equal(vertices, first[path][0]) and np.array_equal(faces, first[path][1])
+    assert len(parsed) == 3
+
+    # la del medio se usa la ultima: al bajar el tope se van las otras dos
+    sizes = {path: sum(os.path.getsize(name) for name in cache.paths_for(digest)) for path, digest in meshes.items()}
+    paths = list(meshes)
+    for age, path in enumerate([paths[0], paths[2], paths[1]]):
+        for name in cache.paths_for(meshes[path]):
+            os.utime(name, (1000 + age, 1000 + age))
+    cache.limit = sizes[paths[1]]
+    cache.evict()
+    assert [all(os.path.exists(name) for name in cache.paths_for(meshes[path])) for path in paths] == \
+        [False, True, False]
+    # y una entrada borrada se vuelve a parsear
+    cache.load(paths[0], meshes[paths[0]])
+    assert parsed[-1] == paths[0]
+
+
+def test_rasterize_triangle_soup_is_deterministic():
+    # miles de triangulos que tapan toda la imagen: se degrada, pero siempre igual y gana el de delante
+    count = 3000
+    triangle = np.array([[-1, -1, 0], [1, -1, 0], [0, 1, 0]], dtype=np.float32)
+    vertices = np.concatenate([triangle + [0, 0, z] for z in np.linspace(-1, 1, count)]).astype(np.float32)
+    vertices[-1] = [0, 1, 3]  # el ultimo, el mas cercano, inclinado
+    faces = np.arange(3 * count, dtype=np.int32).reshape(count, 3)
+
+    start = time.perf_counter()
+    first = np.asarray(vx._rasterize_mesh(vertices, faces, size=512, yaw=0, pitch=0))
+    assert time.perf_counter() - start < 10
+    second = np.asarray(vx._rasterize_mesh(vertices, faces, size=512, yaw=0, pitch=0))
+    assert first.shape == (512, 512, 4) and np.array_equal(first, second)
+    # referencia sin degradar con el mismo encuadre: solo el de mas atras y el de mas delante
+    reference = np.asarray(vx._rasterize_mesh(vertices, faces[[0, -1]], size=512, yaw=0, pitch=0))
+    coverage, expected = (first[..., 3] > 127).sum(), (reference[..., 3] > 127).sum()
+    assert abs(coverage - expected) < 0.05 * expected
+    assert np.abs(first[256, 256].astype(int) - reference[256, 256]).max() <= 2
@@ -0,0 +1,129 @@
+from concurrent.futures import BrokenExecutor, Future, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import VaultXplorer3 as vx
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('rock_BaseColor.png', {"Color/Albedo": 0.9}),
+    ('Rock_Normal_GL.png', {"Normal": 0.9}),
+    ('T_Rock_01_N.tga', {"Normal": 0.6}),
+    ('wall_opacity_mask.png', {"Opacity Mask": 0.9}),
+    ('steel_metal_roughness.png', {"Metalness": 0.9, "Roughness": 0.9}),
+    ('rock_AmbientOcclusion.jpg', {"Ambient Occlusion": 0.9}),
+    ('holiday_photo.png', {}),
+])
+def test_slot_name_scores(name, expected):
+    assert vx._slot_name_scores(f'/textures/{name}') == expected
+
+
+def _save(path, pixels):
+    Image.fromarray(np.asarray(pixels, dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def _normal_map(rng):
+    # vectores unitarios cerca de (0, 0, 1) codificados en 0..255
+    vectors = np.concatenate([rng.normal(0, 0.2, (64, 64, 2)), np.ones((64, 64, 1))], axis=2)
+    vectors /= np.linalg.norm(vectors, axis=2, keepdims=True)
+    return np.rint((vectors + 1) * 127.5)
+
+
+def test_slot_pixel_scores(tmp_path):
+    rng = np.random.default_rng(0)
+    normal = vx._slot_pixel_scores(_save(tmp_path / 'a.png', _normal_map(rng)))
+    assert normal["Normal"] > 0.8 and "Color/Albedo" not in normal
+
+    colour = vx._slot_pixel_scores(_save(tmp_path / 'b.png', rng.integers(0, 256, (64, 64, 3))))
+    assert colour["Color/Albedo"] == 0.8 and colour.get("Normal", 0.0) < 0.5
+
+    # gris claro: todos los huecos de gris, y AO por encima por lo claro que es
+    bright = vx._slot_pixel_scores(_save(tmp_path / 'c.png', np.full((64, 64), 220)))
+    assert set(vx.GRAYSCALE_SLOTS) <= set(bright) and "Normal" not in bright
+    assert max(bright, key=bright.get) == "Ambient Occlusion"
+    # blanco y negro puro: mascara o metalness
+    binary = vx._slot_pixel_scores(_save(tmp_path / 'd.png', (rng.random((64, 64)) > 0.5) * 255))
+    assert binary["Metalness"] > binary["Roughness"] and binary["Opacity Mask"] > binary["Opacity"]
+
+
+def test_classify_texture_folder(tmp_path):
+    rng = np.random.default_rng(1)
+    _save(tmp_path / 'rock_albedo.png', rng.integers(0, 256, (64, 64, 3)))
+    _save(tmp_path / 'rock_nrm.png', _normal_map(rng))
+    _save(tmp_path / 'rock_rough.png', np.full((64, 64), 120))
+    _save(tmp_path / 'preview.png', rng.integers(0, 256, (64, 64, 3)))
+    assigned = vx._classify_texture_folder(str(tmp_path))
+    assert {slot: path for slot, (path, _) in assigned.items()} == {
+        "Color/Albedo": str(tmp_path / 'rock_albedo.png'),
+        "Normal": str(tmp_path / 'rock_nrm.png'),
+        "Roughness": str(tmp_path / 'rock_rough.png'),
+    }
+
+
+def test_assign_texture_slots_one_to_one():
+    scored = [
+        ('rock_2k.png', 100, {"Color/Albedo": 0.8, "Specular": 0.3}),
+        ('rock_4k.png', 400, {"Color/Albedo": 0.8, "Specular": 0.3}),
+        ('rock_n.png', 100, {"Normal": 0.9, "Color/Albedo": 0.9}),
+        ('noise.png', 100, {"Displacement": vx.SLOT_MIN_CONFIDENCE - 0.01}),
+    ]
+    assigned = vx._assign_texture_slots(scored)
+    # cada fichero en un hueco: el normal map se queda el mejor; el albedo, la mas pesada; lo flojo fuera
+    assert assigned == {"Normal": ('rock_n.png', 0.9), "Color/Albedo": ('rock_4k.png', 0.8),
+                        "Specular": ('rock_2k.png', 0.3)}
+
+
+def test_classify_texture_survives_decompression_bomb(tmp_path, monkeypatch):
+    path = _save(tmp_path / 'rock_normal.png', np.full((64, 64, 3), 128))
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100)
+    # PIL se niega a abrirla: queda solo el nombre
+    assert vx._classify_texture(path) == {"Normal": round(0.65 * 0.9, 3)}
+
+
+class _Widget:
+    """Hace de ventana de Tk: after() solo apunta la llamada para lanzarla a mano."""
+
+    def __init__(self):
+        self.calls = []
+
+    def after(self, ms, callback):
+        self.calls.append(callback)
+
+
+class _BrokenExecutor:
+    def submit(self, function, *args):
+        future = Future()
+        future.set_exception(BrokenExecutor("un proceso del pool murio"))
+        return future
+
+
+def _classify_async(executor, folder):
+    results = {}
+    widget = _Widget()
+    vx.TextureSlotClassifier().classify_folder_async(
+        widget, executor, folder, lambda detected: results.setdefault('done', detected),
+        lambda error: results.setdefault('error', error))
+    while widget.calls:
+        widget.calls.pop()()
+    return results
+
+
+def test_classify_folder_async(tmp_path):
+    _save(tmp_path / 'rock_nrm.png', _normal_map(np.random.default_rng(2)))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = _classify_async(executor, str(tmp_path))
+    assert list(results) == ['done'] and list(results['done']) == ["Normal"]
+
+
+def test_classify_folder_async_reports_broken_pool(tmp_path):
+    _save(tmp_path / 'rock_nrm.png', np.full((8, 8, 3), 128))
+    results = _classify_async(_BrokenExecutor(), str(tmp_path))
+    assert list(results) == ['error'] and isinstance(results['error'], BrokenExecutor)
+
+    executor = ThreadPoolExecutor()
+    executor.shutdown()
+    results = _classify_async(executor, str(tmp_path))
+    assert list(results) == ['error'] and isinstance(results['error'], RuntimeError)